@@ -0,0 +1,314 @@
+"""Benchmarks for the engine and the UI hot paths.
+
+    python benchmarks/bench.py -o results.json
+    python benchmarks/bench.py --compare baseline.json
+
+Each benchmark reports the median and minimum time per call over several
+repeats. With --compare, benchmarks whose median is slower than the
+baseline by more than --threshold are listed and the exit status is 1.
+
+The UI benchmarks need a display. Without $DISPLAY an Xvfb server is
+started if one is installed; otherwise they are recorded as skipped.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scicalc import CalculatorEngine  # noqa: E402
+from scicalc.display import split_pieces  # noqa: E402
+from scicalc.expression import compile_cache  # noqa: E402
+from scicalc.worksheet import Worksheet  # noqa: E402
+
+# Minimum time one repeat should take; calls are batched up to it
+MIN_REPEAT_TIME = 0.05
+
+
+def _nested(depth):
+    return "(" * depth + "1+" * depth + "1" + ")" * depth
+
+
+def _long_sum(terms):
+    return "+".join(str(i) for i in range(1, terms + 1))
+
+
+def _long_mixed(terms):
+    parts = ("sin(30)", "2^3", "sqrt(16)", "log(10)", "7/4", "cos(Ans)")
+    return "+".join(parts[i % len(parts)] for i in range(terms))
+
+
+EXPRESSION_CORPUS = {
+    "short_arith": "2+3*4-5/6",
+    "short_funcs": "sin(30)+cos(60)*tan(45)",
+    "short_ans": "Ans*2+1",
+    "nested_50": _nested(50),
+    "nested_150": _nested(150),
+    "nested_funcs_40": "sqrt(" * 40 + "2" + ")" * 40,
+    "long_sum_1000": _long_sum(1000),
+    "long_sum_10000": _long_sum(10000),
+    "long_mixed_2000": _long_mixed(2000),
+}
+
+DISPLAY_LENGTHS = (10, 100, 1000, 10000)
+PASTE_LENGTH = 10000
+HISTORY_SIZES = (10, 1000, 100000)
+STARTUP_RUNS = 5
+WORKSHEET_LINES = 5000
+# Lines of the benchmark worksheet that depend on an edit of its first line
+WORKSHEET_RUN = 100
+
+
+def measure(func, repeats=5, setup=None):
+    # Calls per repeat are calibrated so a repeat takes MIN_REPEAT_TIME;
+    # setup runs before every call and is not timed
+    def run(number):
+        total = 0.0
+        for _ in range(number):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            total += time.perf_counter() - start
+        return total
+
+    number = 1
+    while True:
+        elapsed = run(number)
+        if elapsed >= MIN_REPEAT_TIME or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(MIN_REPEAT_TIME / elapsed) + 1))
+    times = [elapsed / number] + [run(number) / number for _ in range(repeats - 1)]
+    return {"median": statistics.median(times), "min": min(times), "number": number,
+            "repeats": repeats}
+
+
+def bench_engine(results):
+    engine = CalculatorEngine()
+    engine.evaluate("1.5")
+    cache = compile_cache()
+    for name, expression in EXPRESSION_CORPUS.items():
+        results[f"evaluate_expression/{name}/warm"] = measure(
+            lambda: engine.evaluate_expression(expression))
+        results[f"evaluate_expression/{name}/cold"] = measure(
+            lambda: engine.evaluate_expression(expression), setup=cache.clear)
+    engine.define("f(x, y) = sqrt(x^2 + y^2)")
+    results["evaluate_expression/user_function/warm"] = measure(
+        lambda: engine.evaluate_expression("f(Ans, 2)*f(3, Ans)"))
+    bench_worksheet(results)
+
+
+def bench_worksheet(results):
+    # Chains of WORKSHEET_RUN lines, each restarted by a constant
+    lines = ["a0 = 1"] + [f"a{i} = a{i - 1}*1.5 + sin(a{i - 1})" if i % WORKSHEET_RUN
+                          else f"a{i} = {i}" for i in range(1, WORKSHEET_LINES)]
+    sheet = Worksheet("\n".join(lines))
+    sheet.recompute()
+    edits = iter(range(1 << 30))
+    results[f"worksheet/{WORKSHEET_LINES}/edit_line"] = measure(
+        lambda: sheet.set_line(0, f"a0 = {next(edits) % 7}"))
+    results[f"worksheet/{WORKSHEET_LINES}/recompute"] = measure(sheet.recompute)
+
+
+class _VirtualDisplay:
+    # Xvfb on a free display number for the lifetime of the block
+    def __init__(self):
+        self.process = None
+        self.previous = os.environ.get("DISPLAY")
+
+    def __enter__(self):
+        if self.previous:
+            return self
+        xvfb = shutil.which("Xvfb")
+        if xvfb is None:
+            raise RuntimeError("no $DISPLAY and Xvfb is not installed")
+        for number in range(99, 199):
+            if os.path.exists(f"/tmp/.X{number}-lock"):
+                continue
+            self.process = subprocess.Popen([xvfb, f":{number}", "-nolisten", "tcp"],
+                                            stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL)
+            for _ in range(50):
+                if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+                    os.environ["DISPLAY"] = f":{number}"
+                    return self
+                if self.process.poll() is not None:
+                    break
+                time.sleep(0.1)
+            self.process.kill()
+        raise RuntimeError("could not start Xvfb")
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            if self.previous is None:
+                os.environ.pop("DISPLAY", None)
+
+
+def _load_gui():
+    path = os.path.join(ROOT, "scientific-calculator.py")
+    spec = importlib.util.spec_from_file_location("scientific_calculator", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_ui(results):
+    import tkinter as tk
+
+    gui = _load_gui()
+
+    def startup():
+        root = tk.Tk()
+        try:
+            gui.ModernScientificCalculator(root, history_path=None)
+            root.update_idletasks()
+        finally:
+            root.destroy()
+
+    def first_paint():
+        # Until the window is drawn; the history panel and the deferred
+        # buttons are built right after
+        root = tk.Tk()
+        try:
+            calculator = gui.ModernScientificCalculator(root, history_path=None)
+            deadline = time.perf_counter() + 10
+            while calculator.startup_time is None and time.perf_counter() < deadline:
+                root.update()
+            calculator.worker.close()
+        finally:
+            root.destroy()
+
+    for name, func in (("startup/__init__", startup), ("startup/first_paint", first_paint)):
+        times = []
+        for _ in range(STARTUP_RUNS):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        results[name] = {"median": statistics.median(times), "min": min(times),
+                         "number": 1, "repeats": STARTUP_RUNS}
+
+    root = tk.Tk()
+    try:
+        calculator = gui.ModernScientificCalculator(root, history_path=None)
+        calculator.create_deferred_widgets()
+        for length in DISPLAY_LENGTHS:
+            calculator.expression.clear()
+            for i in range(length):
+                calculator.expression.append("+" if i % 2 else "7")
+            results[f"update_display/{length}"] = measure(calculator.update_display)
+
+        pasted = split_pieces("7+" * (PASTE_LENGTH // 2))
+
+        def paste():
+            calculator.expression.clear()
+            calculator.insert_many(pasted)
+            root.update_idletasks()
+
+        results[f"insert_many/{PASTE_LENGTH}"] = measure(paste)
+        calculator.worker.close()
+    finally:
+        root.destroy()
+
+    for size in HISTORY_SIZES:
+        # A full buffer of exactly this capacity, so the measured appends
+        # overwrite the oldest entries and the size stays fixed
+        root = tk.Tk()
+        try:
+            calculator = gui.ModernScientificCalculator(root, history_capacity=size,
+                                                        history_path=None)
+            calculator.create_deferred_widgets()
+            for i in range(size):
+                calculator.history.append(f"{i}+1 = {i + 1}")
+            results[f"add_to_history/{size}"] = measure(
+                lambda: calculator.add_to_history("1+1", "2"))
+            calculator.worker.close()
+        finally:
+            root.destroy()
+
+
+def compare(results, baseline, threshold):
+    # Benchmarks whose median regressed by more than threshold, as
+    # (name, baseline median, current median)
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or "median" not in previous or "median" not in current:
+            continue
+        if current["median"] > previous["median"] * (1 + threshold):
+            regressions.append((name, previous["median"], current["median"]))
+    return regressions
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the calculator's hot paths.")
+    parser.add_argument("-o", "--output", default="bench_output.json",
+                        help="where to write the JSON results (default: bench_output.json)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="flag regressions against a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown before a regression is flagged (default: 0.2)")
+    parser.add_argument("--no-ui", action="store_true", help="skip the Tk benchmarks")
+    args = parser.parse_args(argv)
+
+    results = {}
+    bench_engine(results)
+    skipped = {}
+    if args.no_ui:
+        skipped["ui"] = "disabled with --no-ui"
+    else:
+        try:
+            with _VirtualDisplay():
+                bench_ui(results)
+        except (ImportError, RuntimeError) as e:
+            skipped["ui"] = str(e)
+        except Exception as e:  # tkinter.TclError without importing tkinter here
+            skipped["ui"] = f"{type(e).__name__}: {e}"
+
+    for name, result in results.items():
+        print(f"{name:45} {_format_time(result['median']):>10}")
+    for name, reason in skipped.items():
+        print(f"{name:45} skipped ({reason})")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {_format_time(before)} -> {_format_time(after)} "
+                  f"({after / before - 1:+.0%})")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
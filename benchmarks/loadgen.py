@@ -0,0 +1,130 @@
+"""Load generator for the JSON evaluation service.
+
+    python -m scicalc.service --port 8765 &
+    python benchmarks/loadgen.py --port 8765 --connections 32 --duration 10
+
+Each connection is kept alive and sends one request at a time. Prints
+requests per second and latency percentiles, then the server's /stats.
+With --spawn a server is started (and stopped) by the script itself.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EXPRESSIONS = (
+    "2+3*4",
+    "sin(30)+cos(60)",
+    "sqrt(2)^2*log10(1000)",
+    "fact(20)/fact(18)",
+    "cbrt(27)+exp(1)-e",
+    "(1+2)*(3+4)*(5+6)/7",
+)
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.decode("latin-1").split("\r\n"):
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    return json.loads(await reader.readexactly(length))
+
+
+async def _connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def _client(args, deadline, latencies, errors, offset):
+    reader, writer = await _connect(args)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            expression = EXPRESSIONS[i % len(EXPRESSIONS)]
+            i += 1
+            start = time.perf_counter()
+            result = await _request(reader, writer, "POST", "/evaluate",
+                                    {"expression": expression})
+            latencies.append(time.perf_counter() - start)
+            if "error" in result:
+                errors.append(result["error"])
+    finally:
+        writer.close()
+
+
+async def run(args):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(_client(args, deadline, latencies, errors, i)
+                           for i in range(args.connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    count = len(latencies)
+    print(f"{count} requests in {elapsed:.2f} s over {args.connections} connections")
+    print(f"{count / elapsed:,.0f} requests/sec, {len(errors)} errors")
+    if count:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"latency mean {statistics.mean(latencies) * 1e3:.2f} ms, "
+              f"p50 {quantiles[49] * 1e3:.2f} ms, p95 {quantiles[94] * 1e3:.2f} ms, "
+              f"p99 {quantiles[98] * 1e3:.2f} ms")
+
+    reader, writer = await _connect(args)
+    stats = await _request(reader, writer, "GET", "/stats")
+    writer.close()
+    print(f"server: {stats['batches']} batches, mean batch size "
+          f"{stats['mean_batch_size']:.1f}, p95 batch time "
+          f"{stats['batch_latency']['p95'] * 1e3:.2f} ms")
+
+
+def _spawn_server(args):
+    command = [sys.executable, "-m", "scicalc.service", "--port", str(args.port)]
+    if args.unix:
+        command = [sys.executable, "-m", "scicalc.service", "--unix", args.unix]
+    if args.jobs:
+        command += ["--jobs", str(args.jobs)]
+    server = subprocess.Popen(command, cwd=ROOT, stderr=subprocess.PIPE, text=True)
+    # The server announces itself on stderr once it is listening
+    line = server.stderr.readline()
+    if not line.startswith("Serving"):
+        server.kill()
+        raise RuntimeError(f"server did not start: {line.strip()}")
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the evaluation service's throughput.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead")
+    parser.add_argument("-c", "--connections", type=int, default=32)
+    parser.add_argument("-d", "--duration", type=float, default=5.0, help="seconds")
+    parser.add_argument("--spawn", action="store_true", help="start a server for the run")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes of a spawned server")
+    args = parser.parse_args(argv)
+
+    server = _spawn_server(args) if args.spawn else None
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
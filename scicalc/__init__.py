@@ -0,0 +1,20 @@
+from .engine import CalculatorEngine, format_result
+from .expression import (
+    CompiledExpression,
+    ExpressionError,
+    compile_expression,
+    parse,
+    parse_number,
+    tokenize,
+)
+
+__all__ = [
+    "CalculatorEngine",
+    "CompiledExpression",
+    "ExpressionError",
+    "compile_expression",
+    "format_result",
+    "parse",
+    "parse_number",
+    "tokenize",
+]
@@ -0,0 +1,147 @@
+import argparse
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .engine import CalculatorEngine
+from .expression import ExpressionError
+
+
+def _evaluate_line(engine, line, chain):
+    expression = line.strip()
+    if not expression:
+        return ""
+    try:
+        if chain:
+            return engine.evaluate(expression)
+        return engine.evaluate_expression(expression)
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def _engine(degree_mode, precision, complex_mode, definitions):
+    # definitions are user functions as (text, memo size) pairs
+    engine = CalculatorEngine(degree_mode, precision, complex_mode)
+    engine.user_functions.load(definitions)
+    return engine
+
+
+def evaluate_lines(lines, degree_mode=True, chain=False, precision=None, complex_mode=False,
+                   definitions=()):
+    # Lazily evaluate an iterable of lines in this process. With chain=True
+    # every successful result becomes Ans for the following lines.
+    engine = _engine(degree_mode, precision, complex_mode, definitions)
+    for line in lines:
+        yield _evaluate_line(engine, line, chain)
+
+
+_worker_engines = {}
+
+
+def _evaluate_chunk(lines, degree_mode, precision, complex_mode=False, definitions=()):
+    # Runs in a worker process; one engine (and compile cache) per process
+    key = (degree_mode, precision, complex_mode, definitions)
+    engine = _worker_engines.get(key)
+    if engine is None:
+        engine = _engine(*key)
+        _worker_engines[key] = engine
+    return [_evaluate_line(engine, line, False) for line in lines]
+
+
+def _chunks(lines, size):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _evaluate_parallel(lines, jobs, chunk_size, degree_mode, precision, complex_mode=False,
+                       definitions=()):
+    # Only a bounded number of chunks are in flight at once, so input is
+    # read no faster than the pool can keep up and output keeps line order.
+    max_pending = jobs * 4
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for chunk in _chunks(lines, chunk_size):
+            pending.append(pool.submit(_evaluate_chunk, chunk, degree_mode, precision,
+                                       complex_mode, definitions))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def run_batch(lines, out, jobs=1, chunk_size=1000, degree_mode=True, chain=False,
+              line_numbers=False, precision=None, complex_mode=False, definitions=()):
+    # Ans chaining makes every line depend on the one before it, so chained
+    # runs are always evaluated in order in this process.
+    if jobs > 1 and not chain:
+        results = _evaluate_parallel(lines, jobs, chunk_size, degree_mode, precision,
+                                     complex_mode, definitions)
+    else:
+        results = evaluate_lines(lines, degree_mode, chain, precision, complex_mode,
+                                 definitions)
+    count = 0
+    for count, result in enumerate(results, 1):
+        if line_numbers:
+            out.write(f"{count}\t{result}\n")
+        else:
+            out.write(f"{result}\n")
+        if count % chunk_size == 0:
+            out.flush()
+    out.flush()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate one expression per line and print one result per line.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file of expressions (default: stdin)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of worker processes (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="lines sent to a worker at a time (default: 1000)")
+    parser.add_argument("--rad", action="store_true",
+                        help="evaluate trigonometric functions in radians")
+    parser.add_argument("-p", "--precision", type=int, default=None,
+                        help="evaluate in Decimal with this many significant digits")
+    parser.add_argument("--complex", action="store_true",
+                        help="allow complex results, e.g. sqrt(-1) (float mode only)")
+    parser.add_argument("--chain", action="store_true",
+                        help="bind Ans to the previous line's result (single process)")
+    parser.add_argument("-n", "--line-numbers", action="store_true",
+                        help="prefix each result with its input line number")
+    parser.add_argument("-D", "--define", action="append", default=[], metavar="DEFINITION",
+                        help="define a function, e.g. 'f(x, y) = sqrt(x^2 + y^2)' (repeatable)")
+    parser.add_argument("--memo", type=int, default=0, metavar="N",
+                        help="remember the last N results of each defined function")
+    args = parser.parse_args(argv)
+    if args.jobs < 1 or args.chunk_size < 1:
+        parser.error("--jobs and --chunk-size must be positive")
+    if args.precision is not None and args.precision < 1:
+        parser.error("--precision must be positive")
+    if args.memo < 0:
+        parser.error("--memo must not be negative")
+    definitions = tuple((definition, args.memo) for definition in args.define)
+    try:
+        _engine(True, None, False, definitions)
+    except ExpressionError as e:
+        parser.error(str(e))
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        run_batch(source, sys.stdout, args.jobs, args.chunk_size, not args.rad,
+                  args.chain, args.line_numbers, args.precision, args.complex, definitions)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import math
+import operator
+from decimal import Decimal, localcontext
+
+from .cache import LRUCache
+
+# Factorials above this n are returned as BigFactorial and only expanded
+# to an exact integer when something needs the digits
+LAZY_FACTORIAL_THRESHOLD = 5000
+
+# Integers longer than this many bits are formatted from their logarithm;
+# beyond ~1023 bits they cannot be converted to float at all
+BIG_INT_BITS = 1000
+
+_LOG_PRECISION = 40
+_LOG10_2 = Decimal("0.3010299956639811952137388947244930267682")
+
+_factorials = LRUCache(maxsize=16)
+
+
+def _as_integer(n):
+    if isinstance(n, float):
+        if not n.is_integer():
+            raise ValueError("factorial() only accepts integral values")
+        n = int(n)
+    n = int(n) if isinstance(n, BigFactorial) else n
+    if not isinstance(n, int):
+        raise TypeError("factorial() only accepts integral values")
+    if n < 0:
+        raise ValueError("factorial() not defined for negative values")
+    return n
+
+
+def _range_product(lo, hi):
+    # Product of lo..hi by binary splitting, so the big multiplications
+    # are between numbers of similar size
+    if lo > hi:
+        return 1
+    if hi - lo < 8:
+        result = lo
+        for k in range(lo + 1, hi + 1):
+            result *= k
+        return result
+    mid = (lo + hi) // 2
+    return _range_product(lo, mid) * _range_product(mid + 1, hi)
+
+
+def exact_factorial(n):
+    n = _as_integer(n)
+    value = _factorials.get(n)
+    if value is not None:
+        return value
+    # Extend the closest smaller memoized factorial when it is near enough;
+    # otherwise math.factorial's divide-and-conquer is the fastest route
+    base = max((m for m in _factorials.keys() if m < n), default=None)
+    if base is not None and n - base <= n // 4:
+        value = _factorials.get(base) * _range_product(base + 1, n)
+    else:
+        value = math.factorial(n)
+    _factorials.put(n, value)
+    return value
+
+
+def factorial(n):
+    n = _as_integer(n)
+    if n <= LAZY_FACTORIAL_THRESHOLD:
+        return exact_factorial(n)
+    return BigFactorial(n)
+
+
+def log10_factorial(n):
+    # log10(n!) from the Stirling series for log-gamma, carried in Decimal
+    # so the fractional part (the leading digits) stays accurate for huge n
+    if n < 1000:
+        return log10_int(exact_factorial(n))
+    with localcontext() as ctx:
+        ctx.prec = _LOG_PRECISION
+        n = Decimal(n)
+        ln = (n * n.ln() - n + (2 * Decimal(math.pi) * n).ln() / 2
+              + 1 / (12 * n) - 1 / (360 * n ** 3) + 1 / (1260 * n ** 5))
+        return ln / Decimal(10).ln()
+
+
+def log10_int(value):
+    # log10 of a positive integer from its top 64 bits and bit length
+    value = abs(value)
+    shift = max(0, value.bit_length() - 64)
+    with localcontext() as ctx:
+        ctx.prec = _LOG_PRECISION
+        return Decimal(shift) * _LOG10_2 + Decimal(math.log10(value >> shift))
+
+
+def format_scientific(log10_value, negative=False, digits=10):
+    # "m.mmmmmmmmmme+k" from log10 of the magnitude, without the digits
+    with localcontext() as ctx:
+        ctx.prec = _LOG_PRECISION
+        exponent = int(log10_value.to_integral_value(rounding="ROUND_FLOOR"))
+        mantissa = (Decimal(10) ** (log10_value - exponent)).quantize(Decimal(1).scaleb(-digits))
+        if mantissa >= 10:
+            mantissa = (mantissa / 10).quantize(Decimal(1).scaleb(-digits))
+            exponent += 1
+    return f"{'-' if negative else ''}{mantissa}e+{exponent}"
+
+
+def is_big(value):
+    if isinstance(value, BigFactorial):
+        return True
+    return isinstance(value, int) and value.bit_length() > BIG_INT_BITS
+
+
+def format_big(value):
+    if isinstance(value, BigFactorial):
+        return format_scientific(value.log10())
+    return format_scientific(log10_int(value), value < 0)
+
+
+def exact_digits(value):
+    # Full decimal expansion; Decimal sidesteps int's str() digit limit
+    if isinstance(value, BigFactorial):
+        value = value.value
+    return str(Decimal(value)) if isinstance(value, int) else str(value)
+
+
+class BigFactorial:
+    # n! for large n, kept symbolic. Display only needs log10(n!), which is
+    # cheap; any arithmetic expands the exact value (memoized) first.
+    __slots__ = ("n", "_log10")
+
+    def __init__(self, n):
+        self.n = n
+        self._log10 = None
+
+    @property
+    def value(self):
+        return exact_factorial(self.n)
+
+    def log10(self):
+        if self._log10 is None:
+            self._log10 = log10_factorial(self.n)
+        return self._log10
+
+    def __repr__(self):
+        return f"BigFactorial({self.n})"
+
+    def __bool__(self):
+        return True
+
+    def __int__(self):
+        return self.value
+
+    __index__ = __int__
+
+    def __float__(self):
+        raise OverflowError("factorial result too large to convert to float")
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+def _expanding(name):
+    # Goes through the operator rather than int's own dunder, which returns
+    # NotImplemented for a float; this way fact(6000)*0.5 raises the same
+    # OverflowError as the plain integer would
+    reflected = name.startswith("__r")
+    operation = getattr(operator, name[3:-2] if reflected else name[2:-2])
+    if operation is operator.pow:
+        # pow() also takes the modulus of a three-argument call
+        operation = pow
+
+    def method(self, *args):
+        args = [arg.value if isinstance(arg, BigFactorial) else arg for arg in args]
+        if reflected:
+            return operation(args[0], self.value, *args[1:])
+        return operation(self.value, *args)
+    method.__name__ = name
+    return method
+
+
+for _name in ("__add__", "__radd__", "__sub__", "__rsub__", "__mul__", "__rmul__",
+              "__truediv__", "__rtruediv__", "__floordiv__", "__rfloordiv__",
+              "__mod__", "__rmod__", "__pow__", "__rpow__", "__neg__", "__pos__",
+              "__abs__", "__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__"):
+    setattr(BigFactorial, _name, _expanding(_name))
+del _name
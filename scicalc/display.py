@@ -0,0 +1,119 @@
+import re
+
+# Display glyphs for the pieces the calculator inserts into an expression
+GLYPHS = {
+    "*": "×",
+    "/": "÷",
+    "pi": "π",
+    "log10(": "log(",
+    "log(": "ln(",
+    "exp(": "e^(",
+    "sqrt(": "√(",
+    "cbrt(": "∛(",
+    "^2": "²",
+    "^3": "³",
+}
+
+
+def display_glyph(piece):
+    return GLYPHS.get(piece, piece)
+
+
+# Pasted text is split into the pieces typing would insert: a name with its
+# opening parenthesis ("sin("), a name ("pi", "Ans") or a single character.
+# Display glyphs in the text are read back as what they stand for; "log("
+# is the display's base-10 log, so it comes back as "log10(".
+_PIECE = re.compile(r"[A-Za-z_]\w*\(?|[√∛]\(?|\S")
+_PASTED_GLYPHS = {
+    "×": "*",
+    "·": "*",
+    "÷": "/",
+    "−": "-",
+    "π": "pi",
+    "log(": "log10(",
+    "ln(": "log(",
+    "√(": "sqrt(",
+    "∛(": "cbrt(",
+    "²": "^2",
+    "³": "^3",
+}
+
+
+def split_pieces(text):
+    return [_PASTED_GLYPHS.get(piece, piece) for piece in _PIECE.findall(text)]
+
+
+class ExpressionBuffer:
+    # The expression being typed, held as the list of pieces that were
+    # inserted (digits, operators, "sin(", "Ans", ...). Each piece's glyph
+    # is looked up once on insert, so a redraw is a single join and
+    # backspace removes a whole piece.
+    def __init__(self, text=""):
+        self._pieces = []
+        self._glyphs = []
+        self._text = ""
+        self._display = ""
+        if text:
+            self.append(text)
+
+    def _changed(self):
+        self._text = None
+        self._display = None
+
+    def append(self, piece):
+        if piece:
+            self._pieces.append(piece)
+            self._glyphs.append(display_glyph(piece))
+            self._changed()
+
+    def extend(self, pieces):
+        pieces = [piece for piece in pieces if piece]
+        if pieces:
+            self._pieces.extend(pieces)
+            self._glyphs.extend(display_glyph(piece) for piece in pieces)
+            self._changed()
+
+    def pop(self):
+        if not self._pieces:
+            return ""
+        self._glyphs.pop()
+        self._changed()
+        return self._pieces.pop()
+
+    def clear(self):
+        self._pieces.clear()
+        self._glyphs.clear()
+        self._text = ""
+        self._display = ""
+
+    def toggle_sign(self):
+        if self._pieces and self._pieces[0].startswith("-"):
+            if self._pieces[0] == "-":
+                del self._pieces[0]
+                del self._glyphs[0]
+            else:
+                self._pieces[0] = self._pieces[0][1:]
+                self._glyphs[0] = display_glyph(self._pieces[0])
+        else:
+            self._pieces.insert(0, "-")
+            self._glyphs.insert(0, "-")
+        self._changed()
+
+    @property
+    def pieces(self):
+        return tuple(self._pieces)
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = "".join(self._pieces)
+        return self._text
+
+    @property
+    def display_text(self):
+        if self._display is None:
+            self._display = "".join(self._glyphs)
+        return self._display
+
+    def __len__(self):
+        return len(self._pieces)
@@ -0,0 +1,207 @@
+from decimal import Decimal
+from time import perf_counter
+
+from . import precise
+from .bignum import exact_digits, format_big, is_big
+from .expression import compile_expression, parse_number
+from .profiling import profiler
+from .userfunctions import FunctionLibrary
+from . import functions
+
+
+def format_decimal(result):
+    if not result.is_finite():
+        return str(result)
+    if not result:
+        return "0"
+    # Drop trailing zeros by hand; normalize() would round to the context
+    sign, digits, exponent = result.as_tuple()
+    # Integers that fit in the working digits are written out in full
+    width = max(len(digits), 10)
+    digits = list(digits)
+    while len(digits) > 1 and digits[-1] == 0:
+        digits.pop()
+        exponent += 1
+    result = Decimal((sign, tuple(digits), exponent))
+    if -10 <= result.adjusted() < width:
+        return format(result, "f")
+    return format(result, "e").replace("E", "e")
+
+
+def format_result(result):
+    if isinstance(result, Decimal):
+        return format_decimal(result)
+    if is_big(result):
+        # Leading digits from the logarithm; exact digits only on request
+        return format_big(result)
+    if isinstance(result, (int, float, complex)):
+        if isinstance(result, complex):
+            if result.imag == 0:
+                return format_result(result.real)
+            if result.real == 0:
+                return f"{result.imag:.10g}j"
+            return f"({result.real:.10g}{result.imag:+.10g}j)"
+        # Handle very large or very small numbers with scientific notation
+        if abs(result) > 1e10 or (abs(result) < 1e-10 and result != 0):
+            return f"{result:.10e}"
+        # For regular numbers, limit decimal places
+        return f"{result:.10g}"
+    return str(result)
+
+
+class CalculatorEngine:
+    # GUI-free calculator state: angle mode, the last answer and evaluation.
+    # Importing this module does not pull in tkinter.
+    def __init__(self, degree_mode=True, precision=None, complex_mode=False):
+        self.is_degree_mode = degree_mode
+        # None evaluates in float; a digit count evaluates in Decimal
+        self.precision = precision
+        # Promote to complex where the real result is undefined (float only)
+        self.is_complex_mode = complex_mode
+        self._last_answer = "0"
+        self._last_value = 0
+        self.user_functions = FunctionLibrary()
+
+    @property
+    def last_answer(self):
+        return self._last_answer
+
+    @last_answer.setter
+    def last_answer(self, text):
+        self._last_answer = text
+        self._last_value = parse_number(text)
+
+    @property
+    def last_value(self):
+        return self._last_value
+
+    def toggle_angle_mode(self):
+        self.is_degree_mode = not self.is_degree_mode
+        return self.is_degree_mode
+
+    def toggle_complex_mode(self):
+        self.is_complex_mode = not self.is_complex_mode
+        return self.is_complex_mode
+
+    def set_precision(self, digits):
+        if digits is not None and digits < 1:
+            raise ValueError("Precision must be at least 1 digit")
+        self.precision = digits
+
+    def variables(self):
+        value = self._last_value
+        if self.precision is None and isinstance(value, Decimal):
+            value = float(value)
+        return {"Ans": value}
+
+    def function_table(self):
+        if self.precision is not None:
+            return precise.function_table(self.is_degree_mode)
+        if self.is_complex_mode:
+            return functions.complex_function_table(self.is_degree_mode)
+        return functions.function_table(self.is_degree_mode)
+
+    def constants(self):
+        if self.precision is not None:
+            return precise.constants(self.precision + precise.GUARD_DIGITS)
+        if self.is_complex_mode:
+            return functions.COMPLEX_CONSTANTS
+        return functions.CONSTANTS
+
+    def mode(self):
+        # Everything a compiled expression depends on
+        return (self.is_degree_mode, self.precision, self.is_complex_mode,
+                self.user_functions.stamp)
+
+    def compile(self, expression):
+        return compile_expression(expression, self.is_degree_mode, self.precision,
+                                  self.is_complex_mode, self.user_functions)
+
+    def define(self, definition, memo_size=0):
+        # Add or replace a user function, e.g. "f(x, y) = sqrt(x^2 + y^2)"
+        return self.user_functions.define(definition, memo_size)
+
+    def evaluate_value(self, expression, variables=None):
+        # variables are bound alongside Ans, e.g. a worksheet's earlier lines
+        if profiler.enabled:
+            return self._evaluate_value_profiled(expression, variables)
+        return self.execute(self.compile(expression), variables)
+
+    def execute(self, compiled, variables=None):
+        # Run an expression compiled in the current mode
+        env = self.variables()
+        if variables:
+            env.update(variables)
+        if self.precision is None:
+            return compiled(env)
+        return precise.evaluate(compiled, env, self.precision)
+
+    def _evaluate_value_profiled(self, expression, variables=None):
+        # "compile" is the cache lookup plus tokenizing and parsing on a
+        # miss; "execute" includes the one-off code generation that is also
+        # recorded on its own as "codegen"
+        start = perf_counter()
+        compiled = self.compile(expression)
+        compiled_at = perf_counter()
+        try:
+            return self.execute(compiled, variables)
+        finally:
+            profiler.record("compile", compiled_at - start)
+            profiler.record("execute", perf_counter() - compiled_at)
+            profiler.count_functions(compiled.function_names)
+
+    def format(self, value):
+        if not profiler.enabled:
+            return format_result(value)
+        start = perf_counter()
+        text = format_result(value)
+        profiler.record("format", perf_counter() - start)
+        return text
+
+    def evaluate_expression(self, expression):
+        return self.format(self.evaluate_value(expression))
+
+    def evaluate(self, expression):
+        # Like evaluate_expression, but the result becomes the new Ans
+        return self.store_answer(self.evaluate_value(expression))
+
+    def store_answer(self, value, text=None):
+        # Make an already computed value the new Ans, e.g. one returned by
+        # an EvaluationWorker
+        if text is None:
+            text = self.format(value)
+        self._last_answer = text
+        self._last_value = value
+        return text
+
+    def exact_answer(self):
+        # Every digit of the last answer (slow for very large integers)
+        return exact_digits(self._last_value)
+
+    def evaluate_array(self, expression, values, variable="x"):
+        # Imported lazily so the engine does not pay numpy's import cost
+        from .vectorized import evaluate_array
+        return evaluate_array(expression, values, variable, self.is_degree_mode, self.variables())
+
+    # Trigonometric functions that handle degrees/radians conversion,
+    # following the engine's current evaluation mode
+    def calculate_sin(self, x):
+        return self.function_table()["sin"](x)
+
+    def calculate_cos(self, x):
+        return self.function_table()["cos"](x)
+
+    def calculate_tan(self, x):
+        return self.function_table()["tan"](x)
+
+    def calculate_asin(self, x):
+        return self.function_table()["asin"](x)
+
+    def calculate_acos(self, x):
+        return self.function_table()["acos"](x)
+
+    def calculate_atan(self, x):
+        return self.function_table()["atan"](x)
+
+    def cbrt(self, x):
+        return self.function_table()["cbrt"](x)
@@ -0,0 +1,733 @@
+import math
+import operator
+import re
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from . import numeric, precise
+from .cache import LRUCache
+from .functions import COMPLEX_CONSTANTS, CONSTANTS, complex_function_table, function_table
+from .profiling import profiler
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer
+# ---------------------------------------------------------------------------
+
+NUMBER = "NUMBER"
+NAME = "NAME"
+OP = "OP"
+END = "END"
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<op>\*\*|[-+*/^%(),])
+""", re.VERBOSE)
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    value: object
+    pos: int
+    end: int
+
+
+def tokenize(text, pos=0, number=None):
+    # Lex text[pos:]; positions in the returned tokens index into text.
+    # number, if given, converts numeric literals (e.g. Decimal).
+    tokens = []
+    match = _TOKEN_RE.match
+    while pos < len(text):
+        m = match(text, pos)
+        if m is None:
+            raise ExpressionError(f"Unexpected character '{text[pos]}' at position {pos}")
+        kind = m.lastgroup
+        end = m.end()
+        if kind == "number":
+            literal = m.group()
+            if number is not None:
+                tokens.append(Token(NUMBER, number(literal), pos, end))
+            elif "." in literal or "e" in literal or "E" in literal:
+                tokens.append(Token(NUMBER, float(literal), pos, end))
+            else:
+                try:
+                    value = int(literal)
+                except ValueError:
+                    # Past the interpreter's limit on integer string length
+                    raise ExpressionError(f"Number at position {pos} has too many digits") from None
+                tokens.append(Token(NUMBER, value, pos, end))
+        elif kind == "name":
+            tokens.append(Token(NAME, m.group(), pos, end))
+        elif kind == "op":
+            op = m.group()
+            tokens.append(Token(OP, "^" if op == "**" else op, pos, end))
+        pos = end
+    tokens.append(Token(END, None, pos, pos))
+    return tokens
+
+
+# ---------------------------------------------------------------------------
+# Syntax tree
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Num:
+    value: object
+
+
+@dataclass(frozen=True)
+class Name:
+    name: str
+
+
+@dataclass(frozen=True)
+class Neg:
+    operand: object
+
+
+@dataclass(frozen=True)
+class Pow:
+    base: object
+    exponent: object
+
+
+@dataclass(frozen=True)
+class Chain:
+    # Left-associative run of same-precedence operators: first (op operand)*
+    # Keeping runs flat stops long sums from producing very deep trees.
+    first: object
+    rest: tuple
+
+
+@dataclass(frozen=True)
+class Call:
+    name: str
+    args: tuple
+
+
+class Parser:
+    # Precedence (lowest first): + -, * / %, unary -, ^ (right associative).
+    # "%" is postfix and divides the running term by 100, matching the
+    # old textual "%" -> "/100" substitution.
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def advance(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, value):
+        token = self.advance()
+        if token.kind != OP or token.value != value:
+            raise ExpressionError(f"Expected '{value}' at position {token.pos}")
+        return token
+
+    def parse(self):
+        if self.peek().kind == END:
+            raise ExpressionError("Empty expression")
+        node = self.parse_sum()
+        token = self.peek()
+        if token.kind != END:
+            raise ExpressionError(f"Unexpected '{token.value}' at position {token.pos}")
+        return node
+
+    def parse_sum(self):
+        first = self.parse_term()
+        rest = []
+        while True:
+            token = self.peek()
+            if token.kind == OP and token.value in "+-":
+                self.advance()
+                rest.append((token.value, self.parse_term()))
+            else:
+                break
+        return Chain(first, tuple(rest)) if rest else first
+
+    def parse_term(self):
+        first = self.parse_unary()
+        rest = []
+        while True:
+            token = self.peek()
+            if token.kind == OP and token.value in "*/":
+                self.advance()
+                rest.append((token.value, self.parse_unary()))
+            elif token.kind == OP and token.value == "%":
+                self.advance()
+                rest.append(("/", Num(100)))
+            else:
+                break
+        return Chain(first, tuple(rest)) if rest else first
+
+    def parse_unary(self):
+        token = self.peek()
+        if token.kind == OP and token.value in "+-":
+            self.advance()
+            operand = self.parse_unary()
+            return Neg(operand) if token.value == "-" else operand
+        return self.parse_power()
+
+    def parse_power(self):
+        base = self.parse_primary()
+        token = self.peek()
+        if token.kind == OP and token.value == "^":
+            self.advance()
+            return Pow(base, self.parse_unary())
+        return base
+
+    def parse_primary(self):
+        token = self.advance()
+        if token.kind == NUMBER:
+            return Num(token.value)
+        if token.kind == NAME:
+            following = self.peek()
+            if following.kind == OP and following.value == "(":
+                self.advance()
+                args = [self.parse_sum()]
+                while self.peek().kind == OP and self.peek().value == ",":
+                    self.advance()
+                    args.append(self.parse_sum())
+                self.expect(")")
+                return Call(token.value, tuple(args))
+            return Name(token.value)
+        if token.kind == OP and token.value == "(":
+            node = self.parse_sum()
+            self.expect(")")
+            return node
+        if token.kind == END:
+            raise ExpressionError("Unexpected end of expression")
+        raise ExpressionError(f"Unexpected '{token.value}' at position {token.pos}")
+
+
+def normalize(text):
+    # Collapse whitespace runs so cosmetic spacing shares one cache entry
+    return " ".join(text.split())
+
+
+def parse(text, number=None):
+    try:
+        return Parser(tokenize(text, number=number)).parse()
+    except RecursionError:
+        raise ExpressionError("Expression is nested too deeply") from None
+
+
+# ---------------------------------------------------------------------------
+# Compilation to Python callables
+# ---------------------------------------------------------------------------
+
+_ADD, _MUL, _UNARY, _POW, _ATOM = range(1, 6)
+
+# Longest operator run emitted on one line, and deepest nesting emitted
+# before spilling into a temporary. Both keep CPython's compiler well away
+# from its recursion and parenthesis limits on very long input.
+_CHUNK = 64
+_MAX_HEIGHT = 24
+
+
+# ---------------------------------------------------------------------------
+# Optimization: constant folding and common subexpressions
+# ---------------------------------------------------------------------------
+
+# Integer powers are only folded up to this many bits; bigger ones are left
+# for evaluation, which the GUI runs under a time budget
+_FOLD_MAX_BITS = 1 << 16
+
+# Largest integer written into generated code as a literal
+_INLINE_INT_BITS = 64
+
+_FOLD_ERRORS = (ArithmeticError, ValueError, TypeError)
+
+
+class _Folder:
+    # Rebuilds a tree with every constant-only subtree replaced by its value,
+    # using the same function table (and so the same angle mode) as the
+    # compiled expression. Subtrees that raise are kept, so the error still
+    # happens at evaluation time. Chains are folded only from the left,
+    # since float addition and multiplication are not associative. Calls of
+    # functions marked foldable = False (user functions) are left alone, as
+    # running them here would skew their call counts and could recurse to
+    # the depth limit while compiling.
+    def __init__(self, functions, constants):
+        self.functions = functions
+        self.constants = constants
+
+    def fold(self, node):
+        if isinstance(node, Name):
+            if node.name in self.constants:
+                return Num(self.constants[node.name])
+            return node
+        if isinstance(node, Neg):
+            operand = self.fold(node.operand)
+            if isinstance(operand, Num):
+                return self._value(lambda: -operand.value, Neg(operand))
+            return Neg(operand)
+        if isinstance(node, Pow):
+            base, exponent = self.fold(node.base), self.fold(node.exponent)
+            folded = Pow(base, exponent)
+            if isinstance(base, Num) and isinstance(exponent, Num):
+                b, x = base.value, exponent.value
+                if (type(b) is int and type(x) is int and x > 0
+                        and x * b.bit_length() > _FOLD_MAX_BITS):
+                    return folded
+                power = self.functions.get("^", operator.pow)
+                return self._value(lambda: power(b, x), folded)
+            return folded
+        if isinstance(node, Chain):
+            first = self.fold(node.first)
+            rest = [(op, self.fold(operand)) for op, operand in node.rest]
+            if isinstance(first, Num):
+                value = first.value
+                while rest and isinstance(rest[0][1], Num):
+                    op, operand = rest[0]
+                    try:
+                        value = _OPERATORS[op](value, operand.value)
+                    except _FOLD_ERRORS:
+                        break
+                    rest.pop(0)
+                first = Num(value)
+            return Chain(first, tuple(rest)) if rest else first
+        if isinstance(node, Call):
+            if node.name in numeric.ARITY:
+                # The bound expression is compiled (and folded) on its own
+                return Call(node.name, node.args[:2] + tuple(self.fold(arg)
+                                                             for arg in node.args[2:]))
+            args = tuple(self.fold(arg) for arg in node.args)
+            folded = Call(node.name, args)
+            function = self.functions.get(node.name)
+            if (function is not None and getattr(function, "foldable", True)
+                    and all(isinstance(arg, Num) for arg in args)):
+                return self._value(lambda: function(*[arg.value for arg in args]), folded)
+            return folded
+        return node
+
+    @staticmethod
+    def _value(compute, fallback):
+        try:
+            return Num(compute())
+        except _FOLD_ERRORS:
+            return fallback
+
+
+def optimize(tree, functions, constants=CONSTANTS):
+    return _Folder(functions, constants).fold(tree)
+
+
+def _structure_key(node, keys):
+    # Hashable description of a subtree, memoized by node identity. Number
+    # keys include the type: 1 == 1.0, but 2^1 and 2^1.0 differ.
+    key = keys.get(id(node))
+    if key is not None:
+        return key
+    if isinstance(node, Num):
+        value = node.value
+        key = ("num", type(value), value if type(value) in (int, float, complex, Decimal)
+               else id(value))
+    elif isinstance(node, Name):
+        key = ("name", node.name)
+    elif isinstance(node, Neg):
+        key = ("neg", _structure_key(node.operand, keys))
+    elif isinstance(node, Pow):
+        key = ("pow", _structure_key(node.base, keys), _structure_key(node.exponent, keys))
+    elif isinstance(node, Chain):
+        key = ("chain", _structure_key(node.first, keys),
+               tuple((op, _structure_key(operand, keys)) for op, operand in node.rest))
+    elif isinstance(node, Call):
+        if node.name in numeric.ARITY:
+            # Bound expressions never match anything outside their call
+            key = ("form", id(node))
+        else:
+            key = ("call", node.name, tuple(_structure_key(arg, keys) for arg in node.args))
+    else:
+        key = ("node", id(node))
+    keys[id(node)] = key
+    return key
+
+
+def _repeated_subtrees(tree):
+    # Structural keys of the compound subtrees that occur more than once
+    keys = {}
+    counts = {}
+    for node in _nodes(tree):
+        if isinstance(node, (Neg, Pow, Chain, Call)):
+            key = _structure_key(node, keys)
+            counts[key] = counts.get(key, 0) + 1
+    return keys, {key for key, count in counts.items() if count > 1}
+
+
+def _integral(node):
+    # Integer exponents never turn a real base complex, so they keep **
+    return isinstance(node, Num) and (type(node.value) is int
+                                      or type(node.value) is float and node.value.is_integer())
+
+
+class _CodeGenerator:
+    def __init__(self, functions, constants, tree=None):
+        self.functions = functions
+        self.constants = constants
+        self.namespace = {}
+        self.statements = []
+        self._names = {}
+        # Subtrees that repeat are computed once into a temporary
+        self._keys, self._repeated = _repeated_subtrees(tree) if tree is not None else ({}, ())
+        self._shared = {}
+
+    def bind(self, prefix, value):
+        key = (prefix, id(value))
+        name = self._names.get(key)
+        if name is None:
+            name = f"_{prefix}{len(self._names)}"
+            self._names[key] = name
+            self.namespace[name] = value
+        return name
+
+    def spill(self, src):
+        temp = f"_t{len(self.statements)}"
+        self.statements.append(f"{temp} = {src}")
+        return temp
+
+    def emit(self, node):
+        key = self._keys.get(id(node)) if self._repeated else None
+        if key in self._repeated:
+            temp = self._shared.get(key)
+            if temp is None:
+                src, _, _ = self._emit(node)
+                temp = self._shared[key] = self.spill(src)
+            return temp, _ATOM, 0
+        src, prec, height = self._emit(node)
+        if height > _MAX_HEIGHT:
+            return self.spill(src), _ATOM, 0
+        return src, prec, height
+
+    def _emit(self, node):
+        if isinstance(node, Num):
+            value = node.value
+            # Folding can produce huge integers, which neither fit a float
+            # nor print as a literal; those are bound like other constants
+            if (type(value) is float and math.isfinite(value)
+                    or type(value) is int and value.bit_length() <= _INLINE_INT_BITS):
+                return repr(value), (_UNARY if value < 0 else _ATOM), 0
+            return self.bind("c", value), _ATOM, 0
+        if isinstance(node, Name):
+            if node.name in self.constants:
+                return self._emit(Num(self.constants[node.name]))
+            return f"env[{node.name!r}]", _ATOM, 0
+        if isinstance(node, Neg):
+            src, prec, height = self.emit(node.operand)
+            if prec < _UNARY:
+                src = f"({src})"
+            return f"-{src}", _UNARY, height + 1
+        if isinstance(node, Pow):
+            base, base_prec, base_height = self.emit(node.base)
+            exponent, exp_prec, exp_height = self.emit(node.exponent)
+            height = max(base_height, exp_height) + 1
+            power = self.functions.get("^")
+            if power is not None and not _integral(node.exponent):
+                return f"{self.bind('f', power)}({base}, {exponent})", _ATOM, height
+            if base_prec <= _POW:
+                base = f"({base})"
+            if exp_prec < _UNARY:
+                exponent = f"({exponent})"
+            return f"{base} ** {exponent}", _POW, height
+        if isinstance(node, Chain):
+            return self._emit_chain(node)
+        if isinstance(node, Call):
+            if node.name in numeric.ARITY:
+                form = _numeric_form(node, self.functions, self.constants)
+                args = [self.emit(arg) for arg in node.args[2:]]
+                height = max(arg_height for _, _, arg_height in args)
+                call = f"{self.bind('n', form)}(env, {', '.join(src for src, _, _ in args)})"
+                return call, _ATOM, height + 1
+            function = self.functions.get(node.name)
+            if function is None:
+                raise ExpressionError(f"Unknown function '{node.name}'")
+            args = []
+            height = 0
+            for arg in node.args:
+                src, _, arg_height = self.emit(arg)
+                args.append(src)
+                height = max(height, arg_height)
+            return f"{self.bind('f', function)}({', '.join(args)})", _ATOM, height + 1
+        raise ExpressionError(f"Cannot compile {node!r}")
+
+    def _emit_chain(self, node):
+        prec = _ADD if node.rest[0][0] in "+-" else _MUL
+        src, first_prec, height = self.emit(node.first)
+        if first_prec < prec:
+            src = f"({src})"
+        parts = [src]
+        for count, (op, operand) in enumerate(node.rest, 1):
+            operand_src, operand_prec, operand_height = self.emit(operand)
+            if operand_prec <= prec:
+                operand_src = f"({operand_src})"
+            parts.append(f" {op} {operand_src}")
+            height = max(height, operand_height)
+            if count % _CHUNK == 0 and count < len(node.rest):
+                parts = [self.spill("".join(parts))]
+                height = 0
+        return "".join(parts), prec, height + 1
+
+
+def _numeric_form(node, functions, constants):
+    # solve/integrate/diff take an expression in a bound variable as their
+    # first argument. It is compiled once into a float function of that
+    # variable, which the numeric routine then calls many times.
+    name = node.name
+    if len(node.args) != numeric.ARITY[name]:
+        raise ExpressionError(f"{name}() takes {numeric.ARITY[name]} arguments")
+    variable = node.args[1]
+    if not isinstance(variable, Name) or variable.name in constants:
+        raise ExpressionError(f"{name}() needs a variable name as its second argument")
+    variable = variable.name
+    func = CompiledExpression("", node.args[0], functions, constants).compile()
+    # Decimal expressions need Decimal inputs; the routines work in float
+    decimal_input = isinstance(constants.get("pi"), Decimal)
+
+    def form(env, *args):
+        scope = dict(env)
+
+        def f(t):
+            scope[variable] = Decimal(repr(t)) if decimal_input else t
+            return float(func(scope))
+
+        try:
+            result = numeric.run(name, f, *[float(arg) for arg in args])
+        except KeyError as e:
+            raise ExpressionError(f"Unknown variable '{e.args[0]}'") from None
+        # The result meets the rest of the tree, which is Decimal too
+        return Decimal(repr(result)) if decimal_input else result
+    return form
+
+
+def _nodes(tree):
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, Neg):
+            stack.append(node.operand)
+        elif isinstance(node, Pow):
+            stack.append(node.base)
+            stack.append(node.exponent)
+        elif isinstance(node, Chain):
+            stack.append(node.first)
+            stack.extend(operand for _, operand in node.rest)
+        elif isinstance(node, Call):
+            stack.extend(node.args)
+
+
+def free_variables(tree):
+    # Names the expression reads from its environment. A variable bound by
+    # solve/integrate/diff is only free outside that call.
+    names = set()
+    stack = [(tree, frozenset())]
+    while stack:
+        node, bound = stack.pop()
+        if isinstance(node, Name):
+            if node.name not in CONSTANTS and node.name not in bound:
+                names.add(node.name)
+        elif isinstance(node, Neg):
+            stack.append((node.operand, bound))
+        elif isinstance(node, Pow):
+            stack.append((node.base, bound))
+            stack.append((node.exponent, bound))
+        elif isinstance(node, Chain):
+            stack.append((node.first, bound))
+            stack.extend((operand, bound) for _, operand in node.rest)
+        elif isinstance(node, Call):
+            if (node.name in numeric.ARITY and len(node.args) > 1
+                    and isinstance(node.args[1], Name)):
+                stack.append((node.args[0], bound | {node.args[1].name}))
+                stack.extend((arg, bound) for arg in node.args[2:])
+            else:
+                stack.extend((arg, bound) for arg in node.args)
+    return frozenset(names)
+
+
+def function_names(tree):
+    # Name of every call in the tree, repeated once per call site
+    return tuple(node.name for node in _nodes(tree) if isinstance(node, Call))
+
+
+_OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+}
+
+
+def interpret(node, functions, env, constants=CONSTANTS):
+    # Direct tree walk; cheaper than code generation for one-off expressions
+    if isinstance(node, Num):
+        return node.value
+    if isinstance(node, Name):
+        value = constants.get(node.name)
+        if value is None:
+            try:
+                value = env[node.name]
+            except KeyError:
+                raise ExpressionError(f"Unknown variable '{node.name}'") from None
+        return value
+    if isinstance(node, Chain):
+        value = interpret(node.first, functions, env, constants)
+        for op, operand in node.rest:
+            value = _OPERATORS[op](value, interpret(operand, functions, env, constants))
+        return value
+    if isinstance(node, Call):
+        if node.name in numeric.ARITY:
+            form = _numeric_form(node, functions, constants)
+            return form(env, *[interpret(arg, functions, env, constants)
+                               for arg in node.args[2:]])
+        function = functions.get(node.name)
+        if function is None:
+            raise ExpressionError(f"Unknown function '{node.name}'")
+        return function(*[interpret(arg, functions, env, constants) for arg in node.args])
+    if isinstance(node, Neg):
+        return -interpret(node.operand, functions, env, constants)
+    if isinstance(node, Pow):
+        power = functions.get("^", operator.pow)
+        return power(interpret(node.base, functions, env, constants),
+                     interpret(node.exponent, functions, env, constants))
+    raise ExpressionError(f"Cannot evaluate {node!r}")
+
+
+# Calls served by the tree walker before an expression is compiled to
+# Python code. Code generation costs several tree walks, so it only pays
+# off for expressions that are evaluated again.
+COMPILE_THRESHOLD = 1
+
+
+class CompiledExpression:
+    __slots__ = ("text", "tree", "functions", "constants", "calls", "_variables",
+                 "_function_names", "_source", "_func")
+
+    def __init__(self, text, tree, functions, constants=CONSTANTS):
+        self.text = text
+        self.tree = tree
+        self.functions = functions
+        self.constants = constants
+        self.calls = 0
+        self._variables = None
+        self._function_names = None
+        self._source = None
+        self._func = None
+
+    @property
+    def variables(self):
+        if self._variables is None:
+            self._variables = free_variables(self.tree)
+        return self._variables
+
+    @property
+    def function_names(self):
+        if self._function_names is None:
+            self._function_names = function_names(self.tree)
+        return self._function_names
+
+    @property
+    def source(self):
+        if self._source is None:
+            self.compile()
+        return self._source
+
+    def compile(self):
+        if self._func is None:
+            start = time.perf_counter() if profiler.enabled else None
+            tree = optimize(self.tree, self.functions, self.constants)
+            generator = _CodeGenerator(self.functions, self.constants, tree)
+            src, _, _ = generator.emit(tree)
+            body = generator.statements + [f"return {src}"]
+            source = "def _expr(env):\n" + "".join(f"    {line}\n" for line in body)
+            namespace = dict(generator.namespace)
+            exec(compile(source, "<expression>", "exec"), namespace)
+            self._source = source
+            self._func = namespace["_expr"]
+            if start is not None:
+                profiler.record("codegen", time.perf_counter() - start)
+        return self._func
+
+    def __call__(self, env=None):
+        if env is None:
+            env = {}
+        func = self._func
+        if func is None:
+            self.calls += 1
+            if self.calls <= COMPILE_THRESHOLD:
+                return interpret(self.tree, self.functions, env, self.constants)
+            func = self.compile()
+        try:
+            return func(env)
+        except KeyError as e:
+            name = e.args[0] if e.args else "?"
+            if name in self.variables:
+                raise ExpressionError(f"Unknown variable '{name}'") from None
+            raise
+
+    def __repr__(self):
+        return f"CompiledExpression({self.text!r})"
+
+
+def compile_tree(tree, functions, text="", constants=CONSTANTS):
+    return CompiledExpression(text, tree, functions, constants)
+
+
+_compiled_cache = LRUCache(maxsize=512)
+
+
+def compile_expression(text, degree_mode=True, precision=None, complex_mode=False,
+                       user_functions=None):
+    # Compiled expressions are cached on the normalized text and evaluation
+    # mode, so repeated evaluations (including ones that only change Ans)
+    # skip tokenizing, parsing and code generation entirely.
+    # precision=None evaluates in float; a digit count evaluates in Decimal.
+    # complex_mode lets real-domain failures promote to complex results
+    # (float mode only). user_functions is a userfunctions.FunctionLibrary
+    # whose functions can be called next to the built-ins.
+    if precision is not None:
+        complex_mode = False
+    stamp = user_functions.stamp if user_functions else None
+    key = (normalize(text), degree_mode, precision, complex_mode, stamp)
+    compiled = _compiled_cache.get(key)
+    if compiled is None:
+        number = None
+        if precision is not None:
+            number = Decimal
+            functions = precise.function_table(degree_mode)
+            constants = precise.constants(precision + precise.GUARD_DIGITS)
+        elif complex_mode:
+            functions, constants = complex_function_table(degree_mode), COMPLEX_CONSTANTS
+        else:
+            functions, constants = function_table(degree_mode), CONSTANTS
+        if stamp is not None:
+            functions = user_functions.table(key[1:4], functions, constants, number)
+        compiled = compile_tree(parse(key[0], number=number), functions, key[0], constants)
+        _compiled_cache.put(key, compiled)
+    return compiled
+
+
+def compile_cache():
+    return _compiled_cache
+
+
+def parse_number(text):
+    # Turn a formatted result (e.g. last_answer) back into a number
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return complex(text)
@@ -0,0 +1,322 @@
+import cmath
+import math
+
+from .bignum import BigFactorial, factorial
+
+
+# Trigonometric functions that handle degrees/radians conversion. Degree
+# arguments are reduced exactly (fmod is exact in floating point) to
+# [-180, 180] and then to within 45 degrees of a multiple of 90, so only a
+# small angle is ever converted to radians: sin(180) is exactly 0, tan(90)
+# is a domain error and sin(1e22) is still accurate. Multiples of 30 and 45
+# degrees come straight from tables of correctly rounded values.
+_SQRT_HALF = math.sqrt(0.5)
+_SQRT3_HALF = math.sqrt(3) / 2
+_TAN_30 = math.sqrt(3) / 3
+_TAN_60 = math.sqrt(3)
+_LN10 = math.log(10)
+
+_SIN_DEGREES = {
+    0: 0.0, 30: 0.5, 45: _SQRT_HALF, 60: _SQRT3_HALF, 90: 1.0,
+    120: _SQRT3_HALF, 135: _SQRT_HALF, 150: 0.5, 180: 0.0,
+}
+_TAN_DEGREES = {
+    0: 0.0, 30: _TAN_30, 45: 1.0, 60: _TAN_60,
+    120: -_TAN_60, 135: -1.0, 150: -_TAN_30, 180: 0.0,
+}
+# Inverse tables map the values back to their angles
+_ASIN_DEGREES = {value: angle for angle, value in _SIN_DEGREES.items() if angle <= 90}
+_ASIN_DEGREES.update({-value: -angle for value, angle in _ASIN_DEGREES.items()})
+_ACOS_DEGREES = {value: 90 - angle for value, angle in _ASIN_DEGREES.items()}
+_ATAN_DEGREES = {value: angle for angle, value in _TAN_DEGREES.items() if angle < 90}
+_ATAN_DEGREES.update({-value: -angle for value, angle in _ATAN_DEGREES.items()})
+
+
+def _reduce_degrees(x):
+    # x modulo 360 in [-180, 180], exactly
+    r = x % 360 if type(x) is int else math.fmod(x, 360.0)
+    if r > 180:
+        r -= 360
+    elif r < -180:
+        r += 360
+    return r
+
+
+def _quadrant(r):
+    # r = 90 q + d with |d| <= 45; exact for r in [-180, 180]
+    if r != r:
+        return 0, r
+    q = round(r / 90)
+    return q & 3, math.radians(r - 90 * q)
+
+
+def sin_deg(x):
+    r = _reduce_degrees(x)
+    value = _SIN_DEGREES.get(abs(r))
+    if value is not None:
+        return -value if r < 0 else value
+    q, d = _quadrant(r)
+    if q == 0:
+        return math.sin(d)
+    if q == 1:
+        return math.cos(d)
+    if q == 2:
+        return -math.sin(d)
+    return -math.cos(d)
+
+
+def cos_deg(x):
+    r = abs(_reduce_degrees(x))
+    value = _SIN_DEGREES.get(90 - r if r <= 90 else r - 90)
+    if value is not None:
+        return value if r <= 90 else -value
+    q, d = _quadrant(r)
+    if q == 0:
+        return math.cos(d)
+    if q == 1:
+        return -math.sin(d)
+    return -math.cos(d)
+
+
+def tan_deg(x):
+    r = _reduce_degrees(x)
+    value = _TAN_DEGREES.get(abs(r))
+    if value is not None:
+        return -value if r < 0 else value
+    if abs(r) == 90:
+        raise ValueError("math domain error")
+    q, d = _quadrant(r)
+    if q & 1:
+        return -math.cos(d) / math.sin(d)
+    return math.tan(d)
+
+
+def asin_deg(x):
+    angle = _ASIN_DEGREES.get(x)
+    if angle is not None:
+        return float(angle)
+    return math.degrees(math.asin(x))
+
+
+def acos_deg(x):
+    angle = _ACOS_DEGREES.get(x)
+    if angle is not None:
+        return float(angle)
+    return math.degrees(math.acos(x))
+
+
+def atan_deg(x):
+    angle = _ATAN_DEGREES.get(x)
+    if angle is not None:
+        return float(angle)
+    return math.degrees(math.atan(x))
+
+
+def cbrt(x):
+    # Cube root function
+    if x >= 0:
+        return math.pow(x, 1/3)
+    else:
+        return -math.pow(abs(x), 1/3)
+
+
+# A BigFactorial cannot be converted to float, but it knows its own log10
+def log10(x):
+    if isinstance(x, BigFactorial):
+        return float(x.log10())
+    return math.log10(x)
+
+
+def log(x, base=None):
+    if isinstance(x, BigFactorial) or isinstance(base, BigFactorial):
+        if base is None:
+            return log10(x) * _LN10
+        return log10(x) / log10(base)
+    if base is None:
+        return math.log(x)
+    return math.log(x, base)
+
+
+def real_power(base, exponent):
+    # "^" outside complex mode: a negative base with a fractional exponent
+    # is a domain error, like sqrt(-1), rather than a complex result
+    result = base ** exponent
+    if type(result) is complex:
+        raise ValueError("math domain error")
+    return result
+
+
+# "^" cannot be a function name, so the power operator is looked up in the
+# same table; tables without it use the plain ** operator
+_COMMON_FUNCTIONS = {
+    "^": real_power,
+    "log10": log10,
+    "log": log,
+    "exp": math.exp,
+    "sqrt": math.sqrt,
+    "cbrt": cbrt,
+    "abs": abs,
+    "fact": factorial,
+}
+
+DEGREE_FUNCTIONS = dict(_COMMON_FUNCTIONS, **{
+    "sin": sin_deg,
+    "cos": cos_deg,
+    "tan": tan_deg,
+    "asin": asin_deg,
+    "acos": acos_deg,
+    "atan": atan_deg,
+})
+
+RADIAN_FUNCTIONS = dict(_COMMON_FUNCTIONS, **{
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+})
+
+CONSTANTS = {
+    "pi": math.pi,
+    "e": math.e,
+}
+
+
+def function_table(degree_mode):
+    return DEGREE_FUNCTIONS if degree_mode else RADIAN_FUNCTIONS
+
+
+# Complex mode: each function stays on the math (float) path while its
+# argument is real and inside the real domain, and switches to cmath only
+# for the call that needs it, e.g. sqrt(-1), log(-2) or asin(2).
+_DEGREES_PER_RADIAN = 180 / math.pi
+
+
+def complex_sqrt(x):
+    if type(x) is not complex and x >= 0:
+        return math.sqrt(x)
+    return cmath.sqrt(x)
+
+
+def complex_log(x, base=None):
+    if type(x) is not complex and x > 0:
+        if base is None:
+            return log(x)
+        if type(base) is not complex and base > 0:
+            return log(x, base)
+    if base is None:
+        return cmath.log(x)
+    return cmath.log(x, base)
+
+
+def complex_log10(x):
+    if type(x) is not complex and x > 0:
+        return log10(x)
+    return cmath.log10(x)
+
+
+def complex_exp(x):
+    if type(x) is complex:
+        return cmath.exp(x)
+    return math.exp(x)
+
+
+def complex_sin(x):
+    if type(x) is complex:
+        return cmath.sin(x)
+    return math.sin(x)
+
+
+def complex_cos(x):
+    if type(x) is complex:
+        return cmath.cos(x)
+    return math.cos(x)
+
+
+def complex_tan(x):
+    if type(x) is complex:
+        return cmath.tan(x)
+    return math.tan(x)
+
+
+def complex_asin(x):
+    if type(x) is not complex and -1 <= x <= 1:
+        return math.asin(x)
+    return cmath.asin(x)
+
+
+def complex_acos(x):
+    if type(x) is not complex and -1 <= x <= 1:
+        return math.acos(x)
+    return cmath.acos(x)
+
+
+def complex_atan(x):
+    if type(x) is complex:
+        return cmath.atan(x)
+    return math.atan(x)
+
+
+def complex_cbrt(x):
+    # Real input keeps the sign-correct real cube root; complex input gets
+    # the principal root
+    if type(x) is complex:
+        return x ** (1/3)
+    return cbrt(x)
+
+
+_COMPLEX_COMMON_FUNCTIONS = {
+    "log10": complex_log10,
+    "log": complex_log,
+    "exp": complex_exp,
+    "sqrt": complex_sqrt,
+    "cbrt": complex_cbrt,
+    "abs": abs,
+    "fact": factorial,
+}
+
+def _complex_degrees(real, complex_function, to_radians):
+    # Real arguments take the exact degree path; complex ones convert
+    def function(x):
+        if type(x) is complex:
+            return complex_function(x / _DEGREES_PER_RADIAN) if to_radians else \
+                complex_function(x) * _DEGREES_PER_RADIAN
+        return real(x)
+    return function
+
+
+def _complex_inverse_degrees(real, complex_function):
+    # Inside [-1, 1] the real degree function applies; outside, the complex
+    # result is converted to degrees
+    def function(x):
+        if type(x) is not complex and -1 <= x <= 1:
+            return real(x)
+        return complex_function(x) * _DEGREES_PER_RADIAN
+    return function
+
+
+COMPLEX_DEGREE_FUNCTIONS = dict(_COMPLEX_COMMON_FUNCTIONS, **{
+    "sin": _complex_degrees(sin_deg, cmath.sin, True),
+    "cos": _complex_degrees(cos_deg, cmath.cos, True),
+    "tan": _complex_degrees(tan_deg, cmath.tan, True),
+    "asin": _complex_inverse_degrees(asin_deg, cmath.asin),
+    "acos": _complex_inverse_degrees(acos_deg, cmath.acos),
+    "atan": _complex_degrees(atan_deg, cmath.atan, False),
+})
+
+COMPLEX_RADIAN_FUNCTIONS = dict(_COMPLEX_COMMON_FUNCTIONS, **{
+    "sin": complex_sin,
+    "cos": complex_cos,
+    "tan": complex_tan,
+    "asin": complex_asin,
+    "acos": complex_acos,
+    "atan": complex_atan,
+})
+
+# "i" is the imaginary unit in complex mode
+COMPLEX_CONSTANTS = dict(CONSTANTS, i=1j)
+
+
+def complex_function_table(degree_mode):
+    return COMPLEX_DEGREE_FUNCTIONS if degree_mode else COMPLEX_RADIAN_FUNCTIONS
@@ -0,0 +1,307 @@
+import bisect
+import math
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+
+class HistoryBuffer:
+    # Fixed-capacity ring buffer: appending and indexing are O(1), and once
+    # full the oldest entry is overwritten.
+    def __init__(self, capacity=1000):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._start = 0
+        self._size = 0
+
+    def append(self, item):
+        end = self._start + self._size
+        if end >= self.capacity:
+            end -= self.capacity
+        self._items[end] = item
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = end + 1 if end + 1 < self.capacity else 0
+
+    def clear(self):
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("history index out of range")
+        index += self._start
+        if index >= self.capacity:
+            index -= self.capacity
+        return self._items[index]
+
+    def window(self, start, count):
+        # Entries [start, start + count), clipped to the buffer
+        start = max(0, start)
+        stop = min(self._size, start + count)
+        return [self[i] for i in range(start, stop)]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+
+HistoryEntry = namedtuple("HistoryEntry", "expression result mode timestamp")
+
+# Index record per entry: data offset, data length, numeric result (nan
+# when the result is not a real number)
+_INDEX = struct.Struct("<QId")
+
+
+def _numeric(result):
+    try:
+        return float(result)
+    except (TypeError, ValueError, OverflowError):
+        return math.nan
+
+
+def _field(text):
+    return str(text).replace("\t", " ").replace("\n", " ")
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class HistoryLog:
+    # Append-only history on disk. Entries are written to `path` as
+    # "expression<TAB>result<TAB>mode<TAB>timestamp" lines and a fixed-size
+    # binary index in `path + ".idx"` locates each one, so lookups read
+    # through mmap instead of loading the file. Searches use in-memory
+    # indexes built from the log on the first search and kept up to date
+    # by append: the expressions and the numeric results sorted for
+    # bisection, and the entries containing each trigram of their text.
+    def __init__(self, path, flush_every=32, flush_interval=2.0):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._data = open(path, "ab")
+        self._index = open(self.index_path, "ab")
+        self._size = self._data.tell()
+        self._count = self._index.tell() // _INDEX.size
+        if not self._index_is_valid():
+            self._rebuild_index()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._expressions = None
+        self._values = None
+        self._grams = None
+
+    # -- writing ------------------------------------------------------------
+
+    def append(self, expression, result, mode, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        record = (f"{_field(expression)}\t{_field(result)}\t{mode}\t{timestamp:.3f}\n"
+                  .encode("utf-8"))
+        value = _numeric(result)
+        self._data.write(record)
+        self._index.write(_INDEX.pack(self._size, len(record), value))
+        self._size += len(record)
+        if self._expressions is not None:
+            self._add_to_search(self._count, _field(expression), _field(result), value)
+        self._count += 1
+        self._pending += 1
+        if (self._pending >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._data.flush()
+            self._index.flush()
+            self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def clear(self):
+        self._data.truncate(0)
+        self._index.truncate(0)
+        self._data.seek(0)
+        self._index.seek(0)
+        self._size = 0
+        self._count = 0
+        self._pending = 0
+        self._expressions = self._values = self._grams = None
+
+    def close(self):
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+    def _index_is_valid(self):
+        if self._count == 0:
+            return self._size == 0
+        with open(self.index_path, "rb") as f:
+            f.seek((self._count - 1) * _INDEX.size)
+            offset, length, _ = _INDEX.unpack(f.read(_INDEX.size))
+        return offset + length == self._size and self._index.tell() % _INDEX.size == 0
+
+    def _rebuild_index(self):
+        # The index is derived data; after a crash between the two writes
+        # rebuild it from the log, dropping any half-written last line.
+        self._index.truncate(0)
+        self._index.seek(0)
+        offset = 0
+        count = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                fields = line.split(b"\t")
+                result = fields[1].decode("utf-8", "replace") if len(fields) > 1 else ""
+                self._index.write(_INDEX.pack(offset, len(line), _numeric(result)))
+                offset += len(line)
+                count += 1
+        self._data.truncate(offset)
+        self._data.seek(offset)
+        self._index.flush()
+        self._size = offset
+        self._count = count
+
+    # -- reading ------------------------------------------------------------
+
+    def __len__(self):
+        return self._count
+
+    def _maps(self):
+        self.flush()
+        with open(self.path, "rb") as data, open(self.index_path, "rb") as index:
+            return (mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ),
+                    mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @staticmethod
+    def _entry(data, index, i):
+        offset, length, _ = _INDEX.unpack_from(index, i * _INDEX.size)
+        expression, result, mode, timestamp = (
+            data[offset:offset + length - 1].decode("utf-8").split("\t"))
+        return HistoryEntry(expression, result, mode, float(timestamp))
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("history index out of range")
+        data, index = self._maps()
+        with data, index:
+            return self._entry(data, index, i)
+
+    def tail(self, n):
+        if n <= 0 or not self._count:
+            return []
+        data, index = self._maps()
+        with data, index:
+            return [self._entry(data, index, i)
+                    for i in range(max(0, self._count - n), self._count)]
+
+    # -- searching ----------------------------------------------------------
+
+    def _build_search(self):
+        # One pass over the log, on the first search
+        self._expressions = []
+        self._values = []
+        self._grams = {}
+        if not self._count:
+            return
+        data, index = self._maps()
+        with data, index:
+            for i, (offset, length, value) in enumerate(_INDEX.iter_unpack(index)):
+                expression, result, _ = (data[offset:offset + length - 1].decode("utf-8")
+                                         .split("\t", 2))
+                self._add_to_search(i, expression, result, value, False)
+        self._expressions.sort()
+        self._values.sort()
+
+    def _add_to_search(self, i, expression, result, value, keep_sorted=True):
+        add = bisect.insort if keep_sorted else list.append
+        add(self._expressions, (expression, i))
+        if not math.isnan(value):
+            add(self._values, (value, i))
+        for gram in _trigrams(expression + "\t" + result):
+            entries = self._grams.get(gram)
+            if entries is None:
+                self._grams[gram] = [i]
+            else:
+                entries.append(i)
+
+    def _entries(self, found, limit):
+        # (index, entry) for the first limit of the entry numbers found
+        found = sorted(found)[:limit]
+        if not found:
+            return []
+        data, index = self._maps()
+        with data, index:
+            return [(i, self._entry(data, index, i)) for i in found]
+
+    def search_prefix(self, prefix, limit=None):
+        # Entries whose expression starts with prefix, as (index, entry)
+        prefix = _field(prefix)
+        if not self._count or not prefix:
+            return []
+        if self._expressions is None:
+            self._build_search()
+        expressions = self._expressions
+        found = []
+        for k in range(bisect.bisect_left(expressions, (prefix,)), len(expressions)):
+            expression, i = expressions[k]
+            if not expression.startswith(prefix):
+                break
+            found.append(i)
+        return self._entries(found, limit)
+
+    def search(self, text, limit=None):
+        # Entries whose expression or result contains text, as (index, entry).
+        # Candidates are the entries holding every trigram of text; shorter
+        # text is looked for in every entry.
+        needle = _field(text)
+        if not self._count or not needle:
+            return []
+        if self._expressions is None:
+            self._build_search()
+        grams = _trigrams(needle)
+        if grams:
+            postings = sorted((self._grams.get(gram, ()) for gram in grams), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            candidates = range(self._count)
+        matches = []
+        data, index = self._maps()
+        with data, index:
+            for i in sorted(candidates):
+                entry = self._entry(data, index, i)
+                if needle in entry.expression + "\t" + entry.result:
+                    matches.append((i, entry))
+                    if limit is not None and len(matches) >= limit:
+                        break
+        return matches
+
+    def results_between(self, low, high, limit=None):
+        # Entries whose numeric result lies in [low, high], found by
+        # bisecting the sorted results
+        if not self._count or not low <= high:
+            return []
+        if self._values is None:
+            self._build_search()
+        values = self._values
+        start = bisect.bisect_left(values, (low,))
+        stop = bisect.bisect_right(values, (high, self._count))
+        return self._entries([i for _, i in values[start:stop]], limit)
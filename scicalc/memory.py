@@ -0,0 +1,267 @@
+import bisect
+import math
+from decimal import Decimal
+
+from .bignum import BigFactorial, exact_digits
+
+MEMORY_REGISTERS = 10
+
+
+class CompensatedSum:
+    # Running total without accumulated rounding error. Floats are kept as
+    # Shewchuk's non-overlapping partials (the representation math.fsum
+    # uses), so the total is correctly rounded however many values were
+    # added; the list stays a few entries long in practice. Integers are
+    # summed exactly and Decimals in the current context.
+    def __init__(self):
+        self.count = 0
+        self._exact = 0
+        self._real = []
+        self._imag = []
+        # inf and nan would poison the partials; they are summed directly
+        self._special = 0.0
+
+    @staticmethod
+    def _add_partial(partials, x):
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            high = x + y
+            low = y - (high - x)
+            if low:
+                partials[i] = low
+                i += 1
+            x = high
+        partials[i:] = [x]
+
+    def _add_float(self, partials, x):
+        if math.isfinite(x):
+            self._add_partial(partials, x)
+        elif partials is self._real:
+            self._special += x
+        else:
+            self._special += complex(0, x)
+
+    def add(self, value):
+        if isinstance(value, BigFactorial):
+            value = value.value
+        if isinstance(value, (int, Decimal)):
+            self._exact += value
+        elif isinstance(value, complex):
+            self._add_float(self._real, value.real)
+            self._add_float(self._imag, value.imag)
+        else:
+            self._add_float(self._real, float(value))
+        self.count += 1
+
+    @property
+    def value(self):
+        total = self._exact
+        if self._real:
+            real = math.fsum(self._real)
+            total += Decimal(repr(real)) if isinstance(total, Decimal) else real
+        if self._imag:
+            total = complex(total) + complex(0, math.fsum(self._imag))
+        if self._special:
+            total = (complex(total) if isinstance(self._special, complex) else total) \
+                + self._special
+        return total
+
+
+class P2Quantile:
+    # Streaming estimate of one quantile in constant memory (the P-squared
+    # algorithm of Jain and Chlamtac): five markers track the minimum, the
+    # maximum, the quantile and two points halfway to it, and their heights
+    # are adjusted by piecewise-parabolic interpolation as values arrive.
+    # Exact while five or fewer values have been seen.
+    def __init__(self, p):
+        if not 0 <= p <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = (0, p / 2, p, (1 + p) / 2, 1)
+
+    def add(self, x):
+        self.count += 1
+        q = self._heights
+        if len(q) < 5:
+            bisect.insort(q, x)
+            return
+        if x < q[0]:
+            q[0] = x
+            cell = 0
+        elif x >= q[4]:
+            q[4] = x
+            cell = 3
+        else:
+            cell = bisect.bisect_right(q, x) - 1
+        n = self._positions
+        for i in range(cell + 1, 5):
+            n[i] += 1
+        desired = self._desired
+        for i in range(5):
+            desired[i] += self._increments[i]
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if d >= 1 and n[i + 1] - n[i] > 1 or d <= -1 and n[i - 1] - n[i] < -1:
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = height
+                n[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    @property
+    def value(self):
+        q = self._heights
+        if not q:
+            return math.nan
+        if self.count > 5:
+            return q[2]
+        # Linear interpolation between the values seen so far
+        position = self.p * (len(q) - 1)
+        below = int(position)
+        if below == len(q) - 1:
+            return q[below]
+        return q[below] + (q[below + 1] - q[below]) * (position - below)
+
+
+class RunningStats:
+    # Summary of a stream of real values in constant memory: count, exact
+    # sum, mean and variance (Welford's update), min, max and streaming
+    # quantile estimates. Values are never stored.
+    QUANTILES = (0.25, 0.5, 0.75)
+
+    def __init__(self, quantiles=QUANTILES):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.total = CompensatedSum()
+        self.sketches = {p: P2Quantile(p) for p in quantiles}
+
+    def add(self, value):
+        if isinstance(value, complex):
+            if value.imag:
+                raise ValueError("statistics need real values")
+            value = value.real
+        try:
+            x = float(value)
+        except OverflowError:
+            raise ValueError("statistics need values that fit in a float") from None
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+        self.total.add(x)
+        for sketch in self.sketches.values():
+            sketch.add(x)
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    @property
+    def variance(self):
+        # Sample variance (n - 1 in the denominator)
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def quantile(self, p):
+        return self.sketches[p].value
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total.value,
+            "mean": self.mean if self.count else None,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+            "quantiles": {p: sketch.value for p, sketch in self.sketches.items()}
+            if self.count else {},
+        }
+
+
+class MemoryRegister:
+    def __init__(self):
+        self.sum = CompensatedSum()
+        self.stats = RunningStats()
+
+    def __bool__(self):
+        return bool(self.sum.count or self.stats.count)
+
+
+class MemoryBank:
+    # Numbered memory registers. M+ accumulates into the selected register's
+    # compensated sum, or in statistics mode feeds its running statistics;
+    # MR recalls the sum, or the mean in statistics mode.
+    def __init__(self, size=MEMORY_REGISTERS):
+        self.registers = [MemoryRegister() for _ in range(size)]
+        self.selected = 0
+        self.statistics = False
+
+    def __len__(self):
+        return len(self.registers)
+
+    def register(self, index=None):
+        return self.registers[self.selected if index is None else index]
+
+    def select(self, index):
+        if not 0 <= index < len(self.registers):
+            raise IndexError(f"no memory register {index}")
+        self.selected = index
+
+    def add(self, value, index=None):
+        register = self.register(index)
+        if self.statistics:
+            register.stats.add(value)
+        else:
+            register.sum.add(value)
+
+    def recall(self, index=None):
+        # None when the register holds nothing for the current mode
+        register = self.register(index)
+        if self.statistics:
+            return register.stats.mean if register.stats.count else None
+        return register.sum.value if register.sum.count else None
+
+    def clear(self, index=None):
+        self.registers[self.selected if index is None else index] = MemoryRegister()
+
+
+def _is_finite(x):
+    if isinstance(x, Decimal):
+        return x.is_finite()
+    return not isinstance(x, float) or math.isfinite(x)
+
+
+def recall_text(value):
+    # Text that evaluates back to value, for inserting a register into the
+    # expression (complex values use "i", so they need complex mode). inf
+    # and nan have no such text, so they raise ValueError.
+    parts = (value.real, value.imag) if isinstance(value, complex) else (value,)
+    if not all(_is_finite(part) for part in parts):
+        raise ValueError(f"{value} cannot be entered as an expression")
+    if isinstance(value, complex):
+        sign = "-" if value.imag < 0 else "+"
+        return f"({value.real!r}{sign}{abs(value.imag)!r}*i)"
+    return exact_digits(value)
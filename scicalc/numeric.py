@@ -0,0 +1,297 @@
+import heapq
+import math
+
+# Relative spacing of floats; the solver's step tolerance is built from it
+_EPSILON = 2.0 ** -52
+
+# 7-point Gauss / 15-point Kronrod nodes (non-negative half) and weights
+_KRONROD_NODES = (
+    0.991455371120812639206854697526329,
+    0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926,
+    0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013,
+    0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245,
+    0.000000000000000000000000000000000,
+)
+_KRONROD_WEIGHTS = (
+    0.022935322010529224963732008058970,
+    0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518,
+    0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550,
+    0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649,
+    0.209482141084727828012999174891714,
+)
+# Gauss weights for the odd-indexed Kronrod nodes (1, 3, 5, 7)
+_GAUSS_WEIGHTS = (
+    0.129484966168869693270611432679082,
+    0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975,
+    0.417959183673469387755102040816327,
+)
+
+INTEGRATE_MAX_INTERVALS = 2000
+
+# Subintervals searched for a sign change when solve() has none at its
+# bounds and Newton's method from the midpoint fails
+SOLVE_SCAN_PIECES = 64
+
+
+class NumericStats:
+    # Calls and function evaluations per operation, plus the evaluation
+    # count of the most recent one
+    def __init__(self):
+        self.calls = {}
+        self.evaluations = {}
+        self.last = None
+
+    def record(self, name, evaluations):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.evaluations[name] = self.evaluations.get(name, 0) + evaluations
+        self.last = (name, evaluations)
+
+    def merge(self, data):
+        # Add counts from another process's to_dict()
+        for name, entry in data.items():
+            self.calls[name] = self.calls.get(name, 0) + entry["calls"]
+            self.evaluations[name] = self.evaluations.get(name, 0) + entry["evaluations"]
+
+    def reset(self):
+        self.calls = {}
+        self.evaluations = {}
+        self.last = None
+
+    def to_dict(self):
+        return {name: {"calls": count, "evaluations": self.evaluations[name]}
+                for name, count in self.calls.items()}
+
+
+stats = NumericStats()
+
+
+# ---------------------------------------------------------------------------
+# Root finding
+# ---------------------------------------------------------------------------
+
+def _brent(f, a, b, fa, fb, xtol, max_iterations):
+    # Brent's method: inverse quadratic interpolation and secant steps,
+    # falling back to bisection whenever they would leave the bracket or
+    # converge too slowly
+    c, fc = b, fb
+    d = e = b - a
+    for _ in range(max_iterations):
+        if (fb > 0) == (fc > 0):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2 * _EPSILON * abs(b) + 0.5 * xtol
+        half = 0.5 * (c - b)
+        if abs(half) <= tol or fb == 0:
+            return b
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                p = 2 * half * s
+                q = 1 - s
+            else:
+                q = fa / fc
+                r = fb / fc
+                p = s * (2 * half * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * half * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = half
+        else:
+            d = e = half
+        a, fa = b, fb
+        b += d if abs(d) > tol else math.copysign(tol, half)
+        fb = f(b)
+    raise ValueError("solve() did not converge")
+
+
+def _newton(f, x, a, b, xtol, max_iterations):
+    # Newton steps with a central-difference slope, starting from x in
+    # [a, b]; hands over to Brent as soon as a step brackets a root. None
+    # if the iteration stalls or leaves [a, b].
+    fx = f(x)
+    for _ in range(max_iterations):
+        if fx == 0:
+            return x
+        h = 1e-7 * max(1.0, abs(x))
+        slope = (f(x + h) - f(x - h)) / (2 * h)
+        if slope == 0 or not math.isfinite(slope):
+            break
+        step = fx / slope
+        x_new = x - step
+        if not a <= x_new <= b:
+            break
+        f_new = f(x_new)
+        if (f_new > 0) != (fx > 0) and f_new != 0:
+            return _brent(f, x, x_new, fx, f_new, xtol, max_iterations)
+        if abs(step) <= 2 * _EPSILON * abs(x_new) + 0.5 * xtol:
+            return x_new
+        x, fx = x_new, f_new
+    return None
+
+
+def _scan(f, a, b, fa, xtol, max_iterations, pieces=SOLVE_SCAN_PIECES):
+    # Brent on the first of pieces equal subintervals whose ends differ
+    # in sign
+    lo, f_lo = a, fa
+    for i in range(1, pieces + 1):
+        hi = b if i == pieces else a + (b - a) * i / pieces
+        f_hi = f(hi)
+        if f_hi == 0:
+            return hi
+        if math.isfinite(f_lo) and math.isfinite(f_hi) and (f_lo > 0) != (f_hi > 0):
+            return _brent(f, lo, hi, f_lo, f_hi, xtol, max_iterations)
+        lo, f_lo = hi, f_hi
+    return None
+
+
+def solve(f, a, b, xtol=1e-15, max_iterations=200):
+    # Root of f in [a, b]. With a sign change at the bounds the root is
+    # bracketed and Brent's method always converges. Otherwise Newton's
+    # method is tried from the midpoint, then subintervals are searched for
+    # a sign change, and last Newton's method is tried from each bound.
+    if a > b:
+        a, b = b, a
+    fa, fb = f(a), f(b)
+    if fa == 0:
+        return a
+    if fb == 0:
+        return b
+    if not (math.isfinite(fa) and math.isfinite(fb)):
+        raise ValueError("solve() needs finite values at the bounds")
+    if (fa > 0) != (fb > 0):
+        return _brent(f, a, b, fa, fb, xtol, max_iterations)
+    root = _newton(f, (a + b) / 2, a, b, xtol, max_iterations)
+    if root is None:
+        root = _scan(f, a, b, fa, xtol, max_iterations)
+    if root is None:
+        root = _newton(f, a, a, b, xtol, max_iterations)
+    if root is None:
+        root = _newton(f, b, a, b, xtol, max_iterations)
+    if root is None:
+        raise ValueError("solve() found no root between the bounds")
+    return root
+
+
+# ---------------------------------------------------------------------------
+# Integration
+# ---------------------------------------------------------------------------
+
+def _kronrod(f, a, b):
+    # 15-point Kronrod estimate of the integral over [a, b] and its
+    # difference from the embedded 7-point Gauss estimate
+    center = (a + b) / 2
+    radius = (b - a) / 2
+    f_center = f(center)
+    kronrod = f_center * _KRONROD_WEIGHTS[7]
+    gauss = f_center * _GAUSS_WEIGHTS[3]
+    for i in range(7):
+        dx = radius * _KRONROD_NODES[i]
+        pair = f(center - dx) + f(center + dx)
+        kronrod += _KRONROD_WEIGHTS[i] * pair
+        if i % 2:
+            gauss += _GAUSS_WEIGHTS[i // 2] * pair
+    return kronrod * radius, abs((kronrod - gauss) * radius)
+
+
+def integrate(f, a, b, abs_tol=1e-12, rel_tol=1e-10, max_intervals=INTEGRATE_MAX_INTERVALS):
+    # Adaptive Gauss-Kronrod (G7/K15): the interval with the largest error
+    # estimate is bisected until the total error is within tolerance
+    if a == b:
+        return 0.0
+    if a > b:
+        return -integrate(f, b, a, abs_tol, rel_tol, max_intervals)
+    total, error = _kronrod(f, a, b)
+    heap = [(-error, a, b, total)]
+    while True:
+        # An infinite total also makes the tolerance infinite, so this has
+        # to come before the convergence test
+        if not (math.isfinite(total) and math.isfinite(error)):
+            raise ValueError("integrate() diverges")
+        if error <= max(abs_tol, rel_tol * abs(total)):
+            return total
+        if len(heap) >= max_intervals:
+            raise ValueError("integrate() did not converge")
+        neg_error, lo, hi, value = heapq.heappop(heap)
+        mid = (lo + hi) / 2
+        left, left_error = _kronrod(f, lo, mid)
+        right, right_error = _kronrod(f, mid, hi)
+        total += left + right - value
+        error += left_error + right_error + neg_error
+        heapq.heappush(heap, (-left_error, lo, mid, left))
+        heapq.heappush(heap, (-right_error, mid, hi, right))
+
+
+# ---------------------------------------------------------------------------
+# Differentiation
+# ---------------------------------------------------------------------------
+
+def diff(f, x, step=None, shrink=1.4, rows=10):
+    # Central differences with shrinking steps, extrapolated Richardson
+    # style (Ridders' method); returns the estimate with the smallest error
+    h = step if step is not None else 0.1 * max(1.0, abs(x))
+    shrink2 = shrink * shrink
+    table = [[(f(x + h) - f(x - h)) / (2 * h)]]
+    best, best_error = table[0][0], math.inf
+    for i in range(1, rows):
+        h /= shrink
+        row = [(f(x + h) - f(x - h)) / (2 * h)]
+        factor = shrink2
+        for j in range(1, i + 1):
+            row.append((row[j - 1] * factor - table[i - 1][j - 1]) / (factor - 1))
+            factor *= shrink2
+            error = max(abs(row[j] - row[j - 1]), abs(row[j] - table[i - 1][j - 1]))
+            if error <= best_error:
+                best, best_error = row[j], error
+        table.append(row)
+        # Stop once higher orders make things worse
+        if abs(row[i] - table[i - 1][i - 1]) >= 2 * best_error:
+            break
+    if not math.isfinite(best):
+        raise ValueError("diff() is undefined at this point")
+    return best
+
+
+OPERATIONS = {
+    "solve": solve,
+    "integrate": integrate,
+    "diff": diff,
+}
+
+# Arguments of each form in the expression language:
+# solve(expr, x, a, b), integrate(expr, x, a, b), diff(expr, x, at)
+ARITY = {
+    "solve": 4,
+    "integrate": 4,
+    "diff": 3,
+}
+
+
+def run(name, f, *args):
+    # Run an operation on f, recording how many times it evaluated f
+    count = 0
+
+    def counted(t):
+        nonlocal count
+        count += 1
+        return f(t)
+
+    try:
+        return OPERATIONS[name](counted, *args)
+    except TypeError:
+        raise ValueError(f"{name}() needs a real-valued expression") from None
+    finally:
+        stats.record(name, count)
@@ -0,0 +1,149 @@
+import math
+
+from .cache import LRUCache
+from .expression import normalize
+from .vectorized import _require_numpy, compile_vectorized, np
+
+# A viewport is covered by tiles whose width is a power of two between
+# span / (2 * TILES_PER_VIEW) and span / TILES_PER_VIEW, so panning and
+# zooming within a factor of two reuse the tiles already sampled.
+TILES_PER_VIEW = 8
+TILE_POINTS = 64
+MAX_DEPTH = 8
+
+# A midpoint deviating from the chord by more than this fraction of the
+# tile's value range gets its interval subdivided
+CURVATURE_TOLERANCE = 0.002
+# Intervals that still jump by more than this fraction of the value range
+# after MAX_DEPTH subdivisions, with the midpoint outside the endpoints,
+# are treated as discontinuities (e.g. tan at 90 degrees)
+JUMP_TOLERANCE = 0.25
+
+
+def _value_range(ys):
+    finite = ys[np.isfinite(ys)]
+    if finite.size < 2:
+        return 1.0
+    low, high = np.percentile(finite, (2, 98))
+    return max(high - low, 1e-12 * max(abs(low), abs(high)), 1e-300)
+
+
+class FunctionSampler:
+    # Samples an expression in one variable for plotting. Each tile starts
+    # from a uniform vectorized evaluation and only the intervals where the
+    # curve bends, leaves its domain or jumps are subdivided further. Tiles
+    # are cached, so redrawing a panned or zoomed view mostly reuses them.
+    def __init__(self, expression, variable="x", degree_mode=True, env=None,
+                 tile_points=TILE_POINTS, max_depth=MAX_DEPTH, cache_size=256):
+        _require_numpy()
+        self.expression = normalize(expression)
+        self.variable = variable
+        self.degree_mode = degree_mode
+        self.env = dict(env) if env else {}
+        self.tile_points = tile_points
+        self.max_depth = max_depth
+        self.evaluations = 0
+        self._compiled = compile_vectorized(self.expression, degree_mode)
+        self._tiles = LRUCache(cache_size)
+
+    def evaluate(self, xs):
+        scope = dict(self.env)
+        scope[self.variable] = xs
+        with np.errstate(all="ignore"):
+            ys = np.asarray(self._compiled(scope), dtype=float)
+        self.evaluations += xs.size
+        if ys.shape != xs.shape:
+            ys = np.broadcast_to(ys, xs.shape).copy()
+        return ys
+
+    def _refine(self, xs, ys):
+        span = _value_range(ys)
+        # Every interval is a candidate at the first level; afterwards only
+        # the two halves of an interval that was split
+        candidates = np.ones(xs.size - 1, dtype=bool)
+        for _ in range(self.max_depth):
+            index = np.flatnonzero(candidates)
+            if not index.size:
+                break
+            x0, x1 = xs[index], xs[index + 1]
+            y0, y1 = ys[index], ys[index + 1]
+            mid_x = (x0 + x1) / 2
+            mid_y = self.evaluate(mid_x)
+            finite = np.isfinite(y0) & np.isfinite(y1) & np.isfinite(mid_y)
+            with np.errstate(invalid="ignore"):
+                bent = np.abs(mid_y - (y0 + y1) / 2) > CURVATURE_TOLERANCE * span
+            # Domain edges: some of the three points are finite, some not
+            edge = ~finite & (np.isfinite(y0) | np.isfinite(y1) | np.isfinite(mid_y))
+            split = (finite & bent) | edge
+            if not split.any():
+                break
+            at = index[split] + 1
+            xs = np.insert(xs, at, mid_x[split])
+            ys = np.insert(ys, at, mid_y[split])
+            # Position of each inserted midpoint in the new arrays; the
+            # intervals on both sides of it are the next candidates
+            new_positions = at + np.arange(at.size)
+            candidates = np.zeros(xs.size - 1, dtype=bool)
+            candidates[new_positions - 1] = True
+            candidates[new_positions] = True
+        return xs, ys, span
+
+    def _mark_breaks(self, xs, ys, span):
+        # Put a nan between the endpoints of intervals that still jump, so
+        # the plot does not draw a vertical line across a pole
+        y0, y1 = ys[:-1], ys[1:]
+        with np.errstate(invalid="ignore"):
+            jump = np.abs(y1 - y0) > JUMP_TOLERANCE * span
+        index = np.flatnonzero(jump)
+        if not index.size:
+            return xs, ys
+        mid_y = self.evaluate((xs[index] + xs[index + 1]) / 2)
+        low = np.minimum(y0[index], y1[index])
+        high = np.maximum(y0[index], y1[index])
+        with np.errstate(invalid="ignore"):
+            outside = ~((mid_y >= low) & (mid_y <= high))
+        index = index[outside]
+        if not index.size:
+            return xs, ys
+        at = index + 1
+        return (np.insert(xs, at, (xs[index] + xs[index + 1]) / 2),
+                np.insert(ys, at, np.nan))
+
+    def tile(self, level, i):
+        # Samples of tile i at a zoom level: x in [i * 2^level, (i+1) * 2^level]
+        key = (level, i)
+        samples = self._tiles.get(key)
+        if samples is None:
+            width = math.ldexp(1.0, level)
+            xs = np.linspace(i * width, (i + 1) * width, self.tile_points + 1)
+            ys = self.evaluate(xs)
+            xs, ys, span = self._refine(xs, ys)
+            samples = self._mark_breaks(xs, ys, span)
+            self._tiles.put(key, samples)
+        return samples
+
+    def samples(self, x_min, x_max):
+        # (xs, ys) covering [x_min, x_max]; ys is nan where the expression
+        # is undefined or the curve is broken
+        if not x_max > x_min:
+            raise ValueError("x_max must be greater than x_min")
+        level = math.floor(math.log2((x_max - x_min) / TILES_PER_VIEW))
+        width = math.ldexp(1.0, level)
+        first = math.floor(x_min / width)
+        last = math.ceil(x_max / width)
+        xs, ys = [], []
+        for i in range(first, last):
+            tile_xs, tile_ys = self.tile(level, i)
+            # Neighbouring tiles share an endpoint
+            start = 1 if xs else 0
+            xs.append(tile_xs[start:])
+            ys.append(tile_ys[start:])
+        return np.concatenate(xs), np.concatenate(ys)
+
+    def cache_stats(self):
+        return self._tiles.stats()
+
+
+def sample(expression, x_min, x_max, variable="x", degree_mode=True, env=None):
+    # One-off adaptive sampling of expression over [x_min, x_max]
+    return FunctionSampler(expression, variable, degree_mode, env).samples(x_min, x_max)
@@ -0,0 +1,377 @@
+from decimal import (Decimal, DivisionByZero, InvalidOperation, Overflow, getcontext,
+                     localcontext)
+
+from .bignum import LAZY_FACTORIAL_THRESHOLD, BigFactorial, _as_integer, exact_factorial
+
+# Extra digits carried while evaluating, dropped when the result is rounded
+GUARD_DIGITS = 10
+
+# Largest precision computed so far for each constant; lower precisions are
+# rounded from it instead of being recomputed
+_constants = {}
+
+
+def _chudnovsky_pi(digits):
+    # Chudnovsky series summed by binary splitting (~14 digits per term)
+    c3_over_24 = 640320 ** 3 // 24
+
+    def split(a, b):
+        if b - a == 1:
+            if a == 0:
+                p = q = 1
+            else:
+                p = (6 * a - 5) * (2 * a - 1) * (6 * a - 1)
+                q = a * a * a * c3_over_24
+            t = p * (13591409 + 545140134 * a)
+            return p, q, -t if a & 1 else t
+        m = (a + b) // 2
+        p1, q1, t1 = split(a, m)
+        p2, q2, t2 = split(m, b)
+        return p1 * p2, q1 * q2, q2 * t1 + p1 * t2
+
+    _, q, t = split(0, digits // 14 + 2)
+    with localcontext() as ctx:
+        ctx.prec = digits + 5
+        return Decimal(426880) * Decimal(10005).sqrt() * q / t
+
+
+_CONSTANT_SERIES = {
+    "pi": _chudnovsky_pi,
+    "e": lambda digits: Decimal(1).exp(),
+    "ln2": lambda digits: Decimal(2).ln(),
+    "ln10": lambda digits: Decimal(10).ln(),
+}
+
+
+def constant(name, digits=None):
+    if digits is None:
+        digits = getcontext().prec
+    cached = _constants.get(name)
+    if cached is None or cached[0] < digits:
+        with localcontext() as ctx:
+            ctx.prec = digits + 5
+            cached = (digits, +_CONSTANT_SERIES[name](digits))
+        _constants[name] = cached
+    with localcontext() as ctx:
+        ctx.prec = digits
+        return +cached[1]
+
+
+def constants(digits):
+    return {"pi": constant("pi", digits), "e": constant("e", digits)}
+
+
+def _domain_error():
+    return ValueError("math domain error")
+
+
+def _to_decimal(x):
+    if isinstance(x, Decimal):
+        return x
+    if isinstance(x, float):
+        return Decimal(repr(x))
+    if isinstance(x, BigFactorial):
+        x = x.value
+    if isinstance(x, int):
+        return getcontext().create_decimal(x)
+    raise TypeError(f"Precise mode does not support {type(x).__name__} values")
+
+
+def _sin_cos(x):
+    prec = getcontext().prec
+    with localcontext() as ctx:
+        # Reduce into [-pi, pi] with enough digits of pi to cover x's size
+        ctx.prec = prec + GUARD_DIGITS + max(0, x.adjusted())
+        r = x.remainder_near(2 * constant("pi", ctx.prec))
+        ctx.prec = prec + GUARD_DIGITS
+        # Taylor series on r / 2^k, then k double-angle steps
+        halvings = 8
+        y = r / (1 << halvings)
+        y2 = y * y
+        term = s = y
+        n = 1
+        while term and term.adjusted() >= s.adjusted() - ctx.prec - 2:
+            term = -term * y2 / ((n + 1) * (n + 2))
+            s += term
+            n += 2
+        c = (1 - s * s).sqrt()
+        for _ in range(halvings):
+            s, c = 2 * s * c, c * c - s * s
+    return +s, +c
+
+
+def sin(x):
+    return _sin_cos(_to_decimal(x))[0]
+
+
+def cos(x):
+    return _sin_cos(_to_decimal(x))[1]
+
+
+def tan(x):
+    s, c = _sin_cos(_to_decimal(x))
+    if not c:
+        raise _domain_error()
+    return s / c
+
+
+def atan(x):
+    x = _to_decimal(x)
+    prec = getcontext().prec
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS
+        negative = x < 0
+        x = abs(x)
+        invert = x > 1
+        if invert:
+            x = 1 / x
+        # atan(x) = 2 atan(x / (1 + sqrt(1 + x^2))) shrinks x before the series
+        halvings = 8
+        for _ in range(halvings):
+            x = x / (1 + (1 + x * x).sqrt())
+        x2 = x * x
+        term = result = x
+        n = 1
+        while term and term.adjusted() >= result.adjusted() - ctx.prec - 2:
+            term = -term * x2
+            n += 2
+            result += term / n
+        result *= 1 << halvings
+        if invert:
+            result = constant("pi", ctx.prec) / 2 - result
+        if negative:
+            result = -result
+    return +result
+
+
+def asin(x):
+    x = _to_decimal(x)
+    if abs(x) > 1:
+        raise _domain_error()
+    if abs(x) == 1:
+        return constant("pi") / 2 * x
+    with localcontext() as ctx:
+        ctx.prec += GUARD_DIGITS
+        result = atan(x / (1 - x * x).sqrt())
+    return +result
+
+
+def acos(x):
+    x = _to_decimal(x)
+    with localcontext() as ctx:
+        ctx.prec += GUARD_DIGITS
+        result = constant("pi") / 2 - asin(x)
+    return +result
+
+
+def _radians(x):
+    return _to_decimal(x) * constant("pi") / 180
+
+
+def _degrees(x):
+    return x * 180 / constant("pi")
+
+
+# Degree functions reduce their argument exactly modulo 360 and look up
+# multiples of 30 and 45 degrees, so sin(180) is exactly 0 and tan(90) is a
+# domain error. The tables hold values at one precision each; the inverse
+# functions use them to map those values back to exact angles.
+_special_angles = {}
+
+
+def _special_tables():
+    prec = getcontext().prec
+    tables = _special_angles.get(prec)
+    if tables is None:
+        half_sqrt2 = Decimal(2).sqrt() / 2
+        sqrt3 = Decimal(3).sqrt()
+        sines = {0: Decimal(0), 30: Decimal("0.5"), 45: half_sqrt2, 60: sqrt3 / 2,
+                 90: Decimal(1)}
+        tangents = {0: Decimal(0), 30: sqrt3 / 3, 45: Decimal(1), 60: sqrt3}
+        for angle in (30, 45, 60):
+            sines[180 - angle] = sines[angle]
+            tangents[180 - angle] = -tangents[angle]
+        sines[180] = tangents[180] = Decimal(0)
+        arcsines = {value: angle for angle, value in sines.items() if angle <= 90}
+        arctangents = {value: angle for angle, value in tangents.items() if angle < 90}
+        tables = _special_angles[prec] = (sines, tangents, arcsines, arctangents)
+    return tables
+
+
+def _reduce_degrees(x):
+    # x modulo 360 in [-180, 180], exactly
+    x = _to_decimal(x)
+    with localcontext() as ctx:
+        ctx.prec = max(ctx.prec, x.adjusted() + 3)
+        return x.remainder_near(360)
+
+
+def sin_degrees(x):
+    r = _reduce_degrees(x)
+    value = _special_tables()[0].get(abs(r))
+    if value is None:
+        return sin(_radians(r))
+    return -value if r < 0 else +value
+
+
+def cos_degrees(x):
+    a = abs(_reduce_degrees(x))
+    value = _special_tables()[0].get(90 - a if a <= 90 else a - 90)
+    if value is None:
+        return cos(_radians(a))
+    return +value if a <= 90 else -value
+
+
+def tan_degrees(x):
+    r = _reduce_degrees(x)
+    if abs(r) == 90:
+        raise _domain_error()
+    value = _special_tables()[1].get(abs(r))
+    if value is None:
+        return tan(_radians(r))
+    return -value if r < 0 else +value
+
+
+def _inverse_degrees(x, table, function):
+    x = _to_decimal(x)
+    angle = table.get(abs(x))
+    if angle is None:
+        return _degrees(function(x))
+    return Decimal(-angle if x < 0 else angle)
+
+
+def asin_degrees(x):
+    return _inverse_degrees(x, _special_tables()[2], asin)
+
+
+def acos_degrees(x):
+    x = _to_decimal(x)
+    angle = _special_tables()[2].get(abs(x))
+    if angle is None:
+        return _degrees(acos(x))
+    return Decimal(90 + angle if x < 0 else 90 - angle)
+
+
+def atan_degrees(x):
+    return _inverse_degrees(x, _special_tables()[3], atan)
+
+
+def log(x, base=None):
+    x = _to_decimal(x)
+    if x <= 0:
+        raise _domain_error()
+    if base is None:
+        return x.ln()
+    base = _to_decimal(base)
+    if base <= 0 or base == 1:
+        raise _domain_error()
+    with localcontext() as ctx:
+        ctx.prec += GUARD_DIGITS
+        ln_base = constant("ln2") if base == 2 else constant("ln10") if base == 10 else base.ln()
+        result = x.ln() / ln_base
+    return +result
+
+
+def log10(x):
+    x = _to_decimal(x)
+    if x <= 0:
+        raise _domain_error()
+    return x.log10()
+
+
+def exp(x):
+    return _to_decimal(x).exp()
+
+
+def sqrt(x):
+    x = _to_decimal(x)
+    if x < 0:
+        raise _domain_error()
+    return x.sqrt()
+
+
+def cbrt(x):
+    # Newton iteration from the float estimate; exact cubes come out exact
+    x = _to_decimal(x)
+    if not x:
+        return x
+    prec = getcontext().prec
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS
+        magnitude = abs(x)
+        y = Decimal(repr(float(magnitude) ** (1 / 3))) if magnitude.adjusted() < 300 else \
+            (magnitude.ln() / 3).exp()
+        while True:
+            next_y = y - (y * y * y - magnitude) / (3 * y * y)
+            if next_y == y:
+                break
+            y = next_y
+        if x < 0:
+            y = -y
+    return +y
+
+
+def factorial(n):
+    if isinstance(n, Decimal):
+        if n != n.to_integral_value():
+            raise ValueError("factorial() only accepts integral values")
+        n = int(n)
+    n = _as_integer(n)
+    if n <= LAZY_FACTORIAL_THRESHOLD:
+        return getcontext().create_decimal(exact_factorial(n))
+    return BigFactorial(n)
+
+
+def _abs(x):
+    return abs(_to_decimal(x))
+
+
+_COMMON_FUNCTIONS = {
+    "log10": log10,
+    "log": log,
+    "exp": exp,
+    "sqrt": sqrt,
+    "cbrt": cbrt,
+    "abs": _abs,
+    "fact": factorial,
+}
+
+DEGREE_FUNCTIONS = dict(_COMMON_FUNCTIONS, **{
+    "sin": sin_degrees,
+    "cos": cos_degrees,
+    "tan": tan_degrees,
+    "asin": asin_degrees,
+    "acos": acos_degrees,
+    "atan": atan_degrees,
+})
+
+RADIAN_FUNCTIONS = dict(_COMMON_FUNCTIONS, **{
+    "sin": sin,
+    "cos": cos,
+    "tan": tan,
+    "asin": asin,
+    "acos": acos,
+    "atan": atan,
+})
+
+
+def function_table(degree_mode):
+    return DEGREE_FUNCTIONS if degree_mode else RADIAN_FUNCTIONS
+
+
+def evaluate(compiled, env, precision):
+    # Run a compiled Decimal expression with guard digits, then round the
+    # result to the requested precision
+    with localcontext() as ctx:
+        ctx.prec = precision + GUARD_DIGITS
+        scope = {name: _to_decimal(env[name]) for name in compiled.variables if name in env}
+        try:
+            result = compiled(scope)
+        except DivisionByZero:
+            raise ZeroDivisionError("division by zero") from None
+        except Overflow:
+            raise OverflowError("result too large") from None
+        except InvalidOperation:
+            raise _domain_error() from None
+        ctx.prec = precision
+        return +result if isinstance(result, Decimal) else result
@@ -0,0 +1,160 @@
+import operator
+from decimal import Decimal
+
+from . import numeric, precise
+from .bignum import LAZY_FACTORIAL_THRESHOLD
+from .engine import format_result
+from .expression import (END, NAME, OP, ExpressionError, Parser, Token, compile_tree, interpret,
+                         parse, tokenize)
+
+# Tokens after which the expression cannot be complete yet
+_OPEN_OPERATORS = frozenset("+-*/^(,")
+
+
+# The preview runs on the GUI thread, so it gives up on results that would
+# take long to compute (the full evaluation runs in a worker process)
+PREVIEW_MAX_BITS = 100_000
+
+# Above this many digits Decimal functions take too long for a keystroke;
+# such expressions, and the numeric forms (solve, integrate, diff), are
+# only computed by "="
+PREVIEW_MAX_PRECISION = 100
+
+
+def _bounded_table(table):
+    factorial = table["fact"]
+    power = table.get("^", operator.pow)
+
+    def bounded_factorial(n):
+        if n > LAZY_FACTORIAL_THRESHOLD:
+            raise OverflowError("preview result too large")
+        return factorial(n)
+
+    def bounded_power(base, exponent):
+        if (type(base) is int and type(exponent) is int and exponent > 0
+                and exponent * base.bit_length() > PREVIEW_MAX_BITS):
+            raise OverflowError("preview result too large")
+        return power(base, exponent)
+    return dict(table, fact=bounded_factorial, **{"^": bounded_power})
+
+
+def _word_start(text, end):
+    # Start of the number/name run ending at end. Re-lexing from there is
+    # enough because no token can reach back across an operator or space,
+    # except "1e+5" style exponents and "*" growing into "**".
+    i = end
+    while i > 0:
+        c = text[i - 1]
+        if c.isalnum() or c in "._":
+            i -= 1
+        elif c in "+-" and i >= 2 and text[i - 2] in "eE":
+            i -= 1
+        elif c == "*":
+            i -= 1
+        else:
+            break
+    return i
+
+
+class ExpressionPreview:
+    # Running result of a partially typed expression. Only the edited tail
+    # is re-lexed, and nothing is re-evaluated while the expression is
+    # incomplete (open parenthesis, trailing operator) or unchanged.
+    def __init__(self, engine):
+        self.engine = engine
+        self._text = ""
+        self._tokens = []
+        self._key = None
+        self._result = ""
+        self._evaluated_text = ""
+        self._tables = {}
+
+    def _function_table(self):
+        # User functions are left out: their bodies are compiled without
+        # these bounds, so calls to them get no preview
+        table = self.engine.function_table()
+        bounded = self._tables.get(id(table))
+        if bounded is None:
+            bounded = self._tables[id(table)] = _bounded_table(table)
+        return bounded
+
+    def tokens(self, text):
+        old = self._text
+        limit = min(len(old), len(text))
+        common = 0
+        while common < limit and old[common] == text[common]:
+            common += 1
+        restart = _word_start(text, common)
+        kept = self._tokens
+        keep = len(kept)
+        while keep and kept[keep - 1].end > restart:
+            keep -= 1
+        start = kept[keep - 1].end if keep else 0
+        self._tokens = kept[:keep] + tokenize(text, start)[:-1]
+        self._text = text
+        return self._tokens
+
+    def update(self, text):
+        if (self.engine.precision or 0) > PREVIEW_MAX_PRECISION:
+            self._key = None
+            self._result = ""
+            return ""
+        try:
+            tokens = self.tokens(text)
+        except ExpressionError:
+            self._text, self._tokens = "", []
+            return ""
+        if len(tokens) < 2:
+            # A lone number or name needs no preview
+            self._key = None
+            self._result = ""
+            return ""
+        last = tokens[-1]
+        depth = 0
+        for token in tokens:
+            if token.kind == OP:
+                if token.value == "(":
+                    depth += 1
+                elif token.value == ")":
+                    depth -= 1
+        variables = self.engine.variables()
+        constants = self.engine.constants()
+        if (depth > 0 or (last.kind == OP and last.value in _OPEN_OPERATORS)
+                or (last.kind == NAME and last.value not in constants
+                    and last.value not in variables)):
+            # Keep showing the value of the last complete prefix, unless
+            # that prefix has since been edited away
+            if not text.startswith(self._evaluated_text):
+                self._key = None
+                self._result = ""
+            return self._result
+        if any(token.kind == NAME and token.value in numeric.ARITY for token in tokens):
+            self._key = None
+            self._result = ""
+            return ""
+        key = (tuple((t.kind, t.value) for t in tokens), self.engine.is_degree_mode,
+               self.engine.precision, self.engine.is_complex_mode, self.engine.last_value)
+        if key == self._key:
+            return self._result
+        self._key = key
+        self._evaluated_text = text
+        try:
+            if self.engine.precision is None:
+                tree = Parser(tokens + [Token(END, None, last.end, last.end)]).parse()
+                value = interpret(tree, self._function_table(), variables, constants)
+            else:
+                # Decimal mode needs exact literals, so re-parse the text
+                compiled = compile_tree(parse(text, number=Decimal), self._function_table(),
+                                        text, constants)
+                value = precise.evaluate(compiled, variables, self.engine.precision)
+            self._result = format_result(value)
+        except (ArithmeticError, ValueError, TypeError, RecursionError):
+            self._result = ""
+        return self._result
+
+    def reset(self):
+        self._text = ""
+        self._tokens = []
+        self._key = None
+        self._result = ""
+        self._evaluated_text = ""
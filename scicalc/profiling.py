@@ -0,0 +1,172 @@
+import json
+import os
+import time
+from collections import Counter
+
+# Set to a non-empty value other than "0" to start with profiling enabled
+ENV_VAR = "SCICALC_PROFILE"
+
+
+class Histogram:
+    # Latency histogram with one bucket per power of two nanoseconds.
+    # Recording is an int conversion, a bit_length and a list increment,
+    # so it can stay on hot paths; quantiles are accurate to a factor of 2.
+    BUCKETS = 48  # up to 2^47 ns, about 39 hours
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        bucket = int(seconds * 1e9).bit_length()
+        self.counts[bucket if bucket < self.BUCKETS else self.BUCKETS - 1] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        # Upper edge of the bucket holding the q-th sample, clipped to the
+        # observed range
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                upper = (1 << bucket) / 1e9
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets_ns": {1 << i: count for i, count in enumerate(self.counts) if count},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for upper, count in data["buckets_ns"].items():
+            histogram.counts[int(upper).bit_length() - 1] = count
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class Profiler:
+    # Opt-in per-stage timings and function usage counts. Instrumented code
+    # checks `enabled` before reading the clock, so a disabled profiler
+    # costs one attribute lookup per stage.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}
+        self.functions = Counter()
+        self.started = time.time()
+
+    def record(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.record(seconds)
+
+    def count_functions(self, names):
+        self.functions.update(names)
+
+    def reset(self):
+        from .numeric import stats as numeric_stats
+        self.stages = {}
+        self.functions = Counter()
+        self.started = time.time()
+        numeric_stats.reset()
+
+    def snapshot(self):
+        # Plain-data view of everything recorded, suitable for JSON
+        from .expression import compile_cache
+        from .numeric import stats as numeric_stats
+        return {
+            "enabled": self.enabled,
+            "started": self.started,
+            "elapsed": time.time() - self.started,
+            "stages": {name: h.to_dict() for name, h in sorted(self.stages.items())},
+            "functions": dict(self.functions.most_common()),
+            "compile_cache": compile_cache().stats(),
+            "numeric": numeric_stats.to_dict(),
+        }
+
+    def merge(self, snapshot):
+        # Fold in the stages and counts of another profiler's snapshot, e.g.
+        # one taken in a worker process
+        from .numeric import stats as numeric_stats
+        for name, data in snapshot["stages"].items():
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = Histogram()
+            histogram.merge(Histogram.from_dict(data))
+        self.functions.update(snapshot["functions"])
+        numeric_stats.merge(snapshot.get("numeric", {}))
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def report(self):
+        # Fixed-width text summary for the stats panel
+        lines = [f"{'stage':<16}{'count':>8}{'mean':>11}{'p50':>11}{'p95':>11}{'max':>11}"]
+        for name, h in sorted(self.stages.items()):
+            lines.append(f"{name:<16}{h.count:>8}{_format_seconds(h.mean):>11}"
+                         f"{_format_seconds(h.quantile(0.5)):>11}"
+                         f"{_format_seconds(h.quantile(0.95)):>11}"
+                         f"{_format_seconds(h.max or 0.0):>11}")
+        if self.functions:
+            lines.append("")
+            lines.append(f"{'function':<16}{'calls':>8}")
+            for name, count in self.functions.most_common():
+                lines.append(f"{name:<16}{count:>8}")
+        from .numeric import stats as numeric_stats
+        if numeric_stats.calls:
+            lines.append("")
+            lines.append(f"{'numeric':<16}{'calls':>8}{'evaluations':>14}")
+            for name, count in sorted(numeric_stats.calls.items()):
+                lines.append(f"{name:<16}{count:>8}{numeric_stats.evaluations[name]:>14}")
+        return "\n".join(lines)
+
+
+def _format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+# Shared by the engine, the worker and the GUI
+profiler = Profiler(os.environ.get(ENV_VAR, "") not in ("", "0"))
@@ -0,0 +1,384 @@
+"""Local JSON evaluation service.
+
+    python -m scicalc.service --port 8765 --jobs 4
+    curl -d '{"expression": "sin(30)*2"}' http://127.0.0.1:8765/evaluate
+
+POST /evaluate takes {"expression": ..., "degree_mode": true,
+"precision": null, "complex": false, "ans": "0"} (all but expression
+optional) and answers {"result": ...} or {"error": ...}. A list of such
+objects under "requests" is evaluated as one batch. GET /stats returns the
+throughput and latency counters. Connections are kept alive.
+
+Requests that arrive within a short window are grouped into one batch,
+which a worker process evaluates as a single job, so the event loop only
+parses and routes. Each batch runs under the worker's time and memory
+budget; a batch that runs over fails as a whole and the worker is
+replaced. When too many batches are waiting for a worker, new requests
+are turned away with 503.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import LRUCache
+from .engine import CalculatorEngine
+from .profiling import Histogram
+from .worker import MEMORY_LIMIT, TIME_LIMIT, EvaluationWorker, _limit_memory
+
+BATCH_WINDOW = 0.002
+MAX_BATCH = 256
+MAX_BODY = 1 << 20
+
+# Larger precisions requested by clients are reduced to this
+MAX_PRECISION = 1000
+
+# Engines kept per worker, one per evaluation mode
+ENGINE_CACHE_SIZE = 64
+
+# Batches allowed to wait for (or run in) a worker, per worker
+MAX_QUEUED_BATCHES = 4
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+def _mode(request):
+    # (degree_mode, precision, complex) of a request, validated
+    degree_mode = request.get("degree_mode", True)
+    complex_mode = request.get("complex", False)
+    precision = request.get("precision")
+    if not isinstance(degree_mode, bool) or not isinstance(complex_mode, bool):
+        raise ValueError("'degree_mode' and 'complex' must be true or false")
+    if precision is not None:
+        if type(precision) is not int or precision < 1:
+            raise ValueError("'precision' must be a positive integer or null")
+        precision = min(precision, MAX_PRECISION)
+    return degree_mode, precision, complex_mode
+
+
+def _serve_batch(conn, memory_limit):
+    # Child process of a BatchWorker. Engines are kept per evaluation mode
+    # between jobs, so their compile caches stay warm.
+    _limit_memory(memory_limit)
+    engines = LRUCache(ENGINE_CACHE_SIZE)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        job, items = request
+        results = []
+        for mode, answer, expression in items:
+            engine = engines.get(mode)
+            if engine is None:
+                engine = CalculatorEngine(*mode)
+                engines.put(mode, engine)
+            try:
+                engine.last_answer = answer
+                results.append({"result": engine.format(engine.evaluate_value(expression))})
+            except MemoryError:
+                results.append({"error": "Evaluation exceeded the memory budget"})
+            except Exception as e:
+                results.append({"error": str(e) or type(e).__name__})
+        try:
+            conn.send((job, True, results, None, None, None))
+        except MemoryError:
+            conn.send((job, False, None, "Result exceeded the memory budget", None, None))
+
+
+class BatchWorker(EvaluationWorker):
+    # Evaluates a whole batch of (mode, Ans, expression) items as one job;
+    # the result is one {"result"} or {"error"} dict per item. The batch
+    # shares the time and memory budget of the job.
+    target = staticmethod(_serve_batch)
+
+    def submit_batch(self, items):
+        if self.busy:
+            self.cancel()
+        self.start()
+        self._job += 1
+        self._conn.send((self._job, items))
+        self._user_functions = None
+        self._started = time.monotonic()
+        return self._job
+
+
+def evaluate_batch(worker, requests):
+    # Runs on a service thread: requests that are valid go to the worker as
+    # one job, and its results are fanned back out in request order
+    results = [None] * len(requests)
+    items = []
+    positions = []
+    for position, request in enumerate(requests):
+        try:
+            if "expression" not in request:
+                raise ValueError("missing 'expression'")
+            items.append((_mode(request), str(request.get("ans", "0")),
+                          str(request["expression"])))
+            positions.append(position)
+        except ValueError as e:
+            results[position] = {"error": str(e)}
+    if items:
+        worker.submit_batch(items)
+        ok, values, message = worker.wait()
+        if not ok:
+            values = [{"error": message}] * len(items)
+        for position, result in zip(positions, values):
+            results[position] = result
+    return results
+
+
+class ServiceStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.in_flight = 0
+        self.latency = Histogram()
+        self.batch_latency = Histogram()
+
+    def to_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "uptime": elapsed,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "requests_per_second": self.requests / elapsed if elapsed else 0.0,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "latency": self.latency.to_dict(),
+            "batch_latency": self.batch_latency.to_dict(),
+        }
+
+
+class EvaluationService:
+    # Collects evaluation requests from all connections and flushes them to
+    # a worker as one batch BATCH_WINDOW seconds after the first arrives,
+    # or as soon as MAX_BATCH are waiting. At most max_queued batches wait
+    # for or run in a worker; requests beyond that raise ServiceBusy.
+    def __init__(self, jobs=None, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH,
+                 time_limit=TIME_LIMIT, memory_limit=MEMORY_LIMIT, max_queued=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_queued = max_queued or MAX_QUEUED_BATCHES * self.jobs
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.stats = ServiceStats()
+        self._threads = None
+        self._pending = []
+        self._flush_handle = None
+        # Idle workers, one per job; a flushed batch waits for one
+        self._slots = None
+        self._workers = []
+        self._queued = 0
+
+    def start(self):
+        self._threads = ThreadPoolExecutor(max_workers=self.jobs)
+        self._slots = asyncio.Queue()
+        for _ in range(self.jobs):
+            worker = BatchWorker(self.time_limit, self.memory_limit)
+            self._workers.append(worker)
+            self._slots.put_nowait(worker)
+
+    def close(self):
+        if self._threads is not None:
+            self._threads.shutdown(cancel_futures=True)
+            self._threads = None
+        for worker in self._workers:
+            worker.close()
+        self._workers = []
+
+    async def evaluate(self, requests):
+        if self._queued >= self.max_queued:
+            raise ServiceBusy("too many requests waiting, try again later")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for request in requests:
+            future = loop.create_future()
+            self._pending.append((request, future))
+            futures.append(future)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await asyncio.gather(*futures)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._queued += 1
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        try:
+            worker = await self._slots.get()
+            try:
+                start = time.perf_counter()
+                loop = asyncio.get_running_loop()
+                try:
+                    results = await loop.run_in_executor(
+                        self._threads, evaluate_batch, worker, [request for request, _ in batch])
+                except Exception as e:
+                    results = [{"error": f"evaluation failed: {e}"}] * len(batch)
+                self.stats.batches += 1
+                self.stats.batched_requests += len(batch)
+                self.stats.batch_latency.record(time.perf_counter() - start)
+            finally:
+                self._slots.put_nowait(worker)
+        finally:
+            self._queued -= 1
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    # -- HTTP ----------------------------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "bad request line"}, False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version != "HTTP/1.0")
+                length = int(headers.get("content-length", "0") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._route(method, path, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if path == "/stats":
+            return 200, self.stats.to_dict()
+        if path != "/evaluate":
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "body is not valid JSON"}
+        many = isinstance(data, dict) and isinstance(data.get("requests"), list)
+        requests = data["requests"] if many else [data]
+        if not all(isinstance(request, dict) for request in requests):
+            return 400, {"error": "requests must be JSON objects"}
+
+        start = time.perf_counter()
+        self.stats.in_flight += len(requests)
+        try:
+            results = await self.evaluate(requests)
+        except ServiceBusy as e:
+            self.stats.rejected += len(requests)
+            return 503, {"error": str(e)}
+        finally:
+            self.stats.in_flight -= len(requests)
+        elapsed = time.perf_counter() - start
+        self.stats.requests += len(requests)
+        for result in results:
+            self.stats.latency.record(elapsed)
+            if "error" in result:
+                self.stats.errors += 1
+        if many:
+            return 200, {"results": results}
+        return (400 if "error" in results[0] else 200), results[0]
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host="127.0.0.1", port=8765, unix_path=None, jobs=None,
+                batch_window=BATCH_WINDOW, ready=None, time_limit=TIME_LIMIT):
+    service = EvaluationService(jobs, batch_window, time_limit=time_limit)
+    service.start()
+    try:
+        if unix_path:
+            server = await asyncio.start_unix_server(service.handle_connection, unix_path)
+        else:
+            server = await asyncio.start_server(service.handle_connection, host, port)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve expression evaluation over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW * 1000,
+                        help="milliseconds to gather a batch (default: 2)")
+    parser.add_argument("--time-limit", type=float, default=TIME_LIMIT,
+                        help=f"seconds one batch may take (default: {TIME_LIMIT:g})")
+    args = parser.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be positive")
+    if args.time_limit <= 0:
+        parser.error("--time-limit must be positive")
+
+    def ready(server):
+        where = args.unix or "http://%s:%d" % server.sockets[0].getsockname()[:2]
+        print(f"Serving on {where}", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.jobs,
+                          args.batch_window / 1000, ready, args.time_limit))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+# Style tables for the calculator window. BASE_STYLES and STYLE_MAPS hold
+# what every theme shares and are configured once at startup; a theme only
+# lists the options that differ, so switching themes is a single pass over
+# a short precomputed table.
+FONT = "Segoe UI"
+
+_PRESSED = [("pressed", "sunken")]
+
+BASE_STYLES = (
+    ("Display.TLabel", {"font": (FONT, 12)}),
+    ("BigDisplay.TLabel", {"font": (FONT, 24, "bold")}),
+    ("ModeDisplay.TLabel", {"font": (FONT, 10)}),
+    ("NumButton.TButton", {"font": (FONT, 12), "background": "#34495e", "foreground": "#ecf0f1"}),
+    ("OpButton.TButton", {"font": (FONT, 12), "background": "#3498db", "foreground": "#ecf0f1"}),
+    ("FuncButton.TButton", {"font": (FONT, 11), "background": "#2c3e50", "foreground": "#ecf0f1"}),
+    ("SpecialButton.TButton", {"font": (FONT, 12), "background": "#e74c3c",
+                               "foreground": "#ecf0f1"}),
+    ("EqualButton.TButton", {"font": (FONT, 14, "bold"), "background": "#2ecc71",
+                             "foreground": "#ecf0f1"}),
+    ("History.TLabel", {"font": (FONT, 12, "bold")}),
+)
+
+STYLE_MAPS = (
+    ("NumButton.TButton", {"background": [("active", "#2c3e50")], "relief": _PRESSED}),
+    ("OpButton.TButton", {"background": [("active", "#2980b9")], "relief": _PRESSED}),
+    ("FuncButton.TButton", {"background": [("active", "#233140")], "relief": _PRESSED}),
+    ("SpecialButton.TButton", {"background": [("active", "#c0392b")], "relief": _PRESSED}),
+    ("EqualButton.TButton", {"background": [("active", "#27ae60")], "relief": _PRESSED}),
+)
+
+
+def _theme(window, panel, text, accent, button):
+    # window: main background; panel: display and history background;
+    # text: label and history text colour; button: glyph of the theme
+    # toggle, which shows the theme it switches to
+    return {
+        "window": window,
+        "button": button,
+        "history": {"bg": panel, "fg": text},
+        "styles": (
+            ("Main.TFrame", {"background": window}),
+            ("Display.TFrame", {"background": panel}),
+            ("Display.TLabel", {"background": panel, "foreground": text}),
+            ("BigDisplay.TLabel", {"background": panel, "foreground": text}),
+            ("ModeDisplay.TLabel", {"background": panel, "foreground": accent}),
+            ("History.TFrame", {"background": panel}),
+            ("History.TLabel", {"background": panel, "foreground": text}),
+        ),
+    }
+
+
+THEMES = {
+    "dark": _theme("#2c3e50", "#1e2b38", "#ecf0f1", "#3498db", "☀️"),
+    "light": _theme("#ecf0f1", "#f8f9fa", "#2c3e50", "#3498db", "🌙"),
+}
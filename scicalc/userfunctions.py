@@ -0,0 +1,252 @@
+import itertools
+import keyword
+import re
+
+from . import numeric
+from .bignum import BigFactorial
+from .cache import LRUCache
+from .expression import CONSTANTS, ExpressionError, compile_tree, free_variables, normalize, parse
+from .functions import COMPLEX_CONSTANTS, COMPLEX_DEGREE_FUNCTIONS
+
+# Nested user-function calls allowed before evaluation is abandoned; the
+# language has no conditionals, so a recursive definition never ends on its
+# own
+MAX_DEPTH = 64
+
+# Entries kept by a memoized function
+MEMO_SIZE = 256
+
+# "name(a, b) = body"
+_DEFINITION = re.compile(r"\s*([A-Za-z_]\w*)\s*\(([^()]*)\)\s*=(.*)$", re.DOTALL)
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*$")
+
+_RESERVED = (frozenset(COMPLEX_DEGREE_FUNCTIONS) | frozenset(COMPLEX_CONSTANTS)
+             | frozenset(numeric.ARITY) | {"Ans"})
+
+# Every library change gets a new stamp, which is part of the compile cache
+# key of expressions compiled against it
+_stamps = itertools.count(1)
+
+_MISSING = object()
+
+
+class RecursionLimitError(ExpressionError):
+    pass
+
+
+def is_definition(text):
+    return _DEFINITION.match(text) is not None
+
+
+def parse_definition(text):
+    # (name, parameters, body) of "name(a, b) = body"
+    match = _DEFINITION.match(text)
+    if match is None:
+        raise ExpressionError("A definition looks like f(x, y) = expression")
+    name, params, body = match.group(1), match.group(2).strip(), normalize(match.group(3).strip())
+    params = tuple(param.strip() for param in params.split(","))
+    if name in _RESERVED:
+        raise ExpressionError(f"Cannot redefine '{name}'")
+    for param in params:
+        if not _IDENTIFIER.match(param) or keyword.iskeyword(param):
+            raise ExpressionError(f"Invalid parameter '{param}' in {name}()")
+        if param in CONSTANTS or param in COMPLEX_CONSTANTS:
+            raise ExpressionError(f"Parameter '{param}' of {name}() is a constant")
+    if len(set(params)) != len(params):
+        raise ExpressionError(f"Repeated parameter in {name}()")
+    if not body:
+        raise ExpressionError(f"Nothing assigned to {name}()")
+    # Bodies may only read their parameters, so every function is pure and
+    # safe to memoize
+    unknown = sorted(free_variables(parse(body)) - set(params) - {"i"})
+    if unknown:
+        raise ExpressionError(f"Unknown variable '{unknown[0]}' in {name}()")
+    return name, params, body
+
+
+class UserFunction:
+    # A definition with its memo and call counts. The memo is shared by all
+    # evaluation modes, so its keys include the mode.
+    def __init__(self, name, params, body, memo_size=0):
+        self.name = name
+        self.params = params
+        self.body = body
+        self.memo_size = memo_size
+        self.memo = LRUCache(memo_size) if memo_size else None
+        self.calls = 0
+
+    @property
+    def text(self):
+        return f"{self.name}({', '.join(self.params)}) = {self.body}"
+
+    def stats(self):
+        stats = {"calls": self.calls}
+        if self.memo is not None:
+            stats["memo"] = self.memo.stats()
+        return stats
+
+    def __repr__(self):
+        return f"UserFunction({self.text!r})"
+
+
+def _scope_builder(params):
+    # lambda a, b: {'a': a, 'b': b}; much cheaper per call than
+    # dict(zip(params, args))
+    entries = ", ".join(f"{param!r}: {param}" for param in params)
+    return eval(f"lambda {', '.join(params)}: {{{entries}}}")
+
+
+def _bind(function, library, mode, table, constants, number):
+    # The callable that stands for function in the function table of mode,
+    # and a thunk that compiles its body against that table once the table
+    # holds every user function (so bodies can call each other and
+    # themselves). A closure rather than an object with __call__, since
+    # every call of a user function goes through it.
+    name, memo = function.name, function.memo
+    arity = len(function.params)
+    scope = _scope_builder(function.params)
+    body = None
+
+    def call(*args):
+        if len(args) != arity:
+            raise ExpressionError(f"{name}() takes {arity} argument{'' if arity == 1 else 's'}")
+        function.calls += 1
+        key = None
+        if memo is not None:
+            # Types are part of the key, as f(1) and f(1.0) are equal keys
+            # but not always equal results. Hashing a BigFactorial would
+            # expand it, so calls with one are not memoized.
+            types = tuple(map(type, args))
+            if BigFactorial not in types:
+                key = (mode, types, args)
+        if key is not None:
+            value = memo.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        if library.depth >= library.max_depth:
+            raise RecursionLimitError(f"{name}() recursed deeper than {library.max_depth} calls")
+        library.depth += 1
+        try:
+            value = body(scope(*args))
+        except KeyError as e:
+            # "i" outside complex mode
+            raise ExpressionError(f"Unknown variable '{e.args[0]}' in {name}()") from None
+        finally:
+            library.depth -= 1
+        if key is not None:
+            memo.put(key, value)
+        return value
+
+    # Not evaluated by constant folding, so every call happens (and is
+    # counted) at evaluation time
+    call.foldable = False
+
+    def compile_body():
+        # Straight to Python code, as bodies are meant to be called many times
+        nonlocal body
+        body = compile_tree(parse(function.body, number=number), table, function.body,
+                            constants).compile()
+
+    return call, compile_body
+
+
+class FunctionLibrary:
+    # User-defined functions of one engine. Each definition is parsed once
+    # when it is made and compiled once per evaluation mode, the first time
+    # an expression in that mode is compiled; calls then run the compiled
+    # body directly.
+    def __init__(self, max_depth=MAX_DEPTH):
+        self.max_depth = max_depth
+        self.depth = 0
+        self.functions = {}
+        self.stamp = next(_stamps)
+        self._tables = {}
+
+    def __len__(self):
+        return len(self.functions)
+
+    def __contains__(self, name):
+        return name in self.functions
+
+    def __iter__(self):
+        return iter(self.functions.values())
+
+    def define(self, text, memo_size=0):
+        # memo_size > 0 keeps that many results of the function
+        name, params, body = parse_definition(text)
+        function = UserFunction(name, params, body, memo_size)
+        self.functions[name] = function
+        self._changed()
+        return function
+
+    def remove(self, name):
+        del self.functions[name]
+        self._changed()
+
+    def clear(self):
+        self.functions.clear()
+        self._changed()
+
+    def _changed(self):
+        # Memoized results may have come from a function that was just
+        # replaced, so every memo starts over
+        self.stamp = next(_stamps)
+        self._tables.clear()
+        for function in self.functions.values():
+            if function.memo is not None:
+                function.memo.clear()
+
+    def definitions(self):
+        # Picklable state, for rebuilding the library in another process
+        return tuple((function.text, function.memo_size) for function in self.functions.values())
+
+    def load(self, definitions):
+        if definitions == self.definitions():
+            return
+        self.functions.clear()
+        for text, memo_size in definitions:
+            name, params, body = parse_definition(text)
+            self.functions[name] = UserFunction(name, params, body, memo_size)
+        self._changed()
+
+    def table(self, mode, functions, constants=CONSTANTS, number=None):
+        # functions extended with the user functions compiled for mode
+        table = self._tables.get(mode)
+        if table is None:
+            table = dict(functions)
+            thunks = []
+            for function in self.functions.values():
+                table[function.name], compile_body = _bind(function, self, mode, table,
+                                                           constants, number)
+                thunks.append(compile_body)
+            for compile_body in thunks:
+                compile_body()
+            self._tables[mode] = table
+        return table
+
+    def take_counts(self):
+        # Call and memo counts since the last take, which are then zeroed;
+        # merge_counts adds them to another process's library
+        counts = {}
+        for function in self.functions.values():
+            memo = function.memo
+            if function.calls:
+                counts[function.name] = (function.calls, memo.hits if memo else 0,
+                                         memo.misses if memo else 0)
+                function.calls = 0
+                if memo is not None:
+                    memo.hits = memo.misses = 0
+        return counts
+
+    def merge_counts(self, counts):
+        for name, (calls, hits, misses) in counts.items():
+            function = self.functions.get(name)
+            if function is None:
+                continue
+            function.calls += calls
+            if function.memo is not None:
+                function.memo.hits += hits
+                function.memo.misses += misses
+
+    def stats(self):
+        return {function.name: function.stats() for function in self.functions.values()}
@@ -0,0 +1,148 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only the array API needs it
+    np = None
+
+from .cache import LRUCache
+from .expression import compile_tree, normalize, parse
+from .functions import _ACOS_DEGREES, _ASIN_DEGREES, _ATAN_DEGREES, _SIN_DEGREES, _TAN_DEGREES
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Vectorized evaluation requires numpy (pip install numpy)")
+
+
+# NumPy counterparts of the scalar function tables. Degree functions follow
+# functions.sin_deg and friends step for step: the same exact reduction, the
+# same tables for multiples of 30 and 45 degrees and the same quadrant
+# formulas, so an array gives the values the calculator shows. Points
+# outside a function's domain come back as nan instead of raising.
+def _reduce_degrees(x):
+    # x modulo 360 in [-180, 180], exactly
+    r = np.fmod(x, 360.0)
+    return np.where(r > 180, r - 360, np.where(r < -180, r + 360, r))
+
+
+def _quadrant(r):
+    # r = 90 q + d with |d| <= 45; nan keeps q = 0 and d = nan
+    q = np.nan_to_num(np.round(r / 90))
+    return q.astype(np.intp) & 3, np.radians(r - 90 * q)
+
+
+def _lookup(table, key, sign, default):
+    # Elementwise table.get(key), negated where sign < 0, else default
+    return np.select([key == entry for entry in table],
+                     [np.where(sign < 0, -value, value) for value in table.values()], default)
+
+
+def _sin_deg(x):
+    r = _reduce_degrees(x)
+    q, d = _quadrant(r)
+    default = np.select([q == 0, q == 1, q == 2], [np.sin(d), np.cos(d), -np.sin(d)], -np.cos(d))
+    return _lookup(_SIN_DEGREES, np.abs(r), r, default)
+
+
+def _cos_deg(x):
+    r = np.abs(_reduce_degrees(x))
+    q, d = _quadrant(r)
+    default = np.select([q == 0, q == 1], [np.cos(d), -np.sin(d)], -np.cos(d))
+    return _lookup(_SIN_DEGREES, np.where(r <= 90, 90 - r, r - 90), 90 - r, default)
+
+
+def _tan_deg(x):
+    r = _reduce_degrees(x)
+    q, d = _quadrant(r)
+    default = np.where(q & 1, -np.cos(d) / np.sin(d), np.tan(d))
+    default = np.where(np.abs(r) == 90, np.nan, default)
+    return _lookup(_TAN_DEGREES, np.abs(r), r, default)
+
+
+def _inverse_degrees(table, function):
+    def inverse(x):
+        return _lookup(table, x, 1, np.degrees(function(x)))
+    return inverse
+
+
+_asin_deg = _inverse_degrees(_ASIN_DEGREES, np.arcsin)
+_acos_deg = _inverse_degrees(_ACOS_DEGREES, np.arccos)
+_atan_deg = _inverse_degrees(_ATAN_DEGREES, np.arctan)
+
+
+def _log(x, base=None):
+    if base is None:
+        return np.log(x)
+    return np.log(x) / np.log(base)
+
+
+_FACTORIALS = None
+
+
+def _factorial(x):
+    global _FACTORIALS
+    if _FACTORIALS is None:
+        # 170! is the largest factorial representable as a float64
+        _FACTORIALS = np.array([float(math.factorial(n)) for n in range(171)])
+    x = np.asarray(x, dtype=float)
+    result = np.full(x.shape, np.nan)
+    integral = (x >= 0) & (x == np.floor(x))
+    small = integral & (x <= 170)
+    result[small] = _FACTORIALS[x[small].astype(np.intp)]
+    result[integral & (x > 170)] = np.inf
+    return result if result.ndim else result[()]
+
+
+_VECTOR_FUNCTIONS = None
+
+
+def vector_function_table(degree_mode):
+    global _VECTOR_FUNCTIONS
+    _require_numpy()
+    if _VECTOR_FUNCTIONS is None:
+        common = {
+            "log10": np.log10,
+            "log": _log,
+            "exp": np.exp,
+            "sqrt": np.sqrt,
+            "cbrt": np.cbrt,
+            "abs": np.abs,
+            "fact": _factorial,
+        }
+        _VECTOR_FUNCTIONS = {
+            True: dict(common, sin=_sin_deg, cos=_cos_deg, tan=_tan_deg,
+                       asin=_asin_deg, acos=_acos_deg, atan=_atan_deg),
+            False: dict(common, sin=np.sin, cos=np.cos, tan=np.tan,
+                        asin=np.arcsin, acos=np.arccos, atan=np.arctan),
+        }
+    return _VECTOR_FUNCTIONS[degree_mode]
+
+
+_vector_cache = LRUCache(maxsize=128)
+
+
+def compile_vectorized(text, degree_mode=True):
+    key = (normalize(text), degree_mode)
+    compiled = _vector_cache.get(key)
+    if compiled is None:
+        compiled = compile_tree(parse(key[0]), vector_function_table(degree_mode), key[0])
+        _vector_cache.put(key, compiled)
+    return compiled
+
+
+def evaluate_array(expression, values, variable="x", degree_mode=True, env=None):
+    # Evaluate expression over every element of values in one pass of
+    # NumPy ufunc calls, binding the array to the given variable name.
+    _require_numpy()
+    compiled = compile_vectorized(expression, degree_mode)
+    values = np.asarray(values, dtype=float)
+    scope = dict(env) if env else {}
+    scope[variable] = values
+    with np.errstate(all="ignore"):
+        result = compiled(scope)
+    result = np.asarray(result)
+    if result.shape != values.shape:
+        # Expressions that do not mention the variable give a scalar
+        result = np.broadcast_to(result, values.shape).copy()
+    return result
@@ -0,0 +1,189 @@
+import multiprocessing
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from .engine import CalculatorEngine
+from .profiling import profiler
+
+# Default budgets for a single evaluation
+TIME_LIMIT = 10.0
+MEMORY_LIMIT = 1 << 30
+
+
+def _limit_memory(limit):
+    # Cap the child's address space so huge integers fail with MemoryError
+    # instead of swapping the machine
+    if resource is None or limit is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _serve(conn, memory_limit):
+    # Child process: evaluate requests until the pipe closes. The engine is
+    # kept between requests so its compile cache stays warm.
+    _limit_memory(memory_limit)
+    engine = CalculatorEngine()
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        (job, expression, engine.is_degree_mode, engine.precision, engine.is_complex_mode,
+         last_answer, last_value, definitions, profiler.enabled) = request
+        engine.store_answer(last_value, last_answer)
+        try:
+            # Unchanged definitions keep their compiled bodies and memos
+            engine.user_functions.load(definitions)
+            value = engine.evaluate_value(expression)
+            reply = (job, True, value, None)
+        except MemoryError:
+            reply = (job, False, None, "Evaluation exceeded the memory budget")
+        except Exception as e:
+            reply = (job, False, None, str(e) or type(e).__name__)
+        # Timings and user function counts recorded here are sent back with
+        # the reply and merged into the parent's
+        stats = None
+        if profiler.enabled:
+            stats = profiler.snapshot()
+            profiler.reset()
+        counts = engine.user_functions.take_counts()
+        try:
+            conn.send(reply + (stats, counts))
+        except MemoryError:
+            conn.send((job, False, None, "Result exceeded the memory budget", stats, counts))
+
+
+class EvaluationWorker:
+    # Evaluates expressions in a child process under a wall-clock and memory
+    # budget. Threads cannot be interrupted in the middle of a long integer
+    # operation, so cancelling (or running over time) kills the process; a
+    # fresh one is started for the next job. One job runs at a time.
+    #
+    # submit() returns immediately; poll() returns None while the job is
+    # running and (ok, value, message) once it has finished, so a GUI can
+    # poll from its event loop without ever blocking on the computation.
+    # Loop run by the child process; it gets the request tuple sent by
+    # submit() and replies (job, ok, value, message, stats, counts)
+    target = staticmethod(_serve)
+
+    def __init__(self, time_limit=TIME_LIMIT, memory_limit=MEMORY_LIMIT):
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        # Spawned rather than forked: the parent may be running a Tk loop
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._job = 0
+        self._started = None
+        # Library of the engine that submitted the job, credited with the
+        # calls made in the child
+        self._user_functions = None
+
+    def start(self):
+        if self._process is None or not self._process.is_alive():
+            parent, child = self._context.Pipe()
+            self._process = self._context.Process(
+                target=self.target, args=(child, self.memory_limit), daemon=True)
+            self._process.start()
+            child.close()
+            self._conn = parent
+
+    @property
+    def busy(self):
+        return self._started is not None
+
+    @property
+    def elapsed(self):
+        return 0.0 if self._started is None else time.monotonic() - self._started
+
+    def submit(self, expression, engine):
+        # Evaluate expression with the engine's mode, precision and Ans
+        if self.busy:
+            self.cancel()
+        self.start()
+        self._job += 1
+        self._conn.send((self._job, expression, engine.is_degree_mode, engine.precision,
+                         engine.is_complex_mode, engine.last_answer, engine.last_value,
+                         engine.user_functions.definitions(), profiler.enabled))
+        self._user_functions = engine.user_functions
+        self._started = time.monotonic()
+        return self._job
+
+    def poll(self, timeout=0):
+        if not self.busy:
+            return None
+        try:
+            ready = self._conn.poll(timeout)
+            while ready:
+                job, ok, value, message, stats, counts = self._conn.recv()
+                if stats is not None:
+                    profiler.merge(stats)
+                if counts:
+                    self._user_functions.merge_counts(counts)
+                if job == self._job:
+                    self._started = None
+                    return ok, value, message
+                ready = self._conn.poll()
+        except (EOFError, OSError):
+            ready = False
+        if not self._process.is_alive():
+            # Killed from outside the interpreter, e.g. by the OOM killer
+            self._reset()
+            return False, None, "Evaluation exceeded the memory budget"
+        if self.time_limit is not None and self.elapsed > self.time_limit:
+            self._reset()
+            return False, None, f"Evaluation took longer than {self.time_limit:g} s"
+        return None
+
+    def wait(self):
+        # Block until the current job finishes or runs out of time
+        while self.busy:
+            result = self.poll(0.05)
+            if result is not None:
+                return result
+        return None
+
+    def evaluate(self, expression, engine):
+        # Blocking convenience for headless callers: evaluate in the child
+        # and store the result as the engine's Ans
+        self.submit(expression, engine)
+        ok, value, message = self.wait()
+        if not ok:
+            raise ArithmeticError(message)
+        return engine.store_answer(value)
+
+    def cancel(self):
+        if self.busy:
+            self._reset()
+
+    def _reset(self):
+        self._started = None
+        process, conn = self._process, self._conn
+        self._process = self._conn = None
+        if conn is not None:
+            conn.close()
+        if process is not None and process.is_alive():
+            process.kill()
+            process.join(1)
+
+    def close(self):
+        self._started = None
+        if self._conn is not None and self._process is not None and self._process.is_alive():
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass
+            self._process.join(0.5)
+        self._reset()
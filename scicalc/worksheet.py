@@ -0,0 +1,298 @@
+import heapq
+import re
+
+from .bignum import BigFactorial
+from .engine import CalculatorEngine
+from .expression import ExpressionError
+from .functions import COMPLEX_CONSTANTS, DEGREE_FUNCTIONS
+from .profiling import profiler
+from .worker import EvaluationWorker, _limit_memory
+
+# "name = expression"; any other line is an expression on its own
+_ASSIGNMENT = re.compile(r"\s*([A-Za-z_]\w*)\s*=(.*)$", re.DOTALL)
+
+_RESERVED = frozenset(COMPLEX_CONSTANTS) | frozenset(DEGREE_FUNCTIONS) | {"Ans"}
+
+_EVALUATION_ERRORS = (ArithmeticError, ValueError, TypeError)
+
+
+def _same_value(a, b):
+    # Values of the same type that compare equal; 1 == 1.0, but a line
+    # that turns from int to float has changed. A BigFactorial compares by
+    # n, since == would expand both.
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if type(a) is BigFactorial:
+        return a.n == b.n
+    return a == b
+
+
+class WorksheetLine:
+    # One line of a worksheet. sources maps each name the line reads to the
+    # line that defines it (the nearest definition above); dependents are
+    # the lines whose sources include this one.
+    __slots__ = ("text", "name", "expression", "compiled", "references", "sources",
+                 "dependents", "position", "value", "error")
+
+    def __init__(self, text, engine):
+        self.value = None
+        self.sources = {}
+        self.dependents = set()
+        self.position = 0
+        self.set_text(text, engine)
+
+    def set_text(self, text, engine):
+        self.text = text
+        match = _ASSIGNMENT.match(text)
+        self.name = match.group(1) if match else None
+        self.expression = (match.group(2) if match else text).strip()
+        if self.expression.startswith("#"):
+            self.expression = ""
+        self.compile(engine)
+
+    def compile(self, engine):
+        # Parse errors are kept as the line's error; they do not depend on
+        # other lines, so recomputing does not clear them. The old value is
+        # kept so an edit that leaves it unchanged stops there.
+        self.compiled = None
+        self.references = frozenset()
+        self.error = None
+        if self.name in _RESERVED:
+            self.error = f"Cannot assign to '{self.name}'"
+        elif self.expression:
+            try:
+                self.compiled = engine.compile(self.expression)
+                self.references = self.compiled.variables - {"Ans"}
+            except ExpressionError as e:
+                self.error = str(e)
+        elif self.name:
+            self.error = f"Nothing assigned to '{self.name}'"
+
+    @property
+    def shape(self):
+        # What linking depends on
+        return self.name, self.references
+
+
+class Worksheet:
+    # Lines of expressions and assignments ("r = 3", "area = pi*r^2") that
+    # may use names defined on earlier lines. References only point upward,
+    # so the lines form a dependency graph without cycles. An edit
+    # recomputes the edited lines and then only the lines downstream of a
+    # value that actually changed, in line order; everything else keeps
+    # its cached value.
+    def __init__(self, text="", engine=None):
+        self.engine = engine if engine is not None else CalculatorEngine()
+        self.lines = []
+        self.mode = self.engine.mode()
+        self.answer = self.engine.variables()["Ans"]
+        # Lines evaluated by the last edit
+        self.recomputed = 0
+        if text:
+            self.update(text)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __getitem__(self, index):
+        return self.lines[index]
+
+    @property
+    def text(self):
+        return "\n".join(line.text for line in self.lines)
+
+    def variables(self):
+        # Final value of every name that has one
+        return {line.name: line.value for line in self.lines
+                if line.name and line.error is None}
+
+    # -- Editing -------------------------------------------------------------
+
+    def update(self, text):
+        # Make the sheet hold text (one line per line), treating the lines
+        # between the unchanged head and tail as the edit
+        new = text.split("\n")
+        old = self.lines
+        limit = min(len(old), len(new))
+        head = 0
+        while head < limit and old[head].text == new[head]:
+            head += 1
+        tail = 0
+        while tail < limit - head and old[-1 - tail].text == new[-1 - tail]:
+            tail += 1
+        return self.replace(head, len(old) - tail, new[head:len(new) - tail])
+
+    def set_line(self, index, text):
+        return self.replace(index, index + 1, [text])
+
+    def insert_line(self, index, text):
+        return self.replace(index, index, [text])
+
+    def delete_line(self, index):
+        return self.replace(index, index + 1, [])
+
+    def replace(self, start, stop, texts):
+        # Replace lines[start:stop] with texts and recompute what depends on
+        # them; returns the number of lines evaluated
+        stale = self._check_mode()
+        changed = [] if stale else self._answer_lines()
+        relink = stale or stop - start != len(texts)
+        if relink:
+            lines = [WorksheetLine(text, self.engine) for text in texts]
+            self.lines[start:stop] = lines
+            changed.extend(lines)
+        else:
+            for line, text in zip(self.lines[start:stop], texts):
+                if line.text != text:
+                    shape = line.shape
+                    line.set_text(text, self.engine)
+                    relink = relink or line.shape != shape
+                    changed.append(line)
+        if relink:
+            changed.extend(self._link())
+        return self._recompute(self.lines if stale else changed)
+
+    def recompute(self):
+        # Evaluate every line again, e.g. after the engine's mode changed
+        self._check_mode()
+        self._link()
+        return self._recompute(self.lines)
+
+    def _check_mode(self):
+        # Lines are compiled for the engine's angle, precision and complex
+        # modes; after the engine changes mode they are all compiled again
+        # (in complex mode "i" is a constant, so references can change too)
+        mode = self.engine.mode()
+        if mode == self.mode:
+            return False
+        self.mode = mode
+        self.answer = self.engine.variables()["Ans"]
+        for line in self.lines:
+            line.compile(self.engine)
+        return True
+
+    def _answer_lines(self):
+        # Ans is read from the engine rather than from a line, so when it
+        # has changed since the last edit the lines using it are evaluated
+        answer = self.engine.variables()["Ans"]
+        if _same_value(answer, self.answer):
+            return []
+        self.answer = answer
+        return [line for line in self.lines
+                if line.compiled is not None and "Ans" in line.compiled.variables]
+
+    # -- Dependency graph ----------------------------------------------------
+
+    def _link(self):
+        # Resolve every reference to the nearest definition above it and
+        # rebuild the dependents; returns the lines whose sources changed
+        defined = {}
+        relinked = []
+        for position, line in enumerate(self.lines):
+            line.position = position
+            line.dependents = set()
+            sources = {name: defined[name] for name in line.references if name in defined}
+            if sources != line.sources:
+                line.sources = sources
+                relinked.append(line)
+            for source in sources.values():
+                source.dependents.add(line)
+            if line.name and line.compiled is not None:
+                defined[line.name] = line
+        return relinked
+
+    def _recompute(self, lines):
+        # Evaluate lines in order, and after them every dependent of a line
+        # whose value changed
+        queued = {id(line): line for line in lines}
+        queue = [(line.position, key, line) for key, line in queued.items()]
+        heapq.heapify(queue)
+        count = 0
+        while queue:
+            _, _, line = heapq.heappop(queue)
+            value, error = line.value, line.error
+            self._evaluate(line)
+            count += 1
+            if _same_value(line.value, value) and line.error == error:
+                continue
+            for dependent in line.dependents:
+                if id(dependent) not in queued:
+                    queued[id(dependent)] = dependent
+                    heapq.heappush(queue, (dependent.position, id(dependent), dependent))
+        self.recomputed = count
+        return count
+
+    def _evaluate(self, line):
+        if line.compiled is None:
+            line.value = None
+            return
+        env = {}
+        for name, source in line.sources.items():
+            if source.error is not None or source.value is None:
+                line.value = None
+                line.error = f"'{name}' has no value"
+                return
+            env[name] = source.value
+        try:
+            line.value = self.engine.execute(line.compiled, env)
+            line.error = None
+        except _EVALUATION_ERRORS as e:
+            line.value = None
+            line.error = str(e) or type(e).__name__
+
+    # -- Output --------------------------------------------------------------
+
+    def results(self):
+        # One display string per line: the value, an error, or "" for blank
+        # and comment lines
+        results = []
+        for line in self.lines:
+            if line.error is not None:
+                results.append(f"Error: {line.error}")
+            elif line.value is None:
+                results.append("")
+            else:
+                results.append(self.engine.format(line.value))
+        return results
+
+
+def _serve_worksheet(conn, memory_limit):
+    # Child process of a WorksheetWorker: the worksheet lives here between
+    # requests, so each one only recomputes what the edit affects
+    _limit_memory(memory_limit)
+    sheet = Worksheet()
+    engine = sheet.engine
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        (job, text, engine.is_degree_mode, engine.precision, engine.is_complex_mode,
+         last_answer, last_value, definitions, profiler.enabled) = request
+        engine.store_answer(last_value, last_answer)
+        try:
+            engine.user_functions.load(definitions)
+            count = sheet.update(text)
+            reply = (job, True, (sheet.results(), count), None)
+        except MemoryError:
+            sheet = Worksheet(engine=engine)
+            reply = (job, False, None, "Evaluation exceeded the memory budget")
+        except Exception as e:
+            reply = (job, False, None, str(e) or type(e).__name__)
+        stats = None
+        if profiler.enabled:
+            stats = profiler.snapshot()
+            profiler.reset()
+        conn.send(reply + (stats, engine.user_functions.take_counts()))
+
+
+class WorksheetWorker(EvaluationWorker):
+    # Evaluates a worksheet in a child process under the evaluation budget,
+    # so a slow line cannot hang the window. submit(text, engine) sends the
+    # whole text; the result is (results(), lines recomputed). A job that
+    # runs over kills the child, and the next one rebuilds the sheet.
+    target = staticmethod(_serve_worksheet)
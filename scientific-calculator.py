@@ -1,42 +1,508 @@
+import time
+
+# Taken before anything else is imported, so the startup time reported in
+# the statistics panel covers the imports too
+LAUNCHED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog, font as tkfont
 import math
-import cmath
-from decimal import Decimal, getcontext
-import re
+import os
+import sys
+
+from scicalc import CalculatorEngine, format_result
+from scicalc.display import ExpressionBuffer, split_pieces
+from scicalc.history import HistoryBuffer, HistoryLog
+from scicalc.memory import MEMORY_REGISTERS, MemoryBank, recall_text
+from scicalc.preview import ExpressionPreview
+from scicalc.profiling import profiler
+from scicalc.themes import BASE_STYLES, STYLE_MAPS, THEMES
+from scicalc.userfunctions import MEMO_SIZE
+from scicalc.worker import EvaluationWorker
+from scicalc.worksheet import WorksheetWorker
+
+# Plotting needs numpy, which is slow to import; load_plotting() imports
+# both on the first plot
+FunctionSampler = np = None
+
+# Delay before the live preview is recomputed, so fast typing is not slowed down
+PREVIEW_DELAY_MS = 120
+
+# Number of history entries kept; older ones are dropped
+HISTORY_CAPACITY = 1000
+
+# Persistent history log; pass history_path=None to keep history in memory only
+HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".scientific-calculator", "history.log")
+HISTORY_FLUSH_MS = 2000
+
+# Precision button cycles through these; None is ordinary float arithmetic
+PRECISION_MODES = (None, 50, 1000)
+
+# Budgets for one evaluation; "=" runs in a worker process that is killed
+# when it runs over, so the window never waits on a computation
+EVALUATION_TIME_LIMIT = 10.0
+EVALUATION_MEMORY_LIMIT = 1 << 30
+EVALUATION_POLL_MS = 20
+
+# Refresh interval of the open statistics panel
+STATS_REFRESH_MS = 1000
+
+# Initial size of the plot canvas
+PLOT_WIDTH = 640
+PLOT_HEIGHT = 400
+
+# Shown the first time the worksheet is opened
+WORKSHEET_EXAMPLE = "# Assign with name = expression\nr = 3\narea = pi*r^2\ncircumference = 2*pi*r"
+
+# Scientific buttons that are built after the first paint, with the
+# history panel, so the window shows up sooner
+DEFERRED_FUNCTIONS = frozenset({"asin", "acos", "atan", "MC", "MR", "M+", "%", "1/x", "n!"})
+
+
+def load_plotting():
+    global FunctionSampler, np
+    if FunctionSampler is None:
+        from scicalc.plot import FunctionSampler, np
+
+
+class VirtualHistoryView:
+    # Shows a window of a HistoryBuffer in a Text widget. Only the rows that
+    # fit are ever inserted, so scrolling and appending cost the same whether
+    # the history holds a hundred entries or a million.
+    def __init__(self, parent, entries, **text_options):
+        self.entries = entries
+        self.first = 0
+        self.follow = True  # Stick to the newest entry until scrolled away
+        self.rows = text_options.get("height", 22)
+        
+        self.text = tk.Text(parent, wrap="none", **text_options)
+        self.text.config(state="disabled")
+        self.line_height = tkfont.Font(font=self.text.cget("font")).metrics("linespace")
+        
+        self.scrollbar = ttk.Scrollbar(self.text, command=self.scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        self.text.bind("<Configure>", self.on_resize)
+        self.text.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.text.bind("<Button-4>", lambda e: self.scroll("scroll", -1, "units") or "break")
+        self.text.bind("<Button-5>", lambda e: self.scroll("scroll", 1, "units") or "break")
+    
+    def scroll(self, action, amount, unit=None):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, units|pages)
+        if action == "moveto":
+            first = int(float(amount) * len(self.entries))
+        else:
+            step = self.rows if unit == "pages" else 1
+            first = self.first + int(amount) * step
+        self.show(first)
+    
+    def on_mouse_wheel(self, event):
+        self.scroll("scroll", -1 if event.delta > 0 else 1, "units")
+        return "break"
+    
+    def on_resize(self, event):
+        padding = 2 * int(self.text.cget("pady"))
+        rows = max(1, (event.height - padding) // self.line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.refresh()
+    
+    def show(self, first):
+        last_first = max(0, len(self.entries) - self.rows)
+        self.first = min(max(0, first), last_first)
+        self.follow = self.first >= last_first
+        self.render()
+    
+    def refresh(self):
+        if self.follow:
+            self.show(len(self.entries))
+        else:
+            self.show(self.first)
+    
+    def render(self):
+        rows = self.entries.window(self.first, self.rows)
+        self.text.config(state="normal")
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.END, "\n".join(rows))
+        self.text.config(state="disabled")
+        
+        total = len(self.entries)
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + len(rows)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+class PlotView:
+    # Graph of an expression in x, drawn on a Canvas. Samples come from a
+    # FunctionSampler, whose tile cache makes panning (drag) and zooming
+    # (mouse wheel) redraw from cached points instead of re-evaluating.
+    def __init__(self, root, engine, expression=""):
+        self.engine = engine
+        self.sampler = None
+        self.sampler_key = None
+        self.redraw_job = None
+        self.drag_start = None
+        
+        self.window = tk.Toplevel(root)
+        self.window.title("Plot")
+        self.window.configure(bg="#2c3e50")
+        
+        controls = ttk.Frame(self.window, style='Main.TFrame')
+        controls.pack(fill="x", padx=5, pady=5)
+        ttk.Label(controls, text="y =", style='History.TLabel').pack(side="left")
+        self.expression_var = tk.StringVar(value=expression or "sin(x)")
+        entry = ttk.Entry(controls, textvariable=self.expression_var)
+        entry.pack(side="left", fill="x", expand=True, padx=5)
+        entry.bind("<Return>", lambda event: self.plot())
+        ttk.Button(controls, text="Plot", command=self.plot).pack(side="left")
+        ttk.Button(controls, text="Fit", command=self.fit).pack(side="left", padx=(5, 0))
+        
+        self.canvas = tk.Canvas(self.window, width=PLOT_WIDTH, height=PLOT_HEIGHT,
+                                bg="#1e2b38", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True)
+        self.status = ttk.Label(self.window, text="", style='History.TLabel')
+        self.status.pack(fill="x", padx=5)
+        
+        self.canvas.bind("<Configure>", lambda event: self.schedule_redraw())
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<MouseWheel>", lambda e: self.zoom(e.x, e.y, 0.8 if e.delta > 0 else 1.25))
+        self.canvas.bind("<Button-4>", lambda e: self.zoom(e.x, e.y, 0.8))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom(e.x, e.y, 1.25))
+        
+        span = 360 if engine.is_degree_mode else 2 * math.pi
+        self.x_min, self.x_max = -span, span
+        self.y_min, self.y_max = -2.0, 2.0
+        self.plot()
+    
+    def plot(self):
+        self.sampler_key = None
+        if self.update_sampler():
+            self.fit()
+    
+    def update_sampler(self):
+        # A new sampler (and tile cache) whenever the expression, angle
+        # mode or Ans changes
+        key = (self.expression_var.get(), self.engine.is_degree_mode, self.engine.last_value)
+        if key == self.sampler_key:
+            return self.sampler is not None
+        self.sampler_key = key
+        try:
+            self.sampler = FunctionSampler(key[0], "x", key[1], self.engine.variables())
+            self.sampler.samples(self.x_min, self.x_max)
+        except Exception as e:
+            self.sampler = None
+            self.canvas.delete("all")
+            self.status.config(text=f"Cannot plot: {e}")
+            return False
+        return True
+    
+    def fit(self):
+        # Scale y to the bulk of the visible values, ignoring poles
+        if self.sampler is None:
+            return
+        _, ys = self.sampler.samples(self.x_min, self.x_max)
+        finite = ys[np.isfinite(ys)]
+        if finite.size:
+            low, high = np.percentile(finite, (2, 98))
+            margin = (high - low) * 0.1 or 1.0
+            self.y_min, self.y_max = float(low - margin), float(high + margin)
+        self.schedule_redraw()
+    
+    def on_press(self, event):
+        self.drag_start = (event.x, event.y)
+    
+    def on_drag(self, event):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        dx = (event.x - self.drag_start[0]) / width * (self.x_max - self.x_min)
+        dy = (event.y - self.drag_start[1]) / height * (self.y_max - self.y_min)
+        self.x_min -= dx
+        self.x_max -= dx
+        self.y_min += dy
+        self.y_max += dy
+        self.drag_start = (event.x, event.y)
+        self.schedule_redraw()
+    
+    def zoom(self, px, py, factor):
+        # Zoom about the point under the cursor
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        x = self.x_min + px / width * (self.x_max - self.x_min)
+        y = self.y_max - py / height * (self.y_max - self.y_min)
+        self.x_min, self.x_max = x + (self.x_min - x) * factor, x + (self.x_max - x) * factor
+        self.y_min, self.y_max = y + (self.y_min - y) * factor, y + (self.y_max - y) * factor
+        self.schedule_redraw()
+    
+    def schedule_redraw(self):
+        # Coalesce bursts of motion events into one redraw per idle cycle
+        if self.redraw_job is None:
+            self.redraw_job = self.window.after_idle(self.redraw)
+    
+    def redraw(self):
+        self.redraw_job = None
+        if not self.update_sampler():
+            return
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        xs, ys = self.sampler.samples(self.x_min, self.x_max)
+        px = (xs - self.x_min) * (width / (self.x_max - self.x_min))
+        with np.errstate(invalid="ignore", over="ignore"):
+            py = (self.y_max - ys) * (height / (self.y_max - self.y_min))
+        
+        self.canvas.delete("all")
+        if self.x_min < 0 < self.x_max:
+            x0 = -self.x_min * width / (self.x_max - self.x_min)
+            self.canvas.create_line(x0, 0, x0, height, fill="#5d6d7e")
+        if self.y_min < 0 < self.y_max:
+            y0 = self.y_max * height / (self.y_max - self.y_min)
+            self.canvas.create_line(0, y0, width, y0, fill="#5d6d7e")
+        
+        # One polyline per run of finite points, clipped a canvas height
+        # beyond the edges so steep segments keep their direction
+        drawable = np.isfinite(py)
+        py = np.clip(py, -height, 2 * height)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], drawable.view(np.int8), [0]))))
+        for start, stop in zip(edges[::2], edges[1::2]):
+            if stop - start >= 2:
+                coords = np.column_stack((px[start:stop], py[start:stop])).ravel().tolist()
+                self.canvas.create_line(*coords, fill="#3498db", width=2)
+        
+        self.status.config(text=(
+            f"x: [{self.x_min:.4g}, {self.x_max:.4g}]   y: [{self.y_min:.4g}, {self.y_max:.4g}]"
+            f"   points: {xs.size}   evaluations: {self.sampler.evaluations}"))
+
+
+class WorksheetView:
+    # Worksheet editor: lines on the left, their values on the right. Edits
+    # are sent once per idle cycle to a worker process holding the sheet,
+    # which recomputes only the lines that depend on what changed, under the
+    # same budget as "=". Edits made while it computes are sent together
+    # once it replies.
+    def __init__(self, root, engine, text, on_close):
+        self.engine = engine
+        self.worker = WorksheetWorker(EVALUATION_TIME_LIMIT, EVALUATION_MEMORY_LIMIT)
+        self.update_job = None
+        self.pending = False
+        self.started = None
+        
+        self.window = tk.Toplevel(root)
+        self.window.title("Worksheet")
+        self.window.configure(bg="#2c3e50")
+        self.window.protocol("WM_DELETE_WINDOW", on_close)
+        
+        panes = ttk.Frame(self.window, style='Main.TFrame')
+        panes.pack(fill="both", expand=True, padx=5, pady=5)
+        self.scrollbar = ttk.Scrollbar(panes, orient="vertical", command=self.scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.results = tk.Text(panes, width=28, height=24, wrap="none", font=("Courier", 11),
+                               bg="#1e2b38", fg="#2ecc71", relief="flat",
+                               yscrollcommand=self.on_results_scroll)
+        self.results.pack(side="right", fill="y")
+        self.input = tk.Text(panes, width=48, height=24, wrap="none", font=("Courier", 11),
+                             bg="#1e2b38", fg="#ecf0f1", insertbackground="#ecf0f1",
+                             relief="flat", undo=True, yscrollcommand=self.on_input_scroll)
+        self.input.pack(side="left", fill="both", expand=True)
+        self.status = ttk.Label(self.window, text="", style='History.TLabel')
+        self.status.pack(fill="x", padx=5)
+        
+        self.input.insert("1.0", text or WORKSHEET_EXAMPLE)
+        self.input.edit_modified(False)
+        self.input.bind("<<Modified>>", self.on_modified)
+        self.input.focus_set()
+        self.refresh()
+    
+    def scroll(self, *args):
+        self.input.yview(*args)
+        self.results.yview(*args)
+    
+    def on_input_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.results.yview_moveto(first)
+    
+    def on_results_scroll(self, first, last):
+        self.input.yview_moveto(first)
+    
+    def on_modified(self, event):
+        # <<Modified>> fires once until the flag is reset
+        self.input.edit_modified(False)
+        if self.update_job is None:
+            self.update_job = self.window.after_idle(self.refresh)
+    
+    @property
+    def text(self):
+        return self.input.get("1.0", "end-1c")
+    
+    def refresh(self):
+        # Also called when the calculator's mode, Ans or functions change
+        self.update_job = None
+        if self.worker.busy:
+            self.pending = True
+            return
+        self.started = time.perf_counter()
+        self.worker.submit(self.text, self.engine)
+        self.window.after(EVALUATION_POLL_MS, self.poll)
+    
+    def poll(self):
+        if self.worker is None:
+            return
+        outcome = self.worker.poll()
+        if outcome is None:
+            self.status.config(text=f"Computing… {self.worker.elapsed:.0f} s")
+            self.window.after(EVALUATION_POLL_MS, self.poll)
+            return
+        ok, value, message = outcome
+        if ok:
+            results, count = value
+            elapsed = time.perf_counter() - self.started
+            first = self.input.yview()[0]
+            self.results.config(state="normal")
+            self.results.delete("1.0", "end")
+            self.results.insert("1.0", "\n".join(results))
+            self.results.config(state="disabled")
+            self.results.yview_moveto(first)
+            self.status.config(text=f"{len(results)} lines   recomputed: {count}"
+                                    f" in {elapsed * 1000:.1f} ms")
+        else:
+            self.status.config(text=f"Not updated: {message}")
+        if self.pending:
+            self.pending = False
+            self.refresh()
+    
+    def close(self):
+        self.worker.close()
+        self.worker = None
+        self.window.destroy()
+
+
+class FunctionsView:
+    # User-defined functions of the calculator's engine: define, insert into
+    # the expression, remove, and the call and memo counts of each
+    def __init__(self, root, engine, on_change, on_insert, on_close):
+        self.engine = engine
+        self.on_change = on_change
+        self.on_insert = on_insert
+        self.names = []
+        
+        self.window = tk.Toplevel(root)
+        self.window.title("Functions")
+        self.window.configure(bg="#2c3e50")
+        self.window.protocol("WM_DELETE_WINDOW", on_close)
+        
+        controls = ttk.Frame(self.window, style='Main.TFrame')
+        controls.pack(fill="x", padx=5, pady=5)
+        self.definition_var = tk.StringVar(value="f(x, y) = sqrt(x^2 + y^2)")
+        entry = ttk.Entry(controls, textvariable=self.definition_var, width=40)
+        entry.pack(side="left", fill="x", expand=True)
+        entry.bind("<Return>", lambda event: self.define())
+        self.memo_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls, text="Memoize", variable=self.memo_var).pack(side="left", padx=5)
+        ttk.Button(controls, text="Define", command=self.define).pack(side="left")
+        
+        self.listbox = tk.Listbox(self.window, width=72, height=10, font=("Courier", 10),
+                                  bg="#1e2b38", fg="#ecf0f1", relief="flat")
+        self.listbox.pack(fill="both", expand=True, padx=5)
+        self.listbox.bind("<Double-Button-1>", lambda event: self.insert())
+        buttons = ttk.Frame(self.window, style='Main.TFrame')
+        buttons.pack(fill="x", padx=5, pady=5)
+        ttk.Button(buttons, text="Remove", command=self.remove).pack(side="right")
+        ttk.Button(buttons, text="Insert", command=self.insert).pack(side="right", padx=5)
+        self.status = ttk.Label(self.window, text="", style='History.TLabel')
+        self.status.pack(fill="x", padx=5)
+        self.refresh()
+    
+    def define(self):
+        try:
+            function = self.engine.define(self.definition_var.get(),
+                                          MEMO_SIZE if self.memo_var.get() else 0)
+        except ValueError as e:
+            self.status.config(text=str(e))
+            return
+        self.status.config(text=f"Defined {function.name}()")
+        self.render()
+        self.on_change()
+    
+    def selected(self):
+        selection = self.listbox.curselection()
+        return self.names[selection[0]] if selection else None
+    
+    def insert(self):
+        name = self.selected()
+        if name is not None:
+            self.on_insert(name)
+    
+    def remove(self):
+        name = self.selected()
+        if name is not None:
+            self.engine.user_functions.remove(name)
+            self.status.config(text=f"Removed {name}()")
+            self.render()
+            self.on_change()
+    
+    def refresh(self):
+        # Counts also change in the evaluation worker, so they are redrawn
+        # while the window is open
+        if not self.window.winfo_exists():
+            return
+        self.render()
+        self.window.after(STATS_REFRESH_MS, self.refresh)
+    
+    def render(self):
+        selected = self.selected()
+        self.names = []
+        self.listbox.delete(0, "end")
+        for function in self.engine.user_functions:
+            line = f"{function.text:40} calls {function.calls}"
+            if function.memo is not None:
+                memo = function.memo.stats()
+                line += f"  memo hits {memo['hit_rate']:.0%}"
+            self.names.append(function.name)
+            self.listbox.insert("end", line)
+        if selected in self.names:
+            self.listbox.selection_set(self.names.index(selected))
+
 
 class ModernScientificCalculator:
-    def __init__(self, root):
+    def __init__(self, root, history_capacity=HISTORY_CAPACITY, history_path=HISTORY_PATH):
         self.root = root
         self.root.title("Scientific Calculator")
         self.root.geometry("720x580")
         self.root.resizable(True, True)
-        self.root.configure(bg="#2c3e50")
-        
-        # Set app icon
-        try:
-            self.root.iconbitmap("calculator.ico")
-        except:
-            pass
+        self.theme = "dark"  # Default theme
+        self.root.configure(bg=THEMES[self.theme]["window"])
         
-        # Set higher precision for calculations
-        getcontext().prec = 16
+        # Set app icon (.ico files only load on Windows)
+        if os.path.exists("calculator.ico"):
+            try:
+                self.root.iconbitmap("calculator.ico")
+            except tk.TclError:
+                pass
         
         # Variables
-        self.current_expression = ""
+        self.expression = ExpressionBuffer()
         self.total_expression = ""
-        self.last_answer = "0"
-        self.is_degree_mode = True
-        self.history = []
-        self.theme = "dark"  # Default theme
+        self.engine = CalculatorEngine()
+        self.preview = ExpressionPreview(self.engine)
+        self.preview_job = None
+        self.display_job = None
+        self.worker = EvaluationWorker(EVALUATION_TIME_LIMIT, EVALUATION_MEMORY_LIMIT)
+        self.evaluation_job = None
+        self.stats_window = None
+        self.worksheet_text = ""
+        self.worksheet_view = None
+        self.functions_view = None
+        self.history = HistoryBuffer(history_capacity)
+        self.memory = MemoryBank(MEMORY_REGISTERS)
+        self.history_view = None
+        self.startup_time = None
         
         # Create themed styles
         self.create_styles()
         
-        # Create main frames
+        # Create main frames; the history panel and rarely used buttons
+        # follow once the window has been painted
+        self.create_menu()
         self.create_display_frame()
         self.create_buttons_frame()
-        self.create_history_frame()
+        self.paint_binding = self.current_expression_label.bind("<Expose>", self.on_first_paint)
         
         # Configure grid weights
         self.root.grid_columnconfigure(0, weight=3)
@@ -45,79 +511,108 @@ class ModernScientificCalculator:
         
         # Bind keyboard events
         self.root.bind("<Key>", self.key_press)
+        self.root.bind("<Escape>", lambda event: self.cancel_evaluation())
+        self.root.bind("<Control-v>", self.paste)
+        self.root.bind("<<Paste>>", self.paste)
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Reload the most recent entries from the persistent history
+        self.history_log = None
+        if history_path:
+            try:
+                self.history_log = HistoryLog(history_path)
+            except OSError:
+                pass
+        if self.history_log is not None:
+            for entry in self.history_log.tail(history_capacity):
+                self.history.append(f"{entry.expression} = {entry.result}")
+            self.root.after(HISTORY_FLUSH_MS, self.flush_history_log)
+    
+    def on_first_paint(self, event):
+        self.current_expression_label.unbind("<Expose>", self.paint_binding)
+        self.startup_time = time.perf_counter() - LAUNCHED
+        if profiler.enabled:
+            profiler.record("startup", self.startup_time)
+        self.root.after_idle(self.create_deferred_widgets)
+    
+    def create_deferred_widgets(self):
+        if self.history_view is not None:
+            return
+        self.create_history_frame()
+        self.create_scientific_buttons(deferred=True)
+        # Start the evaluation worker now that the window is up
+        self.worker.start()
+    
+    # Calculation state lives on the headless engine
+    @property
+    def is_degree_mode(self):
+        return self.engine.is_degree_mode
+    
+    @is_degree_mode.setter
+    def is_degree_mode(self, value):
+        self.engine.is_degree_mode = value
+    
+    # The typed expression is held as a list of pieces; this is its text
+    @property
+    def current_expression(self):
+        return self.expression.text
+    
+    @current_expression.setter
+    def current_expression(self, value):
+        self.expression.clear()
+        self.expression.append(value)
+    
+    @property
+    def last_answer(self):
+        return self.engine.last_answer
+    
+    @last_answer.setter
+    def last_answer(self, value):
+        self.engine.last_answer = value
         
     def create_styles(self):
         self.style = ttk.Style()
-        
-        # Configure dark theme
         self.style.theme_use('clam')
         
-        # Main background
-        self.style.configure('Main.TFrame', background="#2c3e50")
-        
-        # Display frame
-        self.style.configure('Display.TFrame', background="#1e2b38")
-        self.style.configure('Display.TLabel', 
-                            background="#1e2b38", 
-                            foreground="#ecf0f1", 
-                            font=("Segoe UI", 12))
-        self.style.configure('BigDisplay.TLabel', 
-                            background="#1e2b38", 
-                            foreground="#ecf0f1", 
-                            font=("Segoe UI", 24, "bold"))
-        self.style.configure('ModeDisplay.TLabel', 
-                            background="#1e2b38", 
-                            foreground="#3498db", 
-                            font=("Segoe UI", 10))
-        
-        # Buttons
-        self.style.configure('NumButton.TButton', 
-                            font=("Segoe UI", 12),
-                            background="#34495e",
-                            foreground="#ecf0f1")
-        self.style.map('NumButton.TButton',
-                      background=[('active', '#2c3e50')],
-                      relief=[('pressed', 'sunken')])
-        
-        self.style.configure('OpButton.TButton', 
-                            font=("Segoe UI", 12),
-                            background="#3498db",
-                            foreground="#ecf0f1")
-        self.style.map('OpButton.TButton',
-                      background=[('active', '#2980b9')],
-                      relief=[('pressed', 'sunken')])
-        
-        self.style.configure('FuncButton.TButton', 
-                            font=("Segoe UI", 11),
-                            background="#2c3e50",
-                            foreground="#ecf0f1")
-        self.style.map('FuncButton.TButton',
-                      background=[('active', '#233140')],
-                      relief=[('pressed', 'sunken')])
-        
-        self.style.configure('SpecialButton.TButton', 
-                            font=("Segoe UI", 12),
-                            background="#e74c3c",
-                            foreground="#ecf0f1")
-        self.style.map('SpecialButton.TButton',
-                      background=[('active', '#c0392b')],
-                      relief=[('pressed', 'sunken')])
-        
-        self.style.configure('EqualButton.TButton', 
-                            font=("Segoe UI", 14, "bold"),
-                            background="#2ecc71",
-                            foreground="#ecf0f1")
-        self.style.map('EqualButton.TButton',
-                      background=[('active', '#27ae60')],
-                      relief=[('pressed', 'sunken')])
-        
-        # History frame
-        self.style.configure('History.TFrame', background="#1e2b38")
-        self.style.configure('History.TLabel', 
-                            background="#1e2b38", 
-                            foreground="#ecf0f1", 
-                            font=("Segoe UI", 12, "bold"))
+        # Fonts and button colours are shared by both themes
+        for name, options in BASE_STYLES:
+            self.style.configure(name, **options)
+        for name, options in STYLE_MAPS:
+            self.style.map(name, **options)
+        for name, options in THEMES[self.theme]["styles"]:
+            self.style.configure(name, **options)
+        
+    def create_menu(self):
+        menubar = tk.Menu(self.root)
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        # Profiling can also be switched on at startup with SCICALC_PROFILE=1
+        self.profiling_var = tk.BooleanVar(value=profiler.enabled)
+        tools_menu.add_checkbutton(label="Profiling", variable=self.profiling_var,
+                                   command=self.toggle_profiling)
+        tools_menu.add_command(label="Plot…", command=self.show_plot)
+        tools_menu.add_command(label="Worksheet…", command=self.show_worksheet)
+        tools_menu.add_command(label="Functions…", command=self.show_functions)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Statistics…", command=self.show_stats)
+        tools_menu.add_command(label="Export Statistics…", command=self.export_stats)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
         
+        # MC, MR and M+ act on the selected register; in statistics mode
+        # M+ feeds the register's running statistics instead of its sum
+        memory_menu = tk.Menu(menubar, tearoff=0)
+        self.register_var = tk.IntVar(value=self.memory.selected)
+        for index in range(len(self.memory)):
+            memory_menu.add_radiobutton(label=f"M{index}", variable=self.register_var,
+                                        value=index, command=self.select_register)
+        memory_menu.add_separator()
+        self.statistics_var = tk.BooleanVar(value=self.memory.statistics)
+        memory_menu.add_checkbutton(label="Statistics Mode", variable=self.statistics_var,
+                                    command=self.toggle_memory_statistics)
+        memory_menu.add_command(label="Register Statistics…", command=self.show_register_stats)
+        menubar.add_cascade(label="Memory", menu=memory_menu)
+        self.root.config(menu=menubar)
+    
     def create_display_frame(self):
         self.display_frame = ttk.Frame(self.root, style='Display.TFrame')
         self.display_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
@@ -137,13 +632,33 @@ class ModernScientificCalculator:
         # Theme toggle button
         self.theme_button = ttk.Button(
             title_frame, 
-            text="☀️", 
+            text=THEMES[self.theme]["button"], 
             command=self.toggle_theme,
             style='FuncButton.TButton',
             width=3
         )
         self.theme_button.pack(side="right", padx=10)
         
+        # Precision toggle button (float / Decimal with N digits)
+        self.precision_button = ttk.Button(
+            title_frame, 
+            text="FLT", 
+            command=self.cycle_precision,
+            style='FuncButton.TButton',
+            width=5
+        )
+        self.precision_button.pack(side="right")
+        
+        # Number domain toggle (real / complex results)
+        self.complex_button = ttk.Button(
+            title_frame, 
+            text="ℝ", 
+            command=self.toggle_complex_mode,
+            style='FuncButton.TButton',
+            width=3
+        )
+        self.complex_button.pack(side="right", padx=(0, 10))
+        
         # Total expression display (shows the full calculation)
         self.total_expression_label = ttk.Label(
             self.display_frame, 
@@ -161,6 +676,18 @@ class ModernScientificCalculator:
             anchor="e"
         )
         self.current_expression_label.pack(fill="x", pady=5)
+        
+        # Huge results are shown abbreviated; double-click copies every digit
+        self.current_expression_label.bind("<Double-Button-1>", self.copy_exact_answer)
+        
+        # Live preview of the running result while typing
+        self.preview_label = ttk.Label(
+            self.display_frame, 
+            text="", 
+            style='Display.TLabel',
+            anchor="e"
+        )
+        self.preview_label.pack(fill="x")
     
     def create_history_frame(self):
         self.history_frame = ttk.Frame(self.root, style='History.TFrame')
@@ -181,26 +708,21 @@ class ModernScientificCalculator:
         )
         clear_history_btn.pack(side="right")
         
-        # History display with custom colors
-        self.history_text = tk.Text(
+        # History display with custom colors; only the visible rows are rendered
+        self.history_view = VirtualHistoryView(
             self.history_frame, 
+            self.history,
             width=25, 
             height=22, 
             font=("Segoe UI", 10),
-            bg="#1e2b38",
-            fg="#ecf0f1",
             bd=0,
             padx=10,
             pady=5
         )
+        self.history_text = self.history_view.text
+        self.history_text.config(**THEMES[self.theme]["history"])
         self.history_text.pack(fill="both", expand=True, padx=5, pady=5)
-        self.history_text.config(state="disabled")
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(self.history_text)
-        scrollbar.pack(side="right", fill="y")
-        self.history_text.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.history_text.yview)
+        self.history_view.refresh()
         
     def create_buttons_frame(self):
         self.buttons_frame = ttk.Frame(self.root, style='Main.TFrame')
@@ -218,7 +740,9 @@ class ModernScientificCalculator:
         self.create_operator_buttons()
         self.create_special_buttons()
         
-    def create_scientific_buttons(self):
+    def create_scientific_buttons(self, deferred=False):
+        # Builds the buttons in DEFERRED_FUNCTIONS when deferred is true,
+        # the others when it is false
         scientific_functions = [
             # First row - Trigonometric
             ("sin", 0, 0, 'FuncButton.TButton'), 
@@ -259,6 +783,8 @@ class ModernScientificCalculator:
         ]
         
         for function_text, row, col, style in scientific_functions:
+            if (function_text in DEFERRED_FUNCTIONS) != deferred:
+                continue
             button = ttk.Button(
                 self.buttons_frame, 
                 text=function_text,
@@ -363,15 +889,15 @@ class ModernScientificCalculator:
         )
         ans_button.grid(row=5, column=6, padx=3, pady=3, sticky="nsew")
         
-        # Equal button (=)
-        equal_button = ttk.Button(
+        # Equal button (=); becomes Cancel while an evaluation is running
+        self.equal_button = ttk.Button(
             self.buttons_frame,
             text="=",
             command=self.evaluate,
             style='EqualButton.TButton',
             width=3
         )
-        equal_button.grid(row=6, column=3, columnspan=4, padx=3, pady=3, sticky="nsew")
+        self.equal_button.grid(row=6, column=3, columnspan=4, padx=3, pady=3, sticky="nsew")
     
     def get_operator_symbol(self, op):
         if op == "×":
@@ -382,56 +908,69 @@ class ModernScientificCalculator:
             return op
     
     def add_to_expression(self, value):
-        self.current_expression += value
-        self.update_display()
+        self.expression.append(value)
+        self.schedule_display()
+    
+    def insert_many(self, pieces):
+        # Any number of edits, one redraw
+        self.expression.extend(pieces)
+        self.schedule_display()
+    
+    def paste(self, event=None):
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            return "break"
+        self.insert_many(split_pieces(text))
+        return "break"
     
     def add_scientific_function(self, function):
         if function == "sin":
-            self.current_expression += "sin("
+            self.expression.append("sin(")
         elif function == "cos":
-            self.current_expression += "cos("
+            self.expression.append("cos(")
         elif function == "tan":
-            self.current_expression += "tan("
+            self.expression.append("tan(")
         elif function == "asin":
-            self.current_expression += "asin("
+            self.expression.append("asin(")
         elif function == "acos":
-            self.current_expression += "acos("
+            self.expression.append("acos(")
         elif function == "atan":
-            self.current_expression += "atan("
+            self.expression.append("atan(")
         elif function == "log":
-            self.current_expression += "log10("
+            self.expression.append("log10(")
         elif function == "ln":
-            self.current_expression += "log("
+            self.expression.append("log(")
         elif function == "e^x":
-            self.current_expression += "exp("
+            self.expression.append("exp(")
         elif function == "x²":
-            self.current_expression += "^2"
+            self.expression.append("^2")
         elif function == "x³":
-            self.current_expression += "^3"
+            self.expression.append("^3")
         elif function == "xʸ":
-            self.current_expression += "^"
+            self.expression.append("^")
         elif function == "√x":
-            self.current_expression += "sqrt("
+            self.expression.append("sqrt(")
         elif function == "∛x":
-            self.current_expression += "cbrt("
+            self.expression.append("cbrt(")
         elif function == "10ˣ":
-            self.current_expression += "10^"
+            self.expression.append("10^")
         elif function == "π":
-            self.current_expression += "pi"
+            self.expression.append("pi")
         elif function == "e":
-            self.current_expression += "e"
+            self.expression.append("e")
         elif function == "abs":
-            self.current_expression += "abs("
+            self.expression.append("abs(")
         elif function == "(":
-            self.current_expression += "("
+            self.expression.append("(")
         elif function == ")":
-            self.current_expression += ")"
+            self.expression.append(")")
         elif function == "%":
-            self.current_expression += "%"
+            self.expression.append("%")
         elif function == "1/x":
-            self.current_expression += "1/"
+            self.expression.append("1/")
         elif function == "n!":
-            self.current_expression += "fact("
+            self.expression.append("fact(")
         elif function == "DEG/RAD":
             self.toggle_angle_mode()
             return
@@ -444,240 +983,371 @@ class ModernScientificCalculator:
         elif function == "M+":
             self.memory_add()
             return
+        elif function in self.engine.user_functions:
+            self.expression.append(f"{function}(")
             
-        self.update_display()
+        self.schedule_display()
     
     def toggle_angle_mode(self):
-        self.is_degree_mode = not self.is_degree_mode
+        self.engine.toggle_angle_mode()
+        self.update_mode_display()
+        self.schedule_preview()
+        self.refresh_worksheet()
+    
+    def toggle_complex_mode(self):
+        complex_mode = self.engine.toggle_complex_mode()
+        self.complex_button.config(text="ℂ" if complex_mode else "ℝ")
+        self.update_mode_display()
+        self.schedule_preview()
+        self.refresh_worksheet()
+    
+    def cycle_precision(self):
+        index = PRECISION_MODES.index(self.engine.precision)
+        precision = PRECISION_MODES[(index + 1) % len(PRECISION_MODES)]
+        self.engine.set_precision(precision)
+        self.precision_button.config(text="FLT" if precision is None else str(precision))
+        self.update_mode_display()
+        self.schedule_preview()
+        self.refresh_worksheet()
+    
+    def update_mode_display(self):
         mode_text = "DEG" if self.is_degree_mode else "RAD"
+        if self.engine.precision is not None:
+            mode_text += f" · {self.engine.precision} digits"
+        elif self.engine.is_complex_mode:
+            mode_text += " · ℂ"
+        if self.memory.selected or self.memory.statistics or self.memory.register():
+            mode_text += f" · M{self.memory.selected}"
+            if self.memory.statistics:
+                mode_text += f" Σ{self.memory.register().stats.count}"
         self.mode_display.config(text=mode_text)
     
     def toggle_sign(self):
-        if self.current_expression and self.current_expression[0] == "-":
-            self.current_expression = self.current_expression[1:]
-        else:
-            self.current_expression = "-" + self.current_expression
-        self.update_display()
+        self.expression.toggle_sign()
+        self.schedule_display()
     
     def memory_clear(self):
-        self.memory_value = "0"
-        messagebox.showinfo("Memory", "Memory cleared")
+        self.memory.clear()
+        self.update_mode_display()
+        messagebox.showinfo("Memory", f"M{self.memory.selected} cleared")
     
     def memory_recall(self):
-        if hasattr(self, 'memory_value'):
-            self.current_expression += self.memory_value
-            self.update_display()
-        else:
-            messagebox.showinfo("Memory", "Memory is empty")
+        value = self.memory.recall()
+        if value is None:
+            messagebox.showinfo("Memory", f"M{self.memory.selected} is empty")
+            return
+        try:
+            text = recall_text(value)
+        except ValueError as e:
+            messagebox.showerror("Memory", f"Cannot recall M{self.memory.selected}: {e}")
+            return
+        self.expression.append(text)
+        self.schedule_display()
     
     def memory_add(self):
-        if self.current_expression:
-            try:
-                value = self.evaluate_expression(self.current_expression)
-                if hasattr(self, 'memory_value'):
-                    self.memory_value = str(float(self.memory_value) + float(value))
-                else:
-                    self.memory_value = value
-                messagebox.showinfo("Memory", f"Value {value} added to memory")
-            except:
-                messagebox.showerror("Error", "Cannot add current expression to memory")
+        # Evaluated in the worker like "=", into the register selected now
+        self.evaluate(register=self.memory.selected)
+    
+    def select_register(self):
+        self.memory.select(self.register_var.get())
+        self.update_mode_display()
+    
+    def toggle_memory_statistics(self):
+        self.memory.statistics = self.statistics_var.get()
+        self.update_mode_display()
+    
+    def show_register_stats(self):
+        stats = self.memory.register().stats
+        if not stats.count:
+            messagebox.showinfo("Memory", f"No statistics in M{self.memory.selected} "
+                                          "(turn on Memory > Statistics Mode and use M+)")
+            return
+        lines = [f"count\t{stats.count}",
+                 f"sum\t{format_result(stats.total.value)}",
+                 f"mean\t{format_result(stats.mean)}",
+                 f"std\t{format_result(stats.std)}",
+                 f"min\t{format_result(stats.min)}",
+                 f"max\t{format_result(stats.max)}"]
+        lines += [f"p{p * 100:g}\t{format_result(stats.quantile(p))}" for p in stats.sketches]
+        messagebox.showinfo(f"M{self.memory.selected} Statistics", "\n".join(lines))
     
     def clear(self):
-        self.current_expression = ""
+        self.expression.clear()
         self.total_expression = ""
-        self.update_display()
+        self.schedule_display()
     
     def clear_history(self):
-        self.history = []
-        self.history_text.config(state="normal")
-        self.history_text.delete(1.0, tk.END)
-        self.history_text.config(state="disabled")
+        self.history.clear()
+        if self.history_view is not None:
+            self.history_view.refresh()
+        if self.history_log is not None:
+            self.history_log.clear()
+    
+    def flush_history_log(self):
+        # Periodic flush so an idle session does not hold unwritten entries
+        self.history_log.flush()
+        self.root.after(HISTORY_FLUSH_MS, self.flush_history_log)
+    
+    def on_close(self):
+        self.worker.close()
+        if self.worksheet_view is not None:
+            self.worksheet_view.worker.close()
+        if self.history_log is not None:
+            self.history_log.close()
+        self.root.destroy()
     
     def backspace(self):
-        self.current_expression = self.current_expression[:-1]
+        self.expression.pop()
+        self.schedule_display()
+    
+    def schedule_display(self):
+        # Edits only mark the display dirty; the redraw runs once the event
+        # queue is empty, so a burst of keys (auto-repeat, a replayed macro)
+        # costs a single label update
+        if self.display_job is None:
+            self.display_job = self.root.after_idle(self.flush_display)
+    
+    def flush_display(self):
+        self.display_job = None
         self.update_display()
     
     def update_display(self):
-        if not self.current_expression:
+        if profiler.enabled:
+            start = time.perf_counter()
+            self.redraw_display()
+            profiler.record("update_display", time.perf_counter() - start)
+        else:
+            self.redraw_display()
+    
+    def redraw_display(self):
+        if not self.expression:
             self.current_expression_label.config(text="0")
         else:
-            # Convert internal representation to display representation
-            display_text = self.current_expression
-            display_text = display_text.replace("*", "×")
-            display_text = display_text.replace("/", "÷")
-            display_text = display_text.replace("pi", "π")
-            display_text = display_text.replace("log10(", "log(")
-            display_text = display_text.replace("log(", "ln(")
-            display_text = display_text.replace("exp(", "e^(")
-            display_text = display_text.replace("sqrt(", "√(")
-            display_text = display_text.replace("cbrt(", "∛(")
-            display_text = display_text.replace("^2", "²")
-            display_text = display_text.replace("^3", "³")
-            display_text = display_text.replace("fact(", "!")
-            display_text = display_text.replace("Ans", self.last_answer)
-            
-            self.current_expression_label.config(text=display_text)
+            # Glyphs are cached per piece, so this is a single join
+            self.current_expression_label.config(text=self.expression.display_text)
         
         self.total_expression_label.config(text=self.total_expression)
+        self.schedule_preview()
+    
+    def schedule_preview(self):
+        # Debounce: only the last keystroke in a burst triggers a recompute
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+        self.preview_job = self.root.after(PREVIEW_DELAY_MS, self.refresh_preview)
+    
+    def refresh_preview(self):
+        self.preview_job = None
+        result = self.preview.update(self.current_expression)
+        self.preview_label.config(text=f"= {result}" if result else "")
+    
+    def clear_preview(self):
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+            self.preview_job = None
+        self.preview.reset()
+        self.preview_label.config(text="")
+    
+    def copy_exact_answer(self, event=None):
+        self.root.clipboard_clear()
+        self.root.clipboard_append(self.engine.exact_answer())
     
     def toggle_theme(self):
-        if self.theme == "dark":
-            # Switch to light theme
-            self.theme = "light"
-            self.theme_button.config(text="🌙")
-            self.root.configure(bg="#ecf0f1")
-            
-            # Update styles for light theme
-            self.style.configure('Main.TFrame', background="#ecf0f1")
-            self.style.configure('Display.TFrame', background="#f8f9fa")
-            self.style.configure('Display.TLabel', background="#f8f9fa", foreground="#2c3e50")
-            self.style.configure('BigDisplay.TLabel', background="#f8f9fa", foreground="#2c3e50")
-            self.style.configure('ModeDisplay.TLabel', background="#f8f9fa", foreground="#3498db")
-            
-            self.style.configure('History.TFrame', background="#f8f9fa")
-            self.style.configure('History.TLabel', background="#f8f9fa", foreground="#2c3e50")
-            
-            # Update text widget colors
-            self.history_text.config(bg="#f8f9fa", fg="#2c3e50")
-            
-        else:
-            # Switch to dark theme
-            self.theme = "dark"
-            self.theme_button.config(text="☀️")
-            self.root.configure(bg="#2c3e50")
-            
-            # Update styles for dark theme
-            self.style.configure('Main.TFrame', background="#2c3e50")
-            self.style.configure('Display.TFrame', background="#1e2b38")
-            self.style.configure('Display.TLabel', background="#1e2b38", foreground="#ecf0f1")
-            self.style.configure('BigDisplay.TLabel', background="#1e2b38", foreground="#ecf0f1")
-            self.style.configure('ModeDisplay.TLabel', background="#1e2b38", foreground="#3498db")
-            
-            self.style.configure('History.TFrame', background="#1e2b38")
-            self.style.configure('History.TLabel', background="#1e2b38", foreground="#ecf0f1")
-            
-            # Update text widget colors
-            self.history_text.config(bg="#1e2b38", fg="#ecf0f1")
+        self.apply_theme("light" if self.theme == "dark" else "dark")
     
-    def evaluate(self):
-        if not self.current_expression:
+    def apply_theme(self, name):
+        theme = THEMES[name]
+        self.theme = name
+        for style, options in theme["styles"]:
+            self.style.configure(style, **options)
+        self.root.configure(bg=theme["window"])
+        self.theme_button.config(text=theme["button"])
+        if self.history_view is not None:
+            self.history_text.config(**theme["history"])
+    
+    def evaluate(self, register=None):
+        # With a register, the result is added to that memory register
+        # (M+) instead of becoming Ans
+        if not self.current_expression or self.evaluation_job is not None:
             return
         
-        # Save the current expression for history
-        expression_to_evaluate = self.current_expression
+        # The worker evaluates a copy; keep what is needed to finish up
+        self.evaluation_job = (self.current_expression, self.expression.display_text,
+                               time.perf_counter(), register)
+        self.worker.submit(self.current_expression, self.engine)
+        self.current_expression_label.config(text="Computing…")
+        self.equal_button.config(text="Cancel", command=self.cancel_evaluation)
+        self.root.after(EVALUATION_POLL_MS, self.poll_evaluation)
+    
+    def poll_evaluation(self):
+        if self.evaluation_job is None:
+            return
+        outcome = self.worker.poll()
+        if outcome is None:
+            self.root.after(EVALUATION_POLL_MS, self.poll_evaluation)
+            return
+        self.finish_evaluation(*outcome)
+    
+    def cancel_evaluation(self):
+        if self.evaluation_job is None:
+            return
+        self.worker.cancel()
+        self.finish_evaluation(False, None, None)
+    
+    def finish_evaluation(self, ok, value, message):
+        expression_to_evaluate, display_expression, started, register = self.evaluation_job
+        self.evaluation_job = None
+        if profiler.enabled:
+            # Round trip through the worker, as the user waits for it
+            profiler.record("evaluate", time.perf_counter() - started)
+        self.equal_button.config(text="=", command=self.evaluate)
         
-        try:
-            # Evaluate the expression
-            result = self.evaluate_expression(expression_to_evaluate)
-            
-            # Display the expression in history
-            display_expression = self.current_expression
-            display_expression = display_expression.replace("*", "×")
-            display_expression = display_expression.replace("/", "÷")
-            
-            # Update the display
-            self.total_expression = display_expression
-            self.current_expression = ""
+        if not ok:
+            self.update_display()
+            if message is not None:
+                self.current_expression_label.config(text="Error")
+                if register is None:
+                    messagebox.showerror("Error", f"Invalid expression: {message}")
+                else:
+                    messagebox.showerror("Error", f"Cannot add to memory: {message}")
+            return
+        
+        if register is not None:
+            # M+ leaves the expression as it is
+            self.update_display()
+            try:
+                self.memory.add(value, register)
+            except (ValueError, TypeError) as e:
+                messagebox.showerror("Error", f"Cannot add to memory: {e}")
+            self.update_mode_display()
+            return
+        
+        # The result becomes the new Ans
+        result = self.engine.store_answer(value)
+        
+        # Update the display; anything typed while computing is kept
+        self.total_expression = display_expression
+        if self.current_expression == expression_to_evaluate:
+            self.expression.clear()
             self.current_expression_label.config(text=result)
-            self.last_answer = result
-            
-            # Add to history
-            self.add_to_history(display_expression, result)
-            
-        except Exception as e:
-            self.current_expression_label.config(text="Error")
-            messagebox.showerror("Error", f"Invalid expression: {str(e)}")
+            self.clear_preview()
+        else:
+            self.update_display()
+        
+        # Add to history
+        self.add_to_history(display_expression, result)
+        self.refresh_worksheet()
     
     def evaluate_expression(self, expression):
-        # Replace display representation with computable representation
-        expression = expression.replace("pi", "math.pi")
-        expression = expression.replace("e", "math.e")
-        expression = expression.replace("^", "**")
-        expression = expression.replace("log10(", "math.log10(")
-        expression = expression.replace("log(", "math.log(")
-        expression = expression.replace("exp(", "math.exp(")
-        expression = expression.replace("sin(", "self.calculate_sin(")
-        expression = expression.replace("cos(", "self.calculate_cos(")
-        expression = expression.replace("tan(", "self.calculate_tan(")
-        expression = expression.replace("asin(", "self.calculate_asin(")
-        expression = expression.replace("acos(", "self.calculate_acos(")
-        expression = expression.replace("atan(", "self.calculate_atan(")
-        expression = expression.replace("sqrt(", "math.sqrt(")
-        expression = expression.replace("cbrt(", "self.cbrt(")
-        expression = expression.replace("abs(", "abs(")
-        expression = expression.replace("fact(", "math.factorial(")
-        expression = expression.replace("%", "/100")
-        expression = expression.replace("Ans", self.last_answer)
-        
-        # Evaluate the expression
-        result = eval(expression)
-        
-        # Format the result
-        if isinstance(result, (int, float, complex)):
-            if isinstance(result, complex):
-                formatted_result = str(result)
-            else:
-                # Handle very large or very small numbers with scientific notation
-                if abs(result) > 1e10 or (abs(result) < 1e-10 and result != 0):
-                    formatted_result = f"{result:.10e}"
-                else:
-                    # For regular numbers, limit decimal places
-                    formatted_result = f"{result:.10g}"
-        else:
-            formatted_result = str(result)
-            
-        return formatted_result
+        return self.engine.evaluate_expression(expression)
+    
+    def show_plot(self):
+        # Plots the expression being typed when it mentions x
+        load_plotting()
+        if np is None:
+            messagebox.showerror("Plot", "Plotting requires numpy (pip install numpy)")
+            return
+        expression = self.current_expression if "x" in self.current_expression else ""
+        PlotView(self.root, self.engine, expression)
+    
+    def show_worksheet(self):
+        # The text outlives the window, so reopening it keeps the lines
+        if self.worksheet_view is not None:
+            self.worksheet_view.window.lift()
+            return
+        self.worksheet_view = WorksheetView(self.root, self.engine, self.worksheet_text,
+                                            self.close_worksheet)
+    
+    def refresh_worksheet(self):
+        if self.worksheet_view is not None:
+            self.worksheet_view.refresh()
+    
+    def close_worksheet(self):
+        self.worksheet_text = self.worksheet_view.text
+        self.worksheet_view.close()
+        self.worksheet_view = None
+    
+    def show_functions(self):
+        if self.functions_view is not None:
+            self.functions_view.window.lift()
+            return
+        self.functions_view = FunctionsView(self.root, self.engine, self.functions_changed,
+                                            self.add_scientific_function, self.close_functions)
+    
+    def functions_changed(self):
+        # Expressions compiled before the change are recompiled on next use
+        self.schedule_preview()
+        self.refresh_worksheet()
+    
+    def close_functions(self):
+        self.functions_view.window.destroy()
+        self.functions_view = None
+    
+    def toggle_profiling(self):
+        profiler.enabled = self.profiling_var.get()
+    
+    def show_stats(self):
+        if self.stats_window is not None:
+            self.stats_window.lift()
+            return
+        self.stats_window = tk.Toplevel(self.root)
+        self.stats_window.title("Statistics")
+        self.stats_window.protocol("WM_DELETE_WINDOW", self.close_stats)
+        self.stats_text = tk.Text(self.stats_window, width=70, height=24, wrap="none",
+                                  font=("Courier", 10))
+        self.stats_text.pack(fill="both", expand=True)
+        buttons = ttk.Frame(self.stats_window)
+        buttons.pack(fill="x")
+        ttk.Button(buttons, text="Reset", command=self.reset_stats).pack(side="right")
+        ttk.Button(buttons, text="Export…", command=self.export_stats).pack(side="right")
+        self.refresh_stats()
+    
+    def refresh_stats(self):
+        if self.stats_window is None:
+            return
+        self.render_stats()
+        self.stats_window.after(STATS_REFRESH_MS, self.refresh_stats)
+    
+    def render_stats(self):
+        report = profiler.report()
+        if self.startup_time is not None:
+            report = f"Startup (launch to first paint): {self.startup_time * 1000:.0f} ms\n\n" + report
+        if not profiler.stages:
+            report += "\n\nNothing recorded yet"
+            if not profiler.enabled:
+                report += " (enable Tools > Profiling)"
+        self.stats_text.config(state="normal")
+        self.stats_text.delete("1.0", "end")
+        self.stats_text.insert("1.0", report)
+        self.stats_text.config(state="disabled")
+    
+    def reset_stats(self):
+        profiler.reset()
+        self.render_stats()
+    
+    def close_stats(self):
+        self.stats_window.destroy()
+        self.stats_window = None
+    
+    def export_stats(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("JSON", "*.json")],
+            initialfile="calculator-stats.json")
+        if path:
+            try:
+                profiler.export(path)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not export statistics: {e}")
     
     def add_to_history(self, expression, result):
-        history_entry = f"{expression} = {result}\n"
+        history_entry = f"{expression} = {result}"
         self.history.append(history_entry)
         
-        # Update history display
-        self.history_text.config(state="normal")
-        self.history_text.insert(tk.END, history_entry)
-        self.history_text.see(tk.END)  # Scroll to the bottom
-        self.history_text.config(state="disabled")
-    
-    # Trigonometric functions that handle degrees/radians conversion
-    def calculate_sin(self, x):
-        if self.is_degree_mode:
-            return math.sin(math.radians(x))
-        return math.sin(x)
-        
-    def calculate_cos(self, x):
-        if self.is_degree_mode:
-            return math.cos(math.radians(x))
-        return math.cos(x)
-        
-    def calculate_tan(self, x):
-        if self.is_degree_mode:
-            return math.tan(math.radians(x))
-        return math.tan(x)
-        
-    def calculate_asin(self, x):
-        result = math.asin(x)
-        if self.is_degree_mode:
-            return math.degrees(result)
-        return result
-        
-    def calculate_acos(self, x):
-        result = math.acos(x)
-        if self.is_degree_mode:
-            return math.degrees(result)
-        return result
-        
-    def calculate_atan(self, x):
-        result = math.atan(x)
-        if self.is_degree_mode:
-            return math.degrees(result)
-        return result
-    
-    def cbrt(self, x):
-        # Cube root function
-        if x >= 0:
-            return math.pow(x, 1/3)
-        else:
-            return -math.pow(abs(x), 1/3)
+        # Update history display (follows the newest entry unless scrolled up)
+        if self.history_view is not None:
+            self.history_view.refresh()
+        
+        if self.history_log is not None:
+            self.history_log.append(expression, result, "DEG" if self.is_degree_mode else "RAD")
     
     def key_press(self, event):
         key = event.char
@@ -686,6 +1356,8 @@ class ModernScientificCalculator:
             self.add_to_expression(key)
         elif key in "+-*/":
             self.add_to_expression(key)
+        elif key == "i" and self.engine.is_complex_mode:
+            self.add_to_expression("i")
         elif key == "=":
             self.evaluate()
         elif key == "\r":  # Enter key
@@ -694,6 +1366,15 @@ class ModernScientificCalculator:
             self.backspace()
 
 if __name__ == "__main__":
+    # Headless batch mode: python scientific-calculator.py --batch [FILE] [options]
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        from scicalc.batch import main
+        sys.exit(main(sys.argv[2:]))
+    # CSV formula mode: python scientific-calculator.py --csv FILE FORMULA [options]
+    if len(sys.argv) > 1 and sys.argv[1] == "--csv":
+        from scicalc.columns import main
+        sys.exit(main(sys.argv[2:]))
+    
     root = tk.Tk()
     calculator = ModernScientificCalculator(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,25 @@
+import io
+import unittest
+
+from scicalc.batch import run_batch
+
+
+class RunBatchTests(unittest.TestCase):
+    LINES = [f"{i}*2\n" for i in range(25)] + ["1/0\n", "\n", "sqrt(16)\n"]
+
+    def expected(self):
+        return [str(i * 2) for i in range(25)] + ["Error: division by zero", "", "4"]
+
+    def test_parallel_output_is_in_input_order(self):
+        out = io.StringIO()
+        self.assertEqual(run_batch(self.LINES, out, jobs=2, chunk_size=3), len(self.LINES))
+        self.assertEqual(out.getvalue().splitlines(), self.expected())
+
+    def test_chain_binds_the_previous_result(self):
+        out = io.StringIO()
+        run_batch(["2\n", "Ans^2\n", "Ans+1\n"], out, jobs=4, chain=True, line_numbers=True)
+        self.assertEqual(out.getvalue().splitlines(), ["1\t2", "2\t4", "3\t5"])
+
+
+if __name__ == "__main__":
+    unittest.main()
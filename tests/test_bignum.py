@@ -0,0 +1,26 @@
+import math
+import unittest
+
+from scicalc import CalculatorEngine
+
+
+class BigFactorialTests(unittest.TestCase):
+    # fact(n) above the lazy threshold must behave like the integer it
+    # stands for
+    def setUp(self):
+        self.engine = CalculatorEngine()
+
+    def test_logarithms(self):
+        exact = math.factorial(6000)
+        self.assertAlmostEqual(self.engine.evaluate_value("log10(fact(6000))"), math.log10(exact))
+        self.assertAlmostEqual(self.engine.evaluate_value("log(fact(6000))"), math.log(exact))
+
+    def test_float_operands_overflow(self):
+        for expression in ("fact(6000)*0.5", "fact(6000)/2.5", "fact(6000)^0.5", "0.5*fact(6000)"):
+            with self.subTest(expression=expression):
+                with self.assertRaises(OverflowError):
+                    self.engine.evaluate_value(expression)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from scicalc.columns import apply_formula, variable_name
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class ApplyFormulaTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "data.csv")
+        rows = ["price (usd),qty"] + [f"{i}.5,{i}" for i in range(7)] + ["n/a,3", ",4"]
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("\n".join(rows) + "\n")
+
+    def apply(self, chunk_rows):
+        out = io.StringIO()
+        count = apply_formula(self.path, out, "price__usd_*qty", "total", chunk_rows)
+        return count, out.getvalue().splitlines()
+
+    def test_chunks_give_the_same_output(self):
+        count, lines = self.apply(chunk_rows=1000)
+        self.assertEqual(count, 9)
+        self.assertEqual(lines[0], "price (usd),qty,total")
+        self.assertEqual(lines[1:4], ["0.5,0,0", "1.5,1,1.5", "2.5,2,5"])
+        # Non-numeric and blank cells give an empty result
+        self.assertEqual(lines[-2:], ["n/a,3,", ",4,"])
+        for chunk_rows in (1, 2, 4):
+            with self.subTest(chunk_rows=chunk_rows):
+                self.assertEqual(self.apply(chunk_rows), (count, lines))
+
+    def test_variable_names(self):
+        self.assertEqual(variable_name("price (usd)"), "price__usd_")
+        self.assertEqual(variable_name("2nd"), "_2nd")
+
+
+if __name__ == "__main__":
+    unittest.main()
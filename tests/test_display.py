@@ -0,0 +1,35 @@
+import unittest
+
+from scicalc.display import ExpressionBuffer, split_pieces
+
+
+class PasteTests(unittest.TestCase):
+    def test_display_text_round_trips(self):
+        typed = ExpressionBuffer()
+        typed.extend(["log10(", "8", ")", "+", "log(", "2", ")", "*", "pi", "+", "sqrt(", "4", ")"])
+        pasted = ExpressionBuffer()
+        pasted.extend(split_pieces(typed.display_text))
+        self.assertEqual(pasted.text, typed.text)
+
+
+class BackspaceTests(unittest.TestCase):
+    def test_pop_removes_a_whole_piece(self):
+        buffer = ExpressionBuffer()
+        buffer.extend(["log10(", "2", ")", "*", "sqrt(", "9", ")", "^2"])
+        self.assertEqual(buffer.display_text, "log(2)×√(9)²")
+        self.assertEqual(buffer.pop(), "^2")
+        self.assertEqual(buffer.pop(), ")")
+        self.assertEqual(buffer.pop(), "9")
+        self.assertEqual(buffer.pop(), "sqrt(")
+        self.assertEqual(buffer.display_text, "log(2)×")
+        self.assertEqual(buffer.text, "log10(2)*")
+
+    def test_pop_on_empty_buffer(self):
+        buffer = ExpressionBuffer("7")
+        self.assertEqual(buffer.pop(), "7")
+        self.assertEqual(buffer.pop(), "")
+        self.assertEqual(buffer.display_text, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+import unittest
+
+
+class HeadlessTests(unittest.TestCase):
+    def test_engine_does_not_import_tkinter(self):
+        script = ("import sys\n"
+                  "from scicalc import CalculatorEngine\n"
+                  "engine = CalculatorEngine()\n"
+                  "assert engine.evaluate('2*sin(30)') == '1'\n"
+                  "print('tkinter' in sys.modules)\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                check=True, cwd=root).stdout
+        self.assertEqual(output.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import math
+import unittest
+
+from scicalc import CalculatorEngine
+from scicalc.expression import compile_expression
+
+
+class FoldedConstantTests(unittest.TestCase):
+    # The first evaluation walks the tree; the second runs generated code
+    # with folded constants bound into it
+    def test_big_integers_survive_compilation(self):
+        engine = CalculatorEngine()
+        for expression in ("fact(3000)", "2^4000", "-fact(6000)", "abs(fact(6000))"):
+            with self.subTest(expression=expression):
+                first = engine.evaluate_value(expression)
+                self.assertEqual(engine.evaluate_value(expression), first)
+
+    def test_user_function_calls_are_not_folded(self):
+        engine = CalculatorEngine()
+        function = engine.user_functions.define("f(x) = x^2 + 1")
+        engine.compile("f(3)").compile()
+        self.assertEqual(function.calls, 0)
+        self.assertEqual(engine.evaluate_value("f(3)"), 10)
+        self.assertEqual(function.calls, 1)
+
+
+class RealPowerTests(unittest.TestCase):
+    # Each expression is evaluated twice: tree walk, then generated code
+    def test_fractional_power_of_negative_base_is_a_domain_error(self):
+        engine = CalculatorEngine()
+        for expression in ("(-8)^(1/3)", "x^0.5"):
+            with self.subTest(expression=expression):
+                for _ in range(2):
+                    with self.assertRaises(ValueError):
+                        engine.evaluate_value(expression, {"x": -4})
+
+    def test_integer_powers_of_negative_base_stay_real(self):
+        engine = CalculatorEngine()
+        for _ in range(2):
+            self.assertEqual(engine.evaluate_value("x^3 + x^2.0 + 2^x", {"x": -2}), -3.75)
+
+    def test_complex_mode_keeps_the_principal_root(self):
+        engine = CalculatorEngine(complex_mode=True)
+        for _ in range(2):
+            value = engine.evaluate_value("(-8)^(1/3)")
+            self.assertAlmostEqual(value, 1 + 3 ** 0.5 * 1j)
+
+
+class CompileCacheTests(unittest.TestCase):
+    def test_cache_is_keyed_on_text_and_mode(self):
+        compiled = compile_expression("x + 1")
+        self.assertIs(compile_expression("x + 1"), compiled)
+        self.assertIsNot(compile_expression("x + 1", degree_mode=False), compiled)
+        self.assertIsNot(compile_expression("x + 1", precision=20), compiled)
+        self.assertIsNot(compile_expression("x + 1", complex_mode=True), compiled)
+
+    def test_redefining_a_function_compiles_again(self):
+        engine = CalculatorEngine()
+        engine.define("f(x) = x + 1")
+        compiled = engine.compile("f(2)")
+        self.assertIs(engine.compile("f(2)"), compiled)
+        engine.define("f(x) = x + 2")
+        self.assertIsNot(engine.compile("f(2)"), compiled)
+        self.assertEqual(engine.evaluate_value("f(2)"), 4)
+
+
+class OptimizationTests(unittest.TestCase):
+    def test_constants_fold_in_the_angle_mode(self):
+        self.assertIn("+ 6 + 0.5", compile_expression("x + 2*3 + sin(30)").source)
+        radians = compile_expression("x + 2*3 + sin(30)", degree_mode=False).source
+        self.assertIn(repr(math.sin(30)), radians)
+
+    def test_repeated_subtrees_are_computed_once(self):
+        compiled = compile_expression("sqrt(x^2+1) + 1/sqrt(x^2+1)")
+        self.assertEqual(compiled.source.count("_f0("), 1)
+        for _ in range(2):
+            self.assertAlmostEqual(compiled({"x": 2}), math.sqrt(5) + 1 / math.sqrt(5))
+
+    def test_failing_subtrees_are_left_for_evaluation(self):
+        compiled = compile_expression("x + 1/0")
+        compiled.compile()
+        with self.assertRaises(ZeroDivisionError):
+            compiled({"x": 1})
+
+
+class DegreeModeTests(unittest.TestCase):
+    def test_special_angles_are_exact(self):
+        engine = CalculatorEngine()
+        for expression, value in (("sin(30)", 0.5), ("sin(180)", 0.0), ("cos(90)", 0.0),
+                                  ("cos(120)", -0.5), ("tan(45)", 1.0), ("tan(-135)", 1.0),
+                                  ("asin(0.5)", 30.0), ("acos(0.5)", 60.0), ("atan(1)", 45.0)):
+            with self.subTest(expression=expression):
+                self.assertEqual(engine.evaluate_value(expression), value)
+
+    def test_tan_at_its_poles_is_a_domain_error(self):
+        engine = CalculatorEngine()
+        for expression in ("tan(90)", "tan(-270)", "tan(450)"):
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    engine.evaluate_value(expression)
+
+    def test_huge_angles_are_reduced_exactly(self):
+        # 10^22 is 280 modulo 360
+        engine = CalculatorEngine()
+        self.assertAlmostEqual(engine.evaluate_value("sin(1e22)"), -math.sin(math.radians(80)),
+                               places=15)
+
+
+class PrecisionTests(unittest.TestCase):
+    def test_digits(self):
+        engine = CalculatorEngine(precision=50)
+        self.assertEqual(engine.evaluate_expression("pi"),
+                         "3.1415926535897932384626433832795028841971693993751")
+        self.assertEqual(engine.evaluate_expression("1/3"), "0." + "3" * 50)
+        self.assertEqual(engine.evaluate_expression("sqrt(2)"),
+                         "1.4142135623730950488016887242096980785696718753769")
+        self.assertEqual(engine.evaluate_expression("0.1 + 0.2"), "0.3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from scicalc.history import HistoryBuffer, HistoryLog
+
+
+class HistoryBufferTests(unittest.TestCase):
+    def test_wraparound(self):
+        buffer = HistoryBuffer(capacity=3)
+        for i in range(7):
+            buffer.append(i)
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(list(buffer), [4, 5, 6])
+        self.assertEqual((buffer[0], buffer[-1]), (4, 6))
+        self.assertEqual(buffer.window(1, 5), [5, 6])
+        with self.assertRaises(IndexError):
+            buffer[3]
+
+    def test_clear(self):
+        buffer = HistoryBuffer(capacity=2)
+        for i in range(3):
+            buffer.append(i)
+        buffer.clear()
+        buffer.append("a")
+        self.assertEqual(list(buffer), ["a"])
+
+
+class HistoryLogIndexTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "history.log")
+        log = HistoryLog(self.path)
+        for i in range(10):
+            log.append(f"{i}+1", str(i + 1), "DEG", 1.0)
+        log.close()
+
+    def reopen(self):
+        log = HistoryLog(self.path)
+        self.addCleanup(log.close)
+        return log
+
+    def test_missing_index_is_rebuilt(self):
+        os.remove(self.path + ".idx")
+        log = self.reopen()
+        self.assertEqual(len(log), 10)
+        self.assertEqual(log[9].expression, "9+1")
+        self.assertEqual([i for i, _ in log.results_between(3, 4)], [2, 3])
+
+    def test_half_written_entry_is_dropped(self):
+        with open(self.path, "ab") as f:
+            f.write(b"10+1\t1")
+        log = self.reopen()
+        self.assertEqual(len(log), 10)
+        log.append("11+1", "12", "DEG", 2.0)
+        log.flush()
+        self.assertEqual(self.reopen()[10].expression, "11+1")
+
+
+class HistoryLogSearchTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "history.log")
+        self.log = HistoryLog(self.path)
+        self.addCleanup(self.log.close)
+        for i in range(200):
+            self.log.append(f"sin({i})", str(i / 2), "DEG", 1.0)
+
+    def test_prefix(self):
+        found = self.log.search_prefix("sin(19")
+        self.assertEqual([i for i, _ in found], [19] + list(range(190, 200)))
+        self.assertEqual(len(self.log.search_prefix("sin(19", limit=3)), 3)
+        self.assertEqual(self.log.search_prefix("cos("), [])
+
+    def test_substring(self):
+        found = self.log.search("99")
+        self.assertEqual([i for i, _ in found], [99, 198, 199])
+        self.assertEqual([i for i, _ in self.log.search("5)")], [5, 15, 25, 35, 45, 55, 65, 75, 85,
+                                                                 95, 105, 115, 125, 135, 145, 155,
+                                                                 165, 175, 185, 195])
+
+    def test_results_between(self):
+        found = self.log.results_between(10, 11)
+        self.assertEqual([i for i, _ in found], [20, 21, 22])
+        self.assertEqual(found[0][1].expression, "sin(20)")
+
+    def test_entries_appended_after_a_search(self):
+        self.log.search_prefix("sin(")
+        self.log.append("sin(1000)", "10.25", "RAD", 2.0)
+        self.assertEqual(self.log.search_prefix("sin(1000)")[0][0], 200)
+        self.assertEqual([i for i, _ in self.log.results_between(10.25, 10.25)], [200])
+        self.assertEqual([i for i, _ in self.log.search("1000")], [200])
+
+    def test_reopened_log(self):
+        self.log.close()
+        log = HistoryLog(self.path)
+        self.addCleanup(log.close)
+        self.assertEqual(len(log), 200)
+        self.assertEqual([i for i, _ in log.search("(150")], [150])
+
+
+if __name__ == "__main__":
+    unittest.main()
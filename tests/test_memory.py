@@ -0,0 +1,84 @@
+import math
+import random
+import unittest
+from decimal import Decimal
+
+from scicalc.bignum import factorial
+from scicalc.memory import CompensatedSum, MemoryBank, P2Quantile, RunningStats, recall_text
+
+
+class CompensatedSumTests(unittest.TestCase):
+    def total(self, values):
+        total = CompensatedSum()
+        for value in values:
+            total.add(value)
+        return total.value
+
+    def test_floats_lose_nothing_to_rounding(self):
+        self.assertEqual(self.total([0.1] * 10), 1.0)
+        self.assertEqual(self.total([1e100, 1.0, -1e100]), 1.0)
+        values = [random.uniform(-1, 1) * 10 ** random.randint(-20, 20) for _ in range(1000)]
+        self.assertEqual(self.total(values), math.fsum(values))
+
+    def test_exact_and_mixed_values(self):
+        self.assertEqual(self.total([10 ** 30, 1, -10 ** 30]), 1)
+        self.assertEqual(self.total([Decimal("0.1")] * 3), Decimal("0.3"))
+        self.assertEqual(self.total([0.5, complex(0.25, 1)]), complex(0.75, 1))
+        self.assertEqual(self.total([1.0, math.inf]), math.inf)
+
+
+class P2QuantileTests(unittest.TestCase):
+    def test_exact_for_few_values(self):
+        median = P2Quantile(0.5)
+        for x in (5, 1, 3):
+            median.add(x)
+        self.assertEqual(median.value, 3)
+        self.assertTrue(math.isnan(P2Quantile(0.5).value))
+
+    def test_estimates_of_a_large_stream(self):
+        values = list(range(1, 10001))
+        random.Random(1).shuffle(values)
+        for p in (0.25, 0.5, 0.9):
+            with self.subTest(p=p):
+                estimate = P2Quantile(p)
+                for x in values:
+                    estimate.add(x)
+                self.assertAlmostEqual(estimate.value, p * 10000, delta=100)
+
+    def test_bounds(self):
+        with self.assertRaises(ValueError):
+            P2Quantile(1.5)
+
+
+class RunningStatsTests(unittest.TestCase):
+    def test_values_too_large_for_float(self):
+        stats = RunningStats()
+        for value in (math.factorial(200), factorial(6000)):
+            with self.subTest(value=value):
+                with self.assertRaisesRegex(ValueError, "fit in a float"):
+                    stats.add(value)
+        self.assertEqual(stats.count, 0)
+
+    def test_statistics_mode_register(self):
+        bank = MemoryBank()
+        bank.statistics = True
+        with self.assertRaises(ValueError):
+            bank.add(factorial(6000))
+        bank.add(2)
+        self.assertEqual(bank.recall(), 2.0)
+
+
+class RecallTextTests(unittest.TestCase):
+    def test_non_finite_values(self):
+        for value in (math.inf, -math.inf, math.nan, complex(math.inf, 1)):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    recall_text(value)
+
+    def test_finite_values(self):
+        self.assertEqual(recall_text(0.1), "0.1")
+        self.assertEqual(recall_text(complex(1, -2)), "(1.0-2.0*i)")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import math
+import unittest
+from decimal import Decimal
+
+from scicalc import CalculatorEngine, numeric
+
+
+class SolveTests(unittest.TestCase):
+    def test_no_sign_change_at_bounds(self):
+        # Newton's method cannot start from the midpoint, where the slope
+        # is zero
+        self.assertAlmostEqual(abs(numeric.solve(lambda x: x * x - 1, -2, 2)), 1)
+
+    def test_no_root(self):
+        with self.assertRaises(ValueError):
+            numeric.solve(lambda x: x * x + 1, -2, 2)
+
+
+class IntegrateTests(unittest.TestCase):
+    def test_divergent(self):
+        with self.assertRaisesRegex(ValueError, "diverges"):
+            numeric.integrate(lambda x: 1 / x, 0, 1)
+
+    def test_integrable_singularity(self):
+        self.assertAlmostEqual(numeric.integrate(lambda x: x ** -0.5, 0, 1), 2)
+
+
+class PreciseFormTests(unittest.TestCase):
+    # The routines work in float; in precision mode their result joins the
+    # rest of a Decimal expression
+    def test_forms_inside_expressions(self):
+        engine = CalculatorEngine(precision=50)
+        for expression, expected in (("2*solve(x^2-2, x, 0, 2)", 2 * math.sqrt(2)),
+                                     ("diff(x^2, x, 3) + 1", 7),
+                                     ("integrate(x, x, 0, 1) + 1", 1.5)):
+            with self.subTest(expression=expression):
+                value = engine.evaluate_value(expression)
+                self.assertIsInstance(value, Decimal)
+                self.assertAlmostEqual(float(value), expected, places=9)
+
+
+if __name__ == "__main__":
+    unittest.main()
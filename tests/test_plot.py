@@ -0,0 +1,43 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    from scicalc.plot import FunctionSampler
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class FunctionSamplerTests(unittest.TestCase):
+    def test_poles_are_broken(self):
+        xs, ys = FunctionSampler("1/(x-0.3)").samples(-1, 1)
+        breaks = np.flatnonzero(np.isnan(ys))
+        self.assertEqual(len(breaks), 1)
+        i = breaks[0]
+        self.assertTrue(xs[i - 1] < 0.3 < xs[i + 1])
+        self.assertTrue(ys[i - 1] < 0 < ys[i + 1])
+
+    def test_smooth_curves_are_not_broken(self):
+        xs, ys = FunctionSampler("x^2").samples(-5, 5)
+        self.assertFalse(np.isnan(ys).any())
+        self.assertEqual((xs[0], xs[-1]), (-5, 5))
+        self.assertTrue((np.diff(xs) > 0).all())
+
+    def test_domain_edges_are_refined(self):
+        xs, ys = FunctionSampler("sqrt(x)").samples(-4, 4)
+        finite = xs[np.isfinite(ys)]
+        self.assertEqual(finite.min(), 0.0)
+        self.assertTrue(np.isnan(ys[xs < 0]).all())
+
+    def test_redraw_reuses_tiles(self):
+        sampler = FunctionSampler("sin(x)")
+        sampler.samples(0, 360)
+        evaluations = sampler.evaluations
+        sampler.samples(0, 360)
+        self.assertEqual(sampler.evaluations, evaluations)
+
+
+if __name__ == "__main__":
+    unittest.main()
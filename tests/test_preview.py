@@ -0,0 +1,30 @@
+import unittest
+
+from scicalc import CalculatorEngine
+from scicalc.preview import ExpressionPreview
+
+
+class PreviewTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = CalculatorEngine()
+        self.preview = ExpressionPreview(self.engine)
+
+    def test_typing(self):
+        for text, expected in (("1", ""), ("1+", ""), ("1+2", "3"), ("1+2*", "3"),
+                               ("1+2*(", "3"), ("1+2*(3", "3"), ("1+2*(3)", "7")):
+            with self.subTest(text=text):
+                self.assertEqual(self.preview.update(text), expected)
+
+    def test_slow_expressions_are_skipped(self):
+        # These are left to the worker process behind "="
+        self.assertEqual(self.preview.update("integrate(sin(1/x), x, 0, 1)+1"), "")
+        self.assertEqual(self.preview.update("solve(x^2-2, x, 0, 2)*2"), "")
+        self.engine.set_precision(1000)
+        self.assertEqual(self.preview.update("sin(1)+sin(2)"), "")
+
+    def test_overlong_literal(self):
+        self.assertEqual(self.preview.update("1+" + "9" * 5000), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import unittest
+
+from scicalc import CalculatorEngine
+from scicalc.profiling import Histogram, Profiler, profiler
+
+
+class HistogramTests(unittest.TestCase):
+    def setUp(self):
+        self.histogram = Histogram()
+        for _ in range(99):
+            self.histogram.record(1e-6)
+        self.histogram.record(1e-3)
+
+    def test_quantiles_within_a_factor_of_two(self):
+        h = self.histogram
+        self.assertEqual(h.count, 100)
+        self.assertTrue(1e-6 <= h.quantile(0.5) <= 2e-6)
+        self.assertTrue(1e-6 <= h.quantile(0.99) <= 2e-6)
+        self.assertEqual(h.quantile(1.0), 1e-3)
+        self.assertAlmostEqual(h.mean, (99e-6 + 1e-3) / 100)
+
+    def test_round_trip_and_merge(self):
+        data = json.loads(json.dumps(self.histogram.to_dict()))
+        copy = Histogram.from_dict(data)
+        self.assertEqual(copy.counts, self.histogram.counts)
+        copy.merge(self.histogram)
+        self.assertEqual(copy.count, 200)
+        self.assertEqual((copy.min, copy.max), (1e-6, 1e-3))
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_snapshot_merges_into_another_profiler(self):
+        worker = Profiler(enabled=True)
+        worker.record("execute", 0.002)
+        worker.count_functions(["sin", "sin", "sqrt"])
+        parent = Profiler()
+        parent.record("execute", 0.001)
+        parent.merge(worker.snapshot())
+        self.assertEqual(parent.stages["execute"].count, 2)
+        self.assertEqual(parent.functions["sin"], 2)
+
+    def test_engine_records_stages_when_enabled(self):
+        enabled = profiler.enabled
+        self.addCleanup(setattr, profiler, "enabled", enabled)
+        profiler.reset()
+        profiler.enabled = True
+        CalculatorEngine().evaluate_expression("sin(30)+sqrt(4)")
+        stages = profiler.snapshot()["stages"]
+        self.assertEqual(stages["compile"]["count"], 1)
+        self.assertEqual(stages["execute"]["count"], 1)
+        self.assertEqual(profiler.functions["sin"], 1)
+        profiler.reset()
+
+
+if __name__ == "__main__":
+    unittest.main()
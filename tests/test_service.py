@@ -0,0 +1,74 @@
+import asyncio
+import json
+import unittest
+
+from scicalc.service import BatchWorker, EvaluationService, evaluate_batch
+
+
+class EvaluateBatchTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = BatchWorker(time_limit=2)
+        self.addCleanup(self.worker.close)
+
+    def test_results_in_request_order(self):
+        requests = [{"expression": "1+1"},
+                    {"expression": "2", "degree_mode": "yes"},
+                    {"expression": "sin(30)"},
+                    {"ans": "3"},
+                    {"expression": "Ans*2", "ans": "21"},
+                    {"expression": "1/0"},
+                    {"expression": "pi", "precision": 5}]
+        results = evaluate_batch(self.worker, requests)
+        self.assertEqual(results[0], {"result": "2"})
+        self.assertIn("degree_mode", results[1]["error"])
+        self.assertEqual(results[2], {"result": "0.5"})
+        self.assertEqual(results[3], {"error": "missing 'expression'"})
+        self.assertEqual(results[4], {"result": "42"})
+        self.assertIn("error", results[5])
+        self.assertEqual(results[6], {"result": "3.1416"})
+
+    def test_invalid_options(self):
+        requests = [{"expression": "1", "precision": "5"},
+                    {"expression": "1", "precision": 0},
+                    {"expression": "1", "complex": 1},
+                    {"expression": "1", "precision": 10 ** 6}]
+        results = evaluate_batch(self.worker, requests)
+        self.assertIn("'precision'", results[0]["error"])
+        self.assertIn("'precision'", results[1]["error"])
+        self.assertIn("'complex'", results[2]["error"])
+        # Precision is capped rather than refused
+        self.assertEqual(results[3], {"result": "1"})
+
+    def test_batch_over_budget(self):
+        results = evaluate_batch(self.worker, [{"expression": "1+1"}, {"expression": "9^9^9"}])
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all("longer than" in result["error"] for result in results))
+        # The worker is replaced for the next batch
+        self.assertEqual(evaluate_batch(self.worker, [{"expression": "1+1"}]), [{"result": "2"}])
+
+
+class RouteTests(unittest.TestCase):
+    # Requests that are refused before any worker is involved
+    def route(self, method, path, body=b"", service=None):
+        service = service or EvaluationService(jobs=1)
+        return asyncio.run(service._route(method, path, body))
+
+    def test_malformed_requests(self):
+        self.assertEqual(self.route("GET", "/nowhere")[0], 404)
+        self.assertEqual(self.route("GET", "/evaluate")[0], 405)
+        self.assertEqual(self.route("POST", "/evaluate", b"{not json")[0], 400)
+        body = json.dumps({"requests": [{"expression": "1"}, 2]}).encode()
+        self.assertEqual(self.route("POST", "/evaluate", body),
+                         (400, {"error": "requests must be JSON objects"}))
+
+    def test_full_queue_is_busy(self):
+        service = EvaluationService(jobs=1, max_queued=1)
+        service._queued = 1
+        status, payload = self.route("POST", "/evaluate", b'{"expression": "1"}', service)
+        self.assertEqual(status, 503)
+        self.assertEqual(service.stats.rejected, 1)
+        self.assertEqual(service.stats.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
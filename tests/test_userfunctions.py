@@ -0,0 +1,23 @@
+import unittest
+
+from scicalc import CalculatorEngine
+
+
+class MemoTests(unittest.TestCase):
+    def test_int_and_float_arguments_are_memoized_apart(self):
+        engine = CalculatorEngine()
+        engine.define("g(x) = x^40", memo_size=8)
+        self.assertEqual(engine.evaluate_value("g(3)"), 3 ** 40)
+        self.assertEqual(type(engine.evaluate_value("g(3.0)")), float)
+
+    def test_big_factorial_arguments_are_not_memoized(self):
+        engine = CalculatorEngine()
+        function = engine.define("h(x) = log10(x)", memo_size=8)
+        self.assertAlmostEqual(engine.evaluate_value("h(fact(100000))"), 456573.45, places=2)
+        self.assertEqual(len(function.memo), 0)
+        engine.evaluate_value("h(100)")
+        self.assertEqual(len(function.memo), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import math
+import unittest
+
+from scicalc import CalculatorEngine
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class DegreeFunctionTests(unittest.TestCase):
+    # Arrays must give the values the calculator shows for the same input
+    ANGLES = [15.0 * k for k in range(-30, 31)] + [1e22, -1e22, 12.5, -1234.5]
+    RATIOS = [-1.0, -0.5, 0.0, 0.5, 1.0, 0.3, math.sqrt(0.5), math.sqrt(3) / 2,
+              math.sqrt(3) / 3, math.sqrt(3), -math.sqrt(3)]
+
+    def assertMatchesScalar(self, name, values):
+        engine = CalculatorEngine()
+        array = engine.evaluate_array(f"{name}(x)", np.array(values))
+        for x, got in zip(values, array):
+            try:
+                expected = engine.evaluate_value(f"{name}(x)", {"x": x})
+            except ValueError:
+                expected = math.nan
+            with self.subTest(name=name, x=x):
+                if math.isnan(expected):
+                    self.assertTrue(math.isnan(got))
+                else:
+                    self.assertAlmostEqual(got, expected, places=12)
+
+    def test_special_angles_are_exact(self):
+        engine = CalculatorEngine()
+        x = np.array([30.0, 150.0, -210.0, 390.0])
+        self.assertEqual(engine.evaluate_array("sin(x)", x).tolist(), [0.5, 0.5, 0.5, 0.5])
+        self.assertEqual(engine.evaluate_array("cos(x)", np.array([60.0, 120.0])).tolist(),
+                         [0.5, -0.5])
+        self.assertEqual(engine.evaluate_array("tan(x)", np.array([45.0, 135.0])).tolist(),
+                         [1.0, -1.0])
+        self.assertEqual(engine.evaluate_array("asin(x)", np.array([0.5, -0.5])).tolist(),
+                         [30.0, -30.0])
+
+    def test_forward_functions_match_scalar(self):
+        for name in ("sin", "cos", "tan"):
+            self.assertMatchesScalar(name, self.ANGLES)
+
+    def test_inverse_functions_match_scalar(self):
+        for name in ("asin", "acos", "atan"):
+            self.assertMatchesScalar(name, self.RATIOS)
+
+
+if __name__ == "__main__":
+    unittest.main()
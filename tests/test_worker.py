@@ -0,0 +1,40 @@
+import unittest
+
+from scicalc import CalculatorEngine
+from scicalc.worker import EvaluationWorker
+
+
+class EvaluationWorkerTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = CalculatorEngine()
+        self.worker = EvaluationWorker(time_limit=1.0)
+        self.addCleanup(self.worker.close)
+
+    def test_result_becomes_ans(self):
+        self.assertEqual(self.worker.evaluate("6*7", self.engine), "42")
+        self.assertEqual(self.worker.evaluate("Ans+1", self.engine), "43")
+
+    def test_time_limit(self):
+        self.worker.submit("9^9^9", self.engine)
+        ok, value, message = self.worker.wait()
+        self.assertFalse(ok)
+        self.assertIn("longer than 1 s", message)
+        self.assertFalse(self.worker.busy)
+        # A fresh process takes the next job
+        self.assertEqual(self.worker.evaluate("1+1", self.engine), "2")
+
+    def test_cancel(self):
+        self.worker.submit("9^9^9", self.engine)
+        self.assertTrue(self.worker.busy)
+        self.worker.cancel()
+        self.assertFalse(self.worker.busy)
+        self.assertIsNone(self.worker.poll())
+        self.assertEqual(self.worker.evaluate("2^10", self.engine), "1024")
+
+    def test_errors_are_reported(self):
+        with self.assertRaisesRegex(ArithmeticError, "division by zero"):
+            self.worker.evaluate("1/0", self.engine)
+
+
+if __name__ == "__main__":
+    unittest.main()
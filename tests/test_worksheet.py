@@ -0,0 +1,53 @@
+import unittest
+from unittest import mock
+
+from scicalc.bignum import BigFactorial
+from scicalc.worksheet import Worksheet
+
+
+class RecomputeTests(unittest.TestCase):
+    def setUp(self):
+        self.sheet = Worksheet("a = 1\nb = a + 1\nc = b*2\nd = 5\n# note\nf = c + d")
+        self.evaluated = []
+        execute = self.sheet.engine.execute
+
+        def recording(compiled, variables=None):
+            self.evaluated.append(compiled.text)
+            return execute(compiled, variables)
+        self.sheet.engine.execute = recording
+
+    def test_dependents_are_recomputed_in_line_order(self):
+        self.assertEqual(self.sheet.results(), ["1", "2", "4", "5", "", "9"])
+        self.assertEqual(self.sheet.set_line(0, "a = 2"), 4)
+        self.assertEqual(self.evaluated, ["2", "a + 1", "b*2", "c + d"])
+        self.assertEqual(self.sheet.results(), ["2", "3", "6", "5", "", "11"])
+
+    def test_unchanged_values_stop_recomputation(self):
+        self.assertEqual(self.sheet.set_line(0, "a = 3 - 2"), 1)
+        # An int turning into an equal float is a change
+        self.assertEqual(self.sheet.set_line(0, "a = 1.0"), 4)
+        self.assertEqual(self.sheet.set_line(3, "d = 5"), 0)
+
+    def test_inserted_definition_shadows_later_lines(self):
+        self.sheet.insert_line(1, "a = 10")
+        self.assertEqual(self.sheet.results(), ["1", "10", "11", "22", "5", "", "27"])
+        self.sheet.delete_line(1)
+        self.assertEqual(self.sheet.results(), ["1", "2", "4", "5", "", "9"])
+
+    def test_errors_propagate_to_dependents(self):
+        self.sheet.set_line(0, "a = 1/0")
+        results = self.sheet.results()
+        self.assertIn("division by zero", results[0])
+        self.assertIn("'a' has no value", results[1])
+        self.assertEqual(results[3], "5")
+
+    def test_equal_big_factorial_stops_recomputation(self):
+        sheet = Worksheet("a = fact(6000)\nb = log10(a)")
+        with mock.patch.object(BigFactorial, "value",
+                               new_callable=mock.PropertyMock, side_effect=AssertionError):
+            self.assertEqual(sheet.set_line(0, "a = fact(3000*2)"), 1)
+            self.assertEqual(sheet.set_line(0, "a = fact(6001)"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()